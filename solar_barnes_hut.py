@@ -0,0 +1,247 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Решатель Барнса — Хата для двумерной модели.
+Дерево квадрантов строится один раз за шаг, далее для всех тел сразу
+выполняется векторизованный обход: узел принимается целиком, если
+его размер s и расстояние d до его центра масс удовлетворяют s / d < θ.
+Сложность шага — O(N log N).
+"""
+
+import numpy as np
+
+import solar_engine
+import solar_model
+from solar_model import gravitational_constant
+
+opening_angle = 0.5
+"""Угол раскрытия θ. Чем он меньше, тем точнее и дороже расчёт.
+Тип: float"""
+
+max_depth = 48
+"""Максимальная глубина дерева. Тела, не разделившиеся к этой глубине,
+считаются совпадающими и друг на друга не действуют."""
+
+target_block = 4096
+"""Число тел, обходящих дерево одновременно; ограничивает память обхода."""
+
+
+class QuadTree:
+    """Дерево квадрантов, хранящееся в плоских массивах.
+
+    Для каждого узла хранятся центр (cx, cy), половина стороны half,
+    масса mass, центр масс (comx, comy), индексы четырёх потомков children
+    (-1 — потомка нет) и признак листа is_leaf. Для каждого тела хранится
+    лист, в который оно попало (body_leaf).
+    """
+
+    def __init__(self, pos, m):
+        """Строит дерево по уровням: на каждом уровне все тела, ещё не
+        оказавшиеся в отдельном листе, одновременно распределяются по квадрантам.
+
+        Параметры:
+
+        **pos** — массив координат формы (N, 2).
+        **m** — массив масс формы (N,).
+        """
+        n = len(pos)
+        lo = pos.min(axis=0)
+        hi = pos.max(axis=0)
+        half = max(float((hi - lo).max()) / 2, 1.0) * (1 + 1e-9)
+
+        cx = [np.array([(lo[0] + hi[0]) / 2])]
+        cy = [np.array([(lo[1] + hi[1]) / 2])]
+        halves = [np.array([half])]
+        masses = [np.array([m.sum()])]
+        comx = [np.array([(m * pos[:, 0]).sum()])]
+        comy = [np.array([(m * pos[:, 1]).sum()])]
+        counts = [np.array([n])]
+        links = []  # (родители, квадранты, потомки) каждого уровня
+
+        self.body_leaf = np.zeros(n, dtype=np.intp)
+        active = np.arange(n) if n > 1 else np.arange(0)
+        node_count = 1
+        depth = 0
+        while len(active) and depth < max_depth:
+            parent = self.body_leaf[active]
+            pcx = np.concatenate(cx)[parent]
+            pcy = np.concatenate(cy)[parent]
+            east = pos[active, 0] >= pcx
+            north = pos[active, 1] >= pcy
+            key = parent * 4 + east + 2 * north
+            keys, inverse, count = np.unique(key, return_inverse=True, return_counts=True)
+
+            child = node_count + np.arange(len(keys))
+            node_count += len(keys)
+            parents = keys // 4
+            quadrant = keys % 4
+            child_half = np.concatenate(halves)[parents] / 2
+            cx.append(np.concatenate(cx)[parents] + np.where(quadrant % 2, child_half, -child_half))
+            cy.append(np.concatenate(cy)[parents] + np.where(quadrant // 2, child_half, -child_half))
+            halves.append(child_half)
+            mass = np.bincount(inverse, m[active], minlength=len(keys))
+            masses.append(mass)
+            comx.append(np.bincount(inverse, m[active] * pos[active, 0], minlength=len(keys)))
+            comy.append(np.bincount(inverse, m[active] * pos[active, 1], minlength=len(keys)))
+            counts.append(count)
+            links.append((parents, quadrant, child))
+
+            self.body_leaf[active] = child[inverse]
+            active = active[count[inverse] > 1]
+            depth += 1
+
+        self.cx = np.concatenate(cx)
+        self.cy = np.concatenate(cy)
+        self.half = np.concatenate(halves)
+        self.mass = np.concatenate(masses)
+        count = np.concatenate(counts)
+        # центр масс; для узлов нулевой массы — геометрический центр
+        has_mass = self.mass > 0
+        safe_mass = np.where(has_mass, self.mass, 1.0)
+        self.comx = np.where(has_mass, np.concatenate(comx) / safe_mass, self.cx)
+        self.comy = np.where(has_mass, np.concatenate(comy) / safe_mass, self.cy)
+        self.children = np.full((node_count, 4), -1, dtype=np.intp)
+        for parents, quadrant, child in links:
+            self.children[parents, quadrant] = child
+        self.is_leaf = (self.children < 0).all(axis=1)
+        self.count = count
+
+    def accelerations(self, pos, targets, theta, potential=False):
+        """Вычисляет ускорения тел **targets** обходом дерева.
+        Возвращает массив формы (len(targets), 2) без множителя G, а при
+        **potential** — пару (ускорения, потенциал), тоже без множителя G.
+
+        Параметры:
+
+        **pos** — массив координат формы (N, 2).
+        **targets** — индексы тел, для которых считается ускорение.
+        **theta** — угол раскрытия.
+        **potential** — вычислить и потенциал в том же обходе.
+        """
+        acc = np.zeros((len(targets), 2))
+        phi = np.zeros(len(targets)) if potential else None
+        eps2 = solar_model.softening_length ** 2
+        for start in range(0, len(targets), target_block):
+            tgt = targets[start:start + target_block]
+            k = len(tgt)
+            own_leaf = self.body_leaf[tgt] if len(self.body_leaf) else np.full(k, -1)
+            pair_body = np.arange(k)
+            pair_node = np.zeros(k, dtype=np.intp)
+            while len(pair_body):
+                tx = pos[tgt[pair_body], 0]
+                ty = pos[tgt[pair_body], 1]
+                dx = self.comx[pair_node] - tx
+                dy = self.comy[pair_node] - ty
+                r2 = dx * dx + dy * dy
+                half = self.half[pair_node]
+                inside = (np.abs(tx - self.cx[pair_node]) <= half) & (np.abs(ty - self.cy[pair_node]) <= half)
+                leaf = self.is_leaf[pair_node]
+                accept = leaf | (~inside & (4 * half * half < theta * theta * r2))
+                use = accept & (pair_node != own_leaf[pair_body]) & (self.mass[pair_node] > 0)
+
+                s2 = r2[use] + eps2
+                s = np.sqrt(s2)
+                w = self.mass[pair_node[use]] / (s2 * s)
+                acc[start:start + k, 0] += np.bincount(pair_body[use], w * dx[use], minlength=k)
+                acc[start:start + k, 1] += np.bincount(pair_body[use], w * dy[use], minlength=k)
+                if potential:
+                    phi[start:start + k] -= np.bincount(pair_body[use], self.mass[pair_node[use]] / s, minlength=k)
+
+                opened = ~accept
+                children = self.children[pair_node[opened]]
+                exists = children >= 0
+                pair_body = np.repeat(pair_body[opened], exists.sum(axis=1))
+                pair_node = children[exists]
+        return (acc, phi) if potential else acc
+
+
+def calculate_accelerations(pos, m, targets=None, sources=None, theta=None, potential=False):
+    """Вычисляет гравитационные ускорения методом Барнса — Хата.
+    Интерфейс совпадает с solar_engine.calculate_accelerations.
+
+    Параметры:
+
+    **pos** — массив координат формы (N, 2).
+    **m** — массив масс формы (N,).
+    **targets** — индексы тел, для которых считается ускорение (по умолчанию все).
+    **sources** — индексы тел, создающих поле (по умолчанию все).
+    **theta** — угол раскрытия, по умолчанию **opening_angle**.
+    **potential** — вернуть пару (ускорения, потенциал), как solar_engine.calculate_accelerations.
+    """
+    theta = opening_angle if theta is None else theta
+    n = len(pos)
+    targets = np.arange(n) if targets is None else np.asarray(targets)
+    if len(targets) == 0 or n == 0 or (sources is not None and len(sources) == 0):
+        acc = np.zeros((len(targets), 2))
+        return (acc, np.zeros(len(targets))) if potential else acc
+    if sources is None:
+        tree = QuadTree(pos, m)
+        return _scaled(tree.accelerations(pos, targets, theta, potential))
+    # дерево строится только по источникам; индексы целей переводятся в локальные
+    sources = np.asarray(sources)
+    tree = QuadTree(pos[sources], m[sources])
+    local = np.full(n, -1, dtype=np.intp)
+    local[sources] = np.arange(len(sources))
+    own = local[targets]
+    tree.body_leaf = np.append(tree.body_leaf, -1)[own]
+    tree_targets = np.arange(len(targets))
+    return _scaled(tree.accelerations(pos[targets], tree_targets, theta, potential))
+
+
+def _scaled(result):
+    """Умножает результат обхода дерева (массив или пару массивов) на G."""
+    if isinstance(result, tuple):
+        return tuple(gravitational_constant * part for part in result)
+    return gravitational_constant * result
+
+
+def force_error(pos, m, theta=None, sample=1000, seed=0):
+    """Сравнивает ускорения Барнса — Хата с прямым суммированием.
+    Возвращает словарь с относительными ошибками: "rms" и "max".
+    Для больших систем сравнение ведётся по случайной выборке из **sample** тел.
+
+    Параметры:
+
+    **pos** — массив координат формы (N, 2).
+    **m** — массив масс формы (N,).
+    **theta** — угол раскрытия, по умолчанию **opening_angle**.
+    **sample** — размер выборки тел (None — все тела).
+    **seed** — зерно генератора случайных чисел для выборки.
+    """
+    n = len(pos)
+    if sample is None or sample >= n:
+        targets = np.arange(n)
+    else:
+        targets = np.sort(np.random.default_rng(seed).choice(n, sample, replace=False))
+    approx = calculate_accelerations(pos, m, targets, theta=theta)
+    exact = solar_engine.calculate_accelerations(pos, m, targets)
+    norm = np.hypot(exact[:, 0], exact[:, 1])
+    norm[norm == 0] = 1.0
+    error = np.hypot(*(approx - exact).T) / norm
+    return {"theta": opening_angle if theta is None else theta,
+            "rms": float(np.sqrt((error ** 2).mean())) if len(error) else 0.0,
+            "max": float(error.max()) if len(error) else 0.0}
+
+
+def report_force_error(space_objects, thetas=(0.2, 0.3, 0.5, 0.7, 1.0), sample=1000):
+    """Печатает таблицу ошибок силы для нескольких углов раскрытия,
+    чтобы выбрать θ для конкретного расчёта. Возвращает список словарей force_error.
+
+    Параметры:
+
+    **space_objects** — список космических объектов.
+    **thetas** — проверяемые углы раскрытия.
+    **sample** — размер выборки тел.
+    """
+    pos, vel, m = solar_engine.pack_space_objects(space_objects)
+    report = [force_error(pos, m, theta, sample) for theta in thetas]
+    for row in report:
+        print(f"theta={row['theta']:.2f}  rms={row['rms']:.3e}  max={row['max']:.3e}")
+    return report
+
+
+solar_engine.engines["barnes_hut"] = calculate_accelerations
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
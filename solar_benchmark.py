@@ -0,0 +1,287 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Воспроизводимые замеры производительности без графического интерфейса.
+
+Для систем заданного размера (по умолчанию 2, 10, 1000 и 100000 тел, всегда с
+одним и тем же зерном генератора) замеряются:
+    step   — шагов в секунду у recalculate_space_objects_positions для каждого движка;
+    io     — тел в секунду при чтении и записи файла solar_input (массово, через
+             кэш и по одному объекту);
+    render — кадров в секунду у CanvasRenderer.update на холсте-заглушке.
+
+Результаты вместе со сведениями о машине сохраняются в JSON. Если указан
+файл прошлых результатов (baseline), каждый замер сравнивается с ним, а
+замедление сильнее допуска считается регрессией (код возврата 1).
+
+Пример:
+    python solar_benchmark.py --output bench.json --baseline baseline.json
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import solar_model
+from solar_input import (read_space_objects_arrays, read_space_objects_data_from_file,
+                         write_space_objects_arrays, write_space_objects_data_to_file,
+                         objects_from_arrays, cache_filename)
+from solar_model import gravitational_constant
+from solar_objects import BodyStore, body_dtype
+from solar_vis import CanvasRenderer
+
+default_sizes = (2, 10, 1000, 100000)
+"""Размеры систем по умолчанию."""
+
+step_engines = {"python": 1000, "numpy": 20000, "barnes_hut": None}
+"""Движки для замера шагов и наибольшее число тел для каждого (None — без ограничения)."""
+
+min_time = 0.2
+"""Наименьшая длительность одного повтора замера, секунд."""
+
+repeat = 3
+"""Число повторов замера; в результат идёт лучший."""
+
+tolerance = 0.2
+"""Допустимое относительное замедление по сравнению с baseline."""
+
+
+class FakeCanvas:
+    """Заглушка холста tkinter: запоминает элементы, но ничего не рисует."""
+
+    def __init__(self):
+        self.items = {}
+        self.calls = 0
+
+    def create_oval(self, *coords, **options):
+        self.calls += 1
+        item = len(self.items) + 1
+        self.items[item] = options
+        return item
+
+    create_rectangle = create_oval
+
+    def coords(self, item, *coords):
+        self.calls += 1
+
+    def itemconfigure(self, item, **options):
+        self.calls += 1
+        self.items[item].update(options)
+
+    def delete(self, item):
+        self.items.pop(item, None)
+
+    def bind(self, *args):
+        pass
+
+
+def generate_system(n, seed=0):
+    """Возвращает массив записей body_dtype: звезда в начале координат и **n** - 1
+    планета на круговых орбитах. При одинаковых **n** и **seed** результат одинаков."""
+    rng = np.random.default_rng([seed, n])
+    bodies = np.zeros(n, dtype=body_dtype)
+    bodies["type"] = b"planet"
+    bodies["color"] = rng.choice([b"blue", b"green", b"orange", b"white"], n)
+    bodies["R"] = rng.uniform(0.5, 3.0, n).round(1)
+    bodies["m"] = 10 ** rng.uniform(23, 27, n)
+    radius = 10 ** rng.uniform(10.7, 12.7, n)
+    angle = rng.uniform(0, 2 * math.pi, n)
+    bodies["type"][0], bodies["color"][0], bodies["R"][0], bodies["m"][0] = b"star", b"yellow", 5.0, 1.98892e30
+    radius[0] = 0.0
+    speed = np.sqrt(gravitational_constant * bodies["m"][0] / np.maximum(radius, 1.0)) * (radius > 0)
+    bodies["x"], bodies["y"] = radius * np.cos(angle), radius * np.sin(angle)
+    bodies["Vx"], bodies["Vy"] = -speed * np.sin(angle), speed * np.cos(angle)
+    return bodies
+
+
+def measure(func):
+    """Возвращает лучшее среди **repeat** повторов время одного вызова **func**, секунд.
+    Каждый повтор вызывает функцию, пока не пройдёт **min_time** секунд."""
+    best = math.inf
+    for _ in range(repeat):
+        calls = 0
+        started = time.perf_counter()
+        while True:
+            func()
+            calls += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_time:
+                break
+        best = min(best, elapsed / calls)
+    return best
+
+
+def _result(benchmark, variant, bodies, seconds, rate, unit):
+    return {"benchmark": benchmark, "variant": variant, "bodies": bodies,
+            "seconds": seconds, "rate": rate, "unit": unit}
+
+
+def benchmark_step(bodies, dt=1000.0):
+    """Замеряет шаги recalculate_space_objects_positions для движков из **step_engines**."""
+    results = []
+    n = len(bodies)
+    for engine, limit in step_engines.items():
+        if limit is not None and n > limit:
+            continue
+        if engine == "python":
+            # исходный путь: список объектов и попарный цикл на Python
+            space_objects = objects_from_arrays(bodies)
+        else:
+            space_objects = BodyStore.from_records(bodies)
+        state = {}
+        seconds = measure(lambda: solar_model.recalculate_space_objects_positions(
+            space_objects, dt, engine, "euler", state))
+        results.append(_result("step", f"{engine}/euler", n, seconds, 1 / seconds, "steps/s"))
+    return results
+
+
+def benchmark_io(bodies, directory):
+    """Замеряет чтение и запись файла в формате solar_system.txt."""
+    n = len(bodies)
+    filename = os.path.join(directory, f"bench_{n}.txt")
+    space_objects = objects_from_arrays(bodies)
+    cases = [
+        ("save/arrays", lambda: write_space_objects_arrays(filename, bodies)),
+        ("save/objects", lambda: write_space_objects_data_to_file(filename, space_objects)),
+        ("load/arrays", lambda: read_space_objects_arrays(filename, use_cache=False)),
+        ("load/cached", lambda: read_space_objects_arrays(filename)),
+        ("load/objects", lambda: read_space_objects_data_from_file(filename)),
+    ]
+    write_space_objects_arrays(filename, bodies)
+    results = []
+    for variant, func in cases:
+        if variant == "load/cached":
+            read_space_objects_arrays(filename)  # первое чтение создаёт кэш
+        seconds = measure(func)
+        results.append(_result("io", variant, n, seconds, n / seconds, "bodies/s"))
+    os.remove(filename)
+    if os.path.exists(cache_filename(filename)):
+        os.remove(cache_filename(filename))
+    return results
+
+
+def benchmark_render(bodies, frames=8):
+    """Замеряет кадр CanvasRenderer.update на холсте-заглушке: тела поворачиваются
+    вокруг центра, так что в каждом кадре меняются их экранные координаты."""
+    n = len(bodies)
+    store = BodyStore.from_records(bodies)
+    renderer = CanvasRenderer(FakeCanvas())
+    renderer.scale_factor = 0.4 * min(renderer.width, renderer.height) / (np.abs(store.pos).max() or 1)
+    renderer.create_images(store)
+    angles = np.linspace(0, 0.1, frames)
+    rotations = [np.array([[math.cos(a), math.sin(a)], [-math.sin(a), math.cos(a)]]) for a in angles]
+    positions = [store.pos @ rotation for rotation in rotations]
+    frame = [0]
+
+    def draw():
+        renderer.update(positions[frame[0] % frames])
+        frame[0] += 1
+
+    seconds = measure(draw)
+    return [_result("render", "canvas", n, seconds, 1 / seconds, "frames/s")]
+
+
+def machine_info():
+    """Возвращает сведения о машине и окружении для файла результатов."""
+    return {
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def run_benchmarks(sizes=default_sizes, benchmarks=("step", "io", "render"), seed=0):
+    """Выполняет замеры и возвращает словарь с результатами и сведениями о машине."""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            bodies = generate_system(n, seed)
+            if "step" in benchmarks:
+                results += benchmark_step(bodies)
+            if "io" in benchmarks:
+                results += benchmark_io(bodies, directory)
+            if "render" in benchmarks:
+                results += benchmark_render(bodies)
+    return {"machine": machine_info(), "seed": seed, "results": results}
+
+
+def _key(result):
+    return result["benchmark"], result["variant"], result["bodies"]
+
+
+def compare(report, baseline, tolerance=tolerance):
+    """Сравнивает результаты с baseline. Возвращает список словарей с полями
+    key, rate, baseline_rate, ratio, regression; замеры, которых нет в baseline, пропускаются."""
+    previous = {_key(result): result for result in baseline["results"]}
+    rows = []
+    for result in report["results"]:
+        old = previous.get(_key(result))
+        if old is None:
+            continue
+        ratio = result["rate"] / old["rate"]
+        rows.append({"key": "/".join(map(str, _key(result))), "rate": result["rate"],
+                     "baseline_rate": old["rate"], "ratio": ratio, "regression": ratio < 1 - tolerance})
+    return rows
+
+
+def format_results(report):
+    """Возвращает таблицу результатов в виде текста."""
+    lines = []
+    for result in report["results"]:
+        lines.append(f"{result['benchmark']:<7} {result['variant']:<18} {result['bodies']:>8} "
+                     f"{result['rate']:>14.4g} {result['unit']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    """Главная функция замеров. Возвращает код завершения: 1, если есть регрессии."""
+    global min_time, repeat
+    parser = argparse.ArgumentParser(description="Headless performance benchmarks.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(default_sizes),
+                        help="numbers of bodies in generated systems")
+    parser.add_argument("--only", nargs="+", choices=("step", "io", "render"),
+                        default=["step", "io", "render"], help="benchmarks to run")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the system generator")
+    parser.add_argument("--output", help="JSON file to write results to")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=tolerance,
+                        help="allowed relative slowdown before a result is a regression")
+    parser.add_argument("--quick", action="store_true", help="one short repeat per measurement")
+    args = parser.parse_args(argv)
+    if args.quick:
+        min_time, repeat = 0.05, 1
+
+    report = run_benchmarks(args.sizes, args.only, args.seed)
+    print(format_results(report))
+    if args.output:
+        with open(args.output, "w") as out_file:
+            json.dump(report, out_file, indent=2)
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as baseline_file:
+        baseline = json.load(baseline_file)
+    if baseline.get("machine", {}).get("platform") != report["machine"]["platform"]:
+        print("warning: baseline was recorded on a different machine")
+    rows = compare(report, baseline, args.tolerance)
+    for row in rows:
+        mark = "REGRESSION" if row["regression"] else "ok"
+        print(f"{row['key']:<40} {row['ratio']:>7.2f}x  {mark}")
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
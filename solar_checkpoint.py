@@ -0,0 +1,252 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Контрольные точки долгих расчётов.
+
+Контрольная точка хранит всё состояние расчёта: массивы тел (тип, цвет, R, m,
+координаты, скорости, силы), физическое время, число шагов, шаг dt, движок,
+интегратор и его состояние (запомненные ускорения, число вычислений сил,
+пробный подшаг адаптивного метода), а также настройки, от которых зависят
+силы: длину смягчения, порог массы пробных частиц, угол раскрытия
+Барнса — Хата и обработку столкновений. Случайных чисел при шагах расчёт не
+использует, так что продолжение из контрольной точки даёт ту же траекторию
+бит в бит, что и расчёт без остановки.
+
+Файл — архив NumPy .npz без pickle. Запись атомарна: данные пишутся во
+временный файл рядом, который затем заменяет старую контрольную точку, так
+что при падении процесса на диске остаётся предыдущая целая точка.
+CheckpointWriter снимает копию состояния в потоке расчёта и пишет файл в
+фоновом потоке, не останавливая шаги.
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import solar_barnes_hut
+import solar_model
+from solar_collisions import CollisionHandler
+from solar_objects import BodyStore
+from solar_simulation import Simulation
+
+format_version = 2
+"""Версия формата контрольной точки."""
+
+
+def physics_settings():
+    """Возвращает словарь текущих глобальных настроек сил: длины смягчения,
+    порога массы пробных частиц и угла раскрытия Барнса — Хата."""
+    return {"softening_length": solar_model.softening_length,
+            "test_particle_mass": solar_model.test_particle_mass,
+            "opening_angle": solar_barnes_hut.opening_angle}
+
+
+def apply_physics(physics):
+    """Устанавливает глобальные настройки сил из словаря **physics** (см. physics_settings)."""
+    solar_model.softening_length = physics["softening_length"]
+    solar_model.test_particle_mass = physics["test_particle_mass"]
+    solar_barnes_hut.opening_angle = physics["opening_angle"]
+
+
+def collision_settings(collisions):
+    """Возвращает параметры обработчика столкновений CollisionHandler (словарь) или None."""
+    if collisions is None:
+        return None
+    radius = collisions.radius
+    if isinstance(radius, np.ndarray):
+        radius = radius.copy()
+    elif radius is not None:
+        radius = float(radius)
+    return {"mode": collisions.mode, "radius": radius, "density": float(collisions.density),
+            "restitution": float(collisions.restitution)}
+
+
+def snapshot(space_objects, physical_time=0.0, step_count=0, dt=1.0, engine="numpy",
+             integrator="euler", integrator_state=None, collisions=None):
+    """Возвращает независимую копию состояния расчёта (словарь) для записи в контрольную точку.
+
+    Параметры:
+
+    **space_objects** — хранилище BodyStore или список космических объектов.
+    **physical_time**, **step_count** — физическое время и число выполненных шагов.
+    **dt**, **engine**, **integrator** — шаг по времени, движок и интегратор.
+    **integrator_state** — словарь состояния интегратора.
+    **collisions** — обработчик столкновений CollisionHandler или None.
+
+    Настройки сил (physics_settings) берутся текущие.
+    """
+    if isinstance(space_objects, BodyStore):
+        store = space_objects.copy()
+    else:
+        store = BodyStore.from_objects(space_objects)
+    state = {key: value.copy() if isinstance(value, np.ndarray) else value
+             for key, value in (integrator_state or {}).items()}
+    return {"store": store, "physical_time": physical_time, "step_count": step_count, "dt": dt,
+            "engine": engine, "integrator": integrator, "integrator_state": state,
+            "physics": physics_settings(), "collisions": collision_settings(collisions)}
+
+
+def simulation_snapshot(simulation):
+    """Возвращает копию состояния расчёта solar_simulation.Simulation."""
+    data = snapshot(simulation.space_objects, simulation.physical_time, simulation.step_count,
+                    simulation.dt, simulation.engine, simulation.integrator, simulation.integrator_state,
+                    simulation.collisions)
+    data["store"].pos[...] = simulation.pos
+    data["store"].vel[...] = simulation.vel
+    return data
+
+
+def write_checkpoint(filename, data):
+    """Атомарно записывает состояние **data** (см. snapshot) в файл **filename**."""
+    store = data["store"]
+    arrays = {"type": store.type_code, "color": store.color_index, "R": store.R, "m": store.m,
+              "pos": store.pos, "vel": store.vel, "force": store.force}
+    scalars = {}
+    for key, value in data["integrator_state"].items():
+        if isinstance(value, np.ndarray):
+            arrays["state." + key] = value
+        else:
+            scalars[key] = value.item() if isinstance(value, np.generic) else value
+    collisions = data["collisions"]
+    if collisions is not None and isinstance(collisions["radius"], np.ndarray):
+        arrays["collision.radius"] = collisions["radius"]
+        collisions = dict(collisions, radius=None)
+    meta = {"version": format_version, "physical_time": data["physical_time"],
+            "step_count": data["step_count"], "dt": data["dt"], "engine": data["engine"],
+            "integrator": data["integrator"], "type_names": list(store.type_names),
+            "colors": store.colors, "integrator_state": scalars, "physics": data["physics"],
+            "collisions": collisions}
+    arrays["meta"] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+
+    temporary = filename + ".tmp"
+    with open(temporary, "wb") as out_file:
+        np.savez(out_file, **arrays)
+        out_file.flush()
+        os.fsync(out_file.fileno())
+    os.replace(temporary, filename)
+
+
+def read_checkpoint(filename):
+    """Считывает контрольную точку. Возвращает словарь того же вида, что и snapshot."""
+    with np.load(filename, allow_pickle=False) as archive:
+        meta = json.loads(archive["meta"].tobytes().decode())
+        if meta["version"] != format_version:
+            raise ValueError(f"Unsupported checkpoint version {meta['version']}: {filename}")
+        # новые типы добавляются в конец, так что коды старых точек остаются верными
+        if tuple(meta["type_names"]) != BodyStore.type_names[:len(meta["type_names"])]:
+            raise ValueError(f"Checkpoint body types {meta['type_names']} do not match: {filename}")
+        n = len(archive["m"])
+        store = BodyStore(max(n, 1))
+        store.count = n
+        for color in meta["colors"]:
+            store.color_code(color)
+        store.type_code[...] = archive["type"]
+        store.color_index[...] = archive["color"]
+        store.R[...] = archive["R"]
+        store.m[...] = archive["m"]
+        store.pos[...] = archive["pos"]
+        store.vel[...] = archive["vel"]
+        store.force[...] = archive["force"]
+        state = dict(meta["integrator_state"])
+        for name in archive.files:
+            if name.startswith("state."):
+                state[name[len("state."):]] = archive[name]
+        collisions = meta["collisions"]
+        if "collision.radius" in archive.files:
+            collisions = dict(collisions, radius=archive["collision.radius"])
+    return {"store": store, "physical_time": meta["physical_time"], "step_count": meta["step_count"],
+            "dt": meta["dt"], "engine": meta["engine"], "integrator": meta["integrator"],
+            "integrator_state": state, "physics": meta["physics"], "collisions": collisions}
+
+
+def save_checkpoint(simulation, filename):
+    """Записывает контрольную точку расчёта **simulation** (синхронно)."""
+    write_checkpoint(filename, simulation_snapshot(simulation))
+
+
+def load_checkpoint(filename):
+    """Восстанавливает расчёт solar_simulation.Simulation из контрольной точки.
+    Глобальные настройки сил устанавливаются такими, какими они были при записи."""
+    data = read_checkpoint(filename)
+    apply_physics(data["physics"])
+    simulation = Simulation(data["store"], data["dt"], data["engine"], data["integrator"])
+    simulation.physical_time = data["physical_time"]
+    simulation.step_count = data["step_count"]
+    simulation.integrator_state = data["integrator_state"]
+    if data["collisions"] is not None:
+        simulation.collisions = CollisionHandler(**data["collisions"])
+    return simulation
+
+
+class CheckpointWriter:
+    """Периодическая фоновая запись контрольных точек.
+
+    Параметры конструктора:
+
+    **filename** — файл контрольной точки (каждый раз заменяется целиком).
+    **every** — записывать после каждого every-го шага.
+
+    update(simulation) вызывается после каждого шага. Копия состояния снимается
+    сразу, а файл пишется в фоновом потоке. Если предыдущая запись ещё не
+    закончилась, очередная точка пропускается (счётчик **skipped**), чтобы
+    шаги не ждали диска. Ошибка фоновой записи поднимается при следующем вызове.
+    Без объекта Simulation можно вызывать ready() и submit(snapshot(...)).
+    """
+
+    def __init__(self, filename, every=1000):
+        self.filename = filename
+        self.every = every
+        self.written = 0
+        self.skipped = 0
+        self._executor = ThreadPoolExecutor(1)
+        self._pending = None
+
+    def _collect(self):
+        """Забирает результат завершённой фоновой записи и поднимает её ошибку, если была."""
+        if self._pending is not None and self._pending.done():
+            self._pending, pending = None, self._pending
+            pending.result()
+            self.written += 1
+
+    def ready(self):
+        """Проверяет, закончилась ли предыдущая запись; если нет, учитывает пропуск точки."""
+        self._collect()
+        if self._pending is not None:
+            self.skipped += 1
+            return False
+        return True
+
+    def submit(self, data):
+        """Ставит запись состояния **data** (см. snapshot) в фоновый поток."""
+        self._pending = self._executor.submit(write_checkpoint, self.filename, data)
+
+    def update(self, simulation):
+        if simulation.step_count % self.every == 0 and self.ready():
+            self.submit(simulation_snapshot(simulation))
+
+    def write_now(self, simulation):
+        """Дожидается фоновой записи и синхронно записывает текущее состояние."""
+        self.wait()
+        save_checkpoint(simulation, self.filename)
+        self.written += 1
+
+    def wait(self):
+        """Дожидается окончания фоновой записи."""
+        if self._pending is not None:
+            self._pending.result()
+            self._pending = None
+            self.written += 1
+
+    def close(self):
+        """Дожидается записи и останавливает фоновый поток."""
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown()
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
@@ -0,0 +1,166 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Пакетный расчёт из командной строки, без tkinter.
+Считывает систему из файла в формате solar_system.txt, выполняет заданное
+число шагов (или считает до заданного физического времени) с фиксированным
+шагом dt так быстро, как позволяет процессор, и сохраняет конечное состояние.
+
+Пример:
+    python solar_cli.py solar_system.txt result.txt --dt 1000 --time 3.15e7
+"""
+
+import argparse
+import time
+
+import solar_model
+import solar_profiling
+from solar_checkpoint import CheckpointWriter, load_checkpoint
+from solar_collisions import CollisionHandler
+from solar_diagnostics import DiagnosticsMonitor
+from solar_frames import FrameExporter
+from solar_recorder import TrajectoryRecorder
+from solar_simulation import Simulation
+from solar_vis import window_height, window_width
+
+
+def parse_arguments(argv=None):
+    """Разбирает аргументы командной строки."""
+    parser = argparse.ArgumentParser(description="Headless solar system simulation.")
+    parser.add_argument("input", help="input file in solar_system.txt format (a checkpoint with --resume)")
+    parser.add_argument("output", help="file to write the final state to")
+    parser.add_argument("--dt", type=float, help="time step, seconds (default 1, or the checkpoint's)")
+    length = parser.add_mutually_exclusive_group(required=True)
+    length.add_argument("--steps", type=int, help="number of steps to run")
+    length.add_argument("--time", type=float, help="physical time to run, seconds")
+    parser.add_argument("--engine", help="force engine: numpy, barnes_hut or parallel (default numpy)")
+    parser.add_argument("--integrator", help="integrator: euler, leapfrog, yoshida4, adaptive, block or wisdom_holman (default euler)")
+    parser.add_argument("--theta", type=float, help="Barnes-Hut opening angle (default 0.5, or the checkpoint's)")
+    parser.add_argument("--workers", type=int, help="number of processes for the parallel engine")
+    parser.add_argument("--record", help="trajectory file to append states to")
+    parser.add_argument("--record-every", type=int, default=1, help="record every k-th step")
+    parser.add_argument("--softening", type=float, help="Plummer softening length, m (default 0, or the checkpoint's)")
+    parser.add_argument("--collisions", choices=("merge", "bounce"),
+                        help="handle collisions of bodies (with --resume, the checkpoint's setting by default)")
+    parser.add_argument("--collision-radius", type=float,
+                        help="physical radius of every body, m (default: from mass and density)")
+    parser.add_argument("--collision-density", type=float, help="density for radii from mass, kg/m^3")
+    parser.add_argument("--restitution", type=float, default=1.0, help="coefficient of restitution for bounce")
+    parser.add_argument("--diagnostics", help="CSV file for energy, momentum and centre-of-mass time series")
+    parser.add_argument("--diagnostics-every", type=int, default=1, help="steps between diagnostics samples")
+    parser.add_argument("--energy-limit", type=float, help="relative energy error that triggers --energy-action")
+    parser.add_argument("--energy-action", choices=("warn", "halve"), default="warn",
+                        help="warn, or halve dt when the energy limit is exceeded")
+    parser.add_argument("--frames", help="directory to write image frames to")
+    parser.add_argument("--frames-every", type=int, default=1, help="steps between frames")
+    parser.add_argument("--frames-format", choices=("png", "ppm"), default="png", help="frame image format")
+    parser.add_argument("--frames-size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"),
+                        help="frame size in pixels (default: the window size)")
+    parser.add_argument("--frames-scale", type=float, help="pixels per metre (default: fit the initial system)")
+    parser.add_argument("--checkpoint", help="checkpoint file, rewritten atomically in the background")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, help="steps between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoint given as input")
+    parser.add_argument("--profile", action="store_true", help="print per-phase timers and counters")
+    parser.add_argument("--profile-log", help="append periodic JSON lines with timers and counters")
+    parser.add_argument("--profile-interval", type=float, default=1.0, help="seconds between log lines")
+    parser.add_argument("--cprofile", help="file to dump cProfile statistics to")
+    parser.add_argument("--cprofile-steps", type=int, nargs=2, metavar=("FIRST", "LAST"),
+                        help="profile only steps FIRST..LAST (default: all)")
+    args = parser.parse_args(argv)
+    if args.dt is not None and not args.dt > 0:
+        parser.error("--dt must be positive")
+    return args
+
+
+def main(argv=None):
+    """Главная функция пакетного расчёта."""
+    args = parse_arguments(argv)
+    if args.workers is not None:
+        import solar_parallel
+        solar_parallel.workers = args.workers
+
+    if args.resume:
+        # смягчение, порог пробных частиц, угол раскрытия и столкновения — как при записи точки,
+        # если они не заданы явно
+        simulation = load_checkpoint(args.input)
+        if args.dt is not None:
+            simulation.dt = args.dt
+        if args.engine is not None or args.integrator is not None:
+            simulation.engine = args.engine or simulation.engine
+            simulation.integrator = args.integrator or simulation.integrator
+            simulation.integrator_state.clear()
+    else:
+        simulation = Simulation.from_file(args.input, args.dt if args.dt is not None else 1.0, args.engine or "numpy",
+                                          args.integrator or "euler")
+    if args.softening is not None:
+        solar_model.softening_length = args.softening
+    if args.theta is not None:
+        import solar_barnes_hut
+        solar_barnes_hut.opening_angle = args.theta
+    if args.collisions:
+        simulation.collisions = CollisionHandler(args.collisions, args.collision_radius, args.collision_density,
+                                                 args.restitution)
+    if args.record and simulation.collisions is not None and simulation.collisions.mode == "merge":
+        raise SystemExit("--record needs a constant number of bodies and cannot be used with --collisions merge")
+    if args.diagnostics or args.energy_limit is not None:
+        simulation.diagnostics = DiagnosticsMonitor(args.diagnostics_every, args.energy_limit,
+                                                    args.energy_action, args.diagnostics)
+        simulation.diagnostics.attach(simulation)
+    if args.frames:
+        width, height = args.frames_size or (window_width, window_height)
+        simulation.frames = FrameExporter(args.frames, args.frames_every, args.frames_format, width, height,
+                                          args.frames_scale)
+        simulation.frames.attach(simulation)
+    if args.checkpoint:
+        simulation.checkpointer = CheckpointWriter(args.checkpoint, args.checkpoint_every)
+    if args.record:
+        simulation.recorder = TrajectoryRecorder(args.record, simulation.space_objects, args.record_every)
+        simulation.recorder.record(simulation.physical_time, simulation.pos, simulation.vel)
+    if args.profile:
+        solar_profiling.enable()
+    if args.profile_log:
+        solar_profiling.start_log(args.profile_log, args.profile_interval)
+    if args.cprofile:
+        first, last = args.cprofile_steps or (1, float("inf"))
+        simulation.profiler = solar_profiling.StepProfiler(first, last, args.cprofile)
+    started = time.perf_counter()
+    simulation.run(steps=args.steps, until=args.time)
+    elapsed = time.perf_counter() - started
+    simulation.save(args.output)
+    if simulation.recorder is not None:
+        simulation.recorder.close()
+    if simulation.profiler is not None:
+        simulation.profiler.close()
+    if simulation.checkpointer is not None:
+        simulation.checkpointer.write_now(simulation)
+        simulation.checkpointer.close()
+    if simulation.diagnostics is not None:
+        simulation.diagnostics.close()
+    if simulation.frames is not None:
+        simulation.frames.close()
+    solar_profiling.stop_log()
+
+    rate = simulation.step_count / elapsed if elapsed > 0 else float("inf")
+    print(f"{simulation.step_count} steps, {simulation.physical_time:.1f} seconds simulated "
+          f"in {elapsed:.2f} s ({rate:.0f} steps/s, {simulation.force_evaluations:.10g} force evaluations)")
+    if simulation.diagnostics is not None:
+        latest = simulation.diagnostics.latest
+        print(f"relative energy error {latest['energy_error']:.3g}, centre-of-mass drift {latest['com_drift']:.3g} m, "
+              f"dt {simulation.dt:.6g}")
+    if simulation.frames is not None:
+        print(f"{simulation.frames.written} frames written to {simulation.frames.directory}, "
+              f"{simulation.frames.skipped} skipped")
+    if simulation.collisions is not None:
+        print(f"{simulation.collisions.collisions} collisions, {simulation.collisions.merged} bodies merged, "
+              f"{len(simulation.m)} left")
+    if solar_profiling.enabled:
+        for name, timer in solar_profiling.snapshot()["timers"].items():
+            print(f"  {name:<16} {timer['total']:9.3f} s  {timer['calls']:>9} calls  "
+                  f"{1000 * timer['mean']:9.3f} ms each")
+        for name, value in solar_profiling.snapshot()["counters"].items():
+            print(f"  {name:<16} {value:>9}")
+
+
+if __name__ == "__main__":
+    main()
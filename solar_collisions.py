@@ -0,0 +1,204 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Столкновения тел.
+
+У каждого тела есть физический радиус (не путать с экранным радиусом R):
+общий для всех, заданный массивом или вычисленный по массе и плотности.
+После каждого шага пары-кандидаты ищутся по равномерной пространственной
+хэш-сетке с ячейкой не меньше двух наибольших радиусов: сравниваются только
+тела из одной или соседних ячеек, так что в плотных системах не нужен
+перебор всех N² пар. Столкнувшиеся тела либо сливаются (с сохранением массы
+и импульса), либо упруго отскакивают друг от друга.
+
+Проверка идёт по положениям в конце шага, поэтому тела, пролетевшие друг
+сквозь друга за один шаг, не замечаются; шаг должен быть мал по сравнению
+с временем пролёта радиуса.
+"""
+
+import math
+
+import numpy as np
+
+default_density = 1400.0
+"""Плотность, кг/м³, по которой вычисляются радиусы, если они не заданы (примерно средняя плотность Солнца)."""
+
+max_cells = 1 << 20
+"""Наибольшее число ячеек сетки вдоль одной оси; при большом разбросе координат ячейки укрупняются."""
+
+
+def physical_radii(m, density=default_density):
+    """Возвращает радиусы шаров массы **m** и плотности **density**."""
+    return np.cbrt(3 * np.asarray(m, dtype=float) / (4 * math.pi * density))
+
+
+def candidate_pairs(pos, cell):
+    """Возвращает массивы (i, j) индексов пар тел из одной или соседних ячеек
+    квадратной сетки со стороной **cell**; каждая пара встречается один раз.
+
+    Параметры:
+
+    **pos** — массив координат формы (N, 2).
+    **cell** — сторона ячейки (не меньше суммы радиусов любых двух тел).
+    """
+    n = len(pos)
+    if n < 2 or not cell > 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    low = pos.min(axis=0)
+    cell = max(cell, (pos.max(axis=0) - low).max() / max_cells)
+    cells = np.floor((pos - low) / cell).astype(np.int64)
+    stride = int(cells[:, 1].max()) + 3
+    key = cells[:, 0] * stride + cells[:, 1] + 1  # +1: у соседа снизу номер строки не меньше 0
+    order = np.argsort(key, kind="stable")
+    sorted_key = key[order]
+    rank = np.empty(n, dtype=np.intp)
+    rank[order] = np.arange(n)
+
+    pairs_i, pairs_j = [], []
+    # половина окрестности: своя ячейка и четыре соседние, чтобы каждая пара ячеек встретилась один раз
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        neighbour = key + dx * stride + dy
+        first = np.searchsorted(sorted_key, neighbour, side="left")
+        last = np.searchsorted(sorted_key, neighbour, side="right")
+        if dx == dy == 0:
+            first = rank + 1  # в своей ячейке — только тела после данного
+        counts = np.maximum(last - first, 0)
+        total = int(counts.sum())
+        if not total:
+            continue
+        starts = np.cumsum(counts) - counts
+        offsets = np.arange(total) - np.repeat(starts, counts)
+        pairs_i.append(np.repeat(np.arange(n), counts))
+        pairs_j.append(order[np.repeat(first, counts) + offsets])
+    if not pairs_i:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    return np.concatenate(pairs_i), np.concatenate(pairs_j)
+
+
+def _groups(i, j):
+    """Объединяет тела, связанные парами (i, j), в группы. Возвращает массив
+    участвующих тел и массив номеров их групп (номер — индекс представителя группы)."""
+    bodies = np.unique(np.concatenate([i, j]))
+    parent = {k: k for k in bodies.tolist()}
+
+    def root(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    for a, b in zip(i.tolist(), j.tolist()):
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    return bodies, np.array([root(k) for k in bodies.tolist()], dtype=np.intp)
+
+
+class CollisionHandler:
+    """Обработка столкновений после шага расчёта.
+
+    Параметры конструктора:
+
+    **mode** — "merge" (слияние) или "bounce" (отскок).
+    **radius** — физический радиус, м: число (одинаковый для всех) или массив
+    по телам; None — радиусы вычисляются по массе и плотности **density**.
+    **density** — плотность, кг/м³, для радиусов по массе (по умолчанию **default_density**).
+    **restitution** — коэффициент восстановления при отскоке (1 — абсолютно упругий удар).
+
+    Атрибуты **collisions** и **merged** — число обработанных пар и слитых тел.
+    """
+
+    def __init__(self, mode="merge", radius=None, density=None, restitution=1.0):
+        if mode not in ("merge", "bounce"):
+            raise ValueError(f"Unknown collision mode: {mode}")
+        self.mode = mode
+        self.radius = radius if radius is None or np.ndim(radius) == 0 else np.array(radius, dtype=float)
+        self.density = default_density if density is None else density
+        self.restitution = restitution
+        self.collisions = 0
+        self.merged = 0
+
+    def radii(self, m):
+        """Возвращает физические радиусы тел с массами **m**."""
+        if self.radius is None:
+            return physical_radii(m, self.density)
+        if np.ndim(self.radius) == 0:
+            return np.full(len(m), float(self.radius))
+        return np.asarray(self.radius, dtype=float)
+
+    def find(self, pos, m):
+        """Возвращает массивы (i, j) пар перекрывающихся тел."""
+        radii = self.radii(m)
+        if not len(radii):
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        i, j = candidate_pairs(pos, 2 * radii.max())
+        d = pos[j] - pos[i]
+        touching = (d * d).sum(axis=1) < (radii[i] + radii[j]) ** 2
+        return i[touching], j[touching]
+
+    def apply(self, simulation):
+        """Обрабатывает столкновения в расчёте solar_simulation.Simulation.
+        Возвращает число столкнувшихся пар."""
+        i, j = self.find(simulation.pos, simulation.m)
+        if not len(i):
+            return 0
+        self.collisions += len(i)
+        if self.mode == "bounce":
+            self.bounce(simulation.pos, simulation.vel, simulation.m, i, j)
+        else:
+            removed = self.merge(simulation.space_objects, simulation.pos, simulation.vel, simulation.m, i, j)
+            if np.ndim(self.radius) == 1:
+                self.radius = np.delete(self.radius, removed)
+            simulation.remove_bodies(removed)
+            self.merged += len(removed)
+        return len(i)
+
+    def merge(self, space_objects, pos, vel, m, i, j):
+        """Сливает каждую группу столкнувшихся тел в самое массивное из них:
+        масса складывается, положение — центр масс, скорость сохраняет импульс,
+        экранный и физический радиусы соответствуют сумме объёмов.
+        Возвращает индексы поглощённых тел (их ещё нужно удалить)."""
+        members, labels = _groups(i, j)
+        radii = self.radii(m)
+        removed = []
+        for group in np.unique(labels).tolist():
+            bodies = members[labels == group]
+            survivor = int(bodies[np.argmax(m[bodies])])
+            mass = m[bodies].sum()
+            # группа из одних пробных частиц (масса 0) сливается в среднюю точку
+            weights = m[bodies] if mass > 0 else np.ones(len(bodies))
+            pos[survivor] = (weights[:, None] * pos[bodies]).sum(axis=0) / weights.sum()
+            vel[survivor] = (weights[:, None] * vel[bodies]).sum(axis=0) / weights.sum()
+            display = np.cbrt(sum(space_objects[k].R ** 3 for k in bodies.tolist()))
+            if np.ndim(self.radius) == 1:
+                self.radius[survivor] = np.cbrt((radii[bodies] ** 3).sum())
+            m[survivor] = mass
+            space_objects[survivor].m = float(mass)
+            space_objects[survivor].R = float(display)
+            removed += [k for k in bodies.tolist() if k != survivor]
+        return np.array(sorted(removed), dtype=np.intp)
+
+    def bounce(self, pos, vel, m, i, j):
+        """Отскок: сближающиеся пары получают импульс вдоль линии центров,
+        а перекрытие убирается сдвигом тел обратно пропорционально массам."""
+        radii = self.radii(m)
+        d = pos[j] - pos[i]
+        dist = np.sqrt((d * d).sum(axis=1))
+        normal = d / np.maximum(dist, 1e-300)[:, None]
+        # пробная частица (масса 0) отскакивает от массивного тела, не сдвигая его
+        massive = m[m > 0]
+        mass = np.where(m > 0, m, massive.min() * 1e-12 if len(massive) else 1.0)
+        inverse_i, inverse_j = 1 / mass[i], 1 / mass[j]
+        share = inverse_i + inverse_j
+        approach = ((vel[j] - vel[i]) * normal).sum(axis=1)
+        impulse = np.where(approach < 0, -(1 + self.restitution) * approach / share, 0.0)
+        np.add.at(vel, i, -(impulse * inverse_i)[:, None] * normal)
+        np.add.at(vel, j, (impulse * inverse_j)[:, None] * normal)
+        overlap = np.maximum(radii[i] + radii[j] - dist, 0.0) / share
+        np.add.at(pos, i, -(overlap * inverse_i)[:, None] * normal)
+        np.add.at(pos, j, (overlap * inverse_j)[:, None] * normal)
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
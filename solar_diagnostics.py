@@ -0,0 +1,154 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Контроль сохраняющихся величин: полная энергия, импульс, момент импульса
+и смещение центра масс.
+
+Потенциальная энергия берётся из того же прохода по парам, что и силы:
+пока к расчёту подключён DiagnosticsMonitor, движки возвращают вместе с
+ускорениями потенциал в точках тел, и шаг запоминает его в состоянии
+интегратора (state["phi"], state["phi_pos"]). Если последний проход был не в
+текущей точке (например, у метода Эйлера), делается новый проход, а его
+ускорения кладутся в кэш интегратора, так что следующий шаг их не пересчитывает.
+Остальные величины считаются за O(N).
+"""
+
+import csv
+import warnings
+
+import numpy as np
+
+import solar_engine
+
+fields = ("step", "time", "dt", "kinetic", "potential", "energy", "energy_error",
+          "momentum_x", "momentum_y", "angular_momentum", "com_x", "com_y", "com_drift")
+"""Поля записи временного ряда (и столбцы CSV-файла)."""
+
+
+def potential_field(simulation):
+    """Возвращает потенциал в точках тел для текущего состояния расчёта,
+    по возможности без нового прохода по парам."""
+    state = simulation.integrator_state
+    phi_pos = state.get("phi_pos")
+    if phi_pos is not None and phi_pos.shape == simulation.pos.shape and np.array_equal(phi_pos, simulation.pos):
+        return state["phi"]
+    function = solar_engine.get_acceleration_function(simulation.engine)
+    acc, phi = function(simulation.pos, simulation.m, sources=solar_engine.field_sources(simulation.m),
+                        potential=True)
+    state["acc"], state["acc_pos"] = acc, simulation.pos.copy()
+    state["phi"], state["phi_pos"] = phi, simulation.pos.copy()
+    state["force_evaluations"] = state.get("force_evaluations", 0) + 1
+    return phi
+
+
+def measure(simulation):
+    """Возвращает словарь с сохраняющимися величинами для текущего состояния расчёта
+    (без полей energy_error и com_drift, которые считаются относительно начала ряда)."""
+    pos, vel, m = simulation.pos, simulation.vel, simulation.m
+    phi = potential_field(simulation)
+    mass = m.sum()
+    momentum = (m[:, None] * vel).sum(axis=0)
+    com = (m[:, None] * pos).sum(axis=0) / mass if mass else np.zeros(2)
+    kinetic = 0.5 * (m * (vel * vel).sum(axis=1)).sum()
+    potential = 0.5 * (m * phi).sum()
+    return {
+        "step": simulation.step_count, "time": simulation.physical_time, "dt": simulation.dt,
+        "kinetic": kinetic, "potential": potential, "energy": kinetic + potential,
+        "momentum_x": momentum[0], "momentum_y": momentum[1],
+        "angular_momentum": (m * (pos[:, 0] * vel[:, 1] - pos[:, 1] * vel[:, 0])).sum(),
+        "com_x": com[0], "com_y": com[1], "mass": mass,
+    }
+
+
+class DiagnosticsMonitor:
+    """Временной ряд сохраняющихся величин расчёта solar_simulation.Simulation.
+
+    Параметры конструктора:
+
+    **every** — снимать величины после каждого every-го шага.
+    **energy_limit** — допустимая относительная ошибка энергии или None.
+    **action** — что делать при превышении: "warn" (предупреждение) или
+    "halve" (уменьшить dt вдвое; ошибка дальше отсчитывается от текущей энергии).
+    **filename** — CSV-файл, куда дописываются записи, или None.
+
+    Атрибуты:
+
+    **records** — список записей (словари с полями **fields**).
+    **latest** — последняя запись или None.
+    """
+
+    def __init__(self, every=1, energy_limit=None, action="warn", filename=None):
+        if action not in ("warn", "halve"):
+            raise ValueError(f"Unknown energy limit action: {action}")
+        self.every = every
+        self.energy_limit = energy_limit
+        self.action = action
+        self.records = []
+        self.latest = None
+        self._reference = None
+        self._warned = False
+        self._file = None
+        self._writer = None
+        if filename is not None:
+            self._file = open(filename, "w", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=fields, extrasaction="ignore")
+            self._writer.writeheader()
+
+    def attach(self, simulation):
+        """Включает расчёт потенциала вместе с силами и снимает начальную запись."""
+        simulation.integrator_state["track_potential"] = True
+        self.sample(simulation)
+
+    def update(self, simulation):
+        """Вызывается после каждого шага."""
+        simulation.integrator_state["track_potential"] = True
+        if simulation.step_count % self.every == 0:
+            self.sample(simulation)
+
+    def sample(self, simulation):
+        """Снимает запись для текущего состояния расчёта и проверяет порог энергии."""
+        record = measure(simulation)
+        if self._reference is None:
+            self._reference = record
+        reference = self._reference
+        energy0 = reference["energy"]
+        record["energy_error"] = abs((record["energy"] - energy0) / energy0) if energy0 else 0.0
+        # центр масс замкнутой системы движется равномерно со скоростью P / M
+        elapsed = record["time"] - reference["time"]
+        expected = np.array([reference["com_x"], reference["com_y"]])
+        if reference["mass"]:
+            expected = expected + elapsed * np.array([reference["momentum_x"], reference["momentum_y"]]) / reference["mass"]
+        record["com_drift"] = float(np.hypot(record["com_x"] - expected[0], record["com_y"] - expected[1]))
+        self.records.append(record)
+        self.latest = record
+        if self._writer is not None:
+            self._writer.writerow(record)
+        if self.energy_limit is not None:
+            if record["energy_error"] > self.energy_limit:
+                self._exceeded(simulation, record)
+            else:
+                self._warned = False
+        return record
+
+    def _exceeded(self, simulation, record):
+        if self.action == "halve":
+            simulation.dt /= 2
+            self._reference = dict(record)
+            warnings.warn(f"relative energy error {record['energy_error']:.3g} at t={record['time']:.6g}; "
+                          f"dt halved to {simulation.dt:.6g}", RuntimeWarning)
+        elif not self._warned:
+            self._warned = True  # до возвращения ошибки в допуск предупреждение не повторяется
+            warnings.warn(f"relative energy error {record['energy_error']:.3g} exceeds "
+                          f"{self.energy_limit:.3g} at t={record['time']:.6g}", RuntimeWarning)
+
+    def close(self):
+        """Закрывает CSV-файл."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
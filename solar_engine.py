@@ -0,0 +1,255 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Векторизованный движок расчёта сил на NumPy.
+Координаты, скорости и массы тел хранятся в непрерывных массивах,
+попарные ускорения считаются блоками (тайлами) размером не больше
+**block_size** × **block_size**, поэтому память остаётся ограниченной
+при любом числе тел.
+"""
+
+import importlib
+
+import numpy as np
+
+import solar_integrators
+import solar_model
+import solar_profiling
+from solar_model import gravitational_constant
+from solar_objects import BodyStore
+
+block_size = 512
+"""Размер тайла (число целевых тел и число тел-источников) при попарном расчёте.
+Тип: int"""
+
+
+def pack_space_objects(space_objects):
+    """Собирает координаты, скорости и массы объектов в массивы.
+    Возвращает кортеж (pos, vel, m): pos и vel имеют форму (N, 2), m — (N,).
+    Для хранилища BodyStore возвращаются его собственные массивы без копирования,
+    так что изменение pos и vel меняет тела хранилища.
+
+    Параметры:
+
+    **space_objects** — список космических объектов или BodyStore.
+    """
+    if isinstance(space_objects, BodyStore):
+        return space_objects.pos, space_objects.vel, space_objects.m
+    pos = np.array([(obj.x, obj.y) for obj in space_objects], dtype=float).reshape(-1, 2)
+    vel = np.array([(obj.Vx, obj.Vy) for obj in space_objects], dtype=float).reshape(-1, 2)
+    m = np.array([obj.m for obj in space_objects], dtype=float)
+    return pos, vel, m
+
+
+def unpack_space_objects(space_objects, pos, vel, acc=None, m=None):
+    """Записывает координаты и скорости из массивов обратно в объекты.
+    Если переданы ускорения **acc** и массы **m**, записывает и силы Fx, Fy.
+
+    Параметры:
+
+    **space_objects** — список космических объектов или BodyStore.
+    **pos**, **vel** — массивы координат и скоростей формы (N, 2).
+    **acc** — массив ускорений формы (N, 2) или None.
+    **m** — массив масс формы (N,) или None.
+    """
+    if isinstance(space_objects, BodyStore):
+        space_objects.pos[...] = pos
+        space_objects.vel[...] = vel
+        if acc is not None and m is not None:
+            space_objects.force[...] = acc * m[:, None]
+        return
+    for obj, (x, y), (vx, vy) in zip(space_objects, pos.tolist(), vel.tolist()):
+        obj.x, obj.y = x, y
+        obj.Vx, obj.Vy = vx, vy
+    if acc is not None and m is not None:
+        forces = acc * m[:, None]
+        for obj, (fx, fy) in zip(space_objects, forces.tolist()):
+            obj.Fx, obj.Fy = fx, fy
+
+
+def field_sources(m):
+    """Возвращает индексы тел, создающих поле (массивнее solar_model.test_particle_mass),
+    или None, если поле создают все тела."""
+    massive = m > solar_model.test_particle_mass
+    if massive.all():
+        return None
+    return np.flatnonzero(massive)
+
+
+def calculate_accelerations(pos, m, targets=None, sources=None, potential=False):
+    """Вычисляет гравитационные ускорения прямым суммированием по всем парам.
+    Возвращает массив формы (len(targets), 2), а при **potential** — пару
+    (ускорения, гравитационный потенциал в точках целевых тел формы (len(targets),)),
+    посчитанных за один проход.
+
+    Параметры:
+
+    **pos** — массив координат формы (N, 2).
+    **m** — массив масс формы (N,).
+    **targets** — индексы тел, для которых считается ускорение (по умолчанию все).
+    **sources** — индексы тел, создающих поле (по умолчанию все).
+    **potential** — вычислить и потенциал.
+    """
+    n = len(pos)
+    targets = np.arange(n) if targets is None else np.asarray(targets)
+    sources = np.arange(n) if sources is None else np.asarray(sources)
+    acc = np.zeros((len(targets), 2))
+    phi = np.zeros(len(targets)) if potential else None
+    eps2 = solar_model.softening_length ** 2
+    # при немногих источниках (пробные частицы) тайл вытягивается по целевым телам,
+    # чтобы число элементов в нём и число проходов цикла оставались прежними
+    target_block = max(block_size, block_size * block_size // max(len(sources), 1))
+    for t0 in range(0, len(targets), target_block):
+        tgt = targets[t0:t0 + target_block]
+        tx = pos[tgt, 0][:, None]
+        ty = pos[tgt, 1][:, None]
+        for s0 in range(0, len(sources), block_size):
+            src = sources[s0:s0 + block_size]
+            dx = pos[src, 0][None, :] - tx
+            dy = pos[src, 1][None, :] - ty
+            r2 = dx * dx + dy * dy + eps2
+            r2[tgt[:, None] == src[None, :]] = np.inf  # тело не действует само на себя
+            r = np.sqrt(r2)
+            w = m[src][None, :] / (r2 * r)
+            acc[t0:t0 + len(tgt), 0] += (w * dx).sum(axis=1)
+            acc[t0:t0 + len(tgt), 1] += (w * dy).sum(axis=1)
+            if potential:
+                phi[t0:t0 + len(tgt)] -= (m[src][None, :] / r).sum(axis=1)
+    if potential:
+        return gravitational_constant * acc, gravitational_constant * phi
+    return gravitational_constant * acc
+
+
+def calculate_accelerations_batched(pos, m):
+    """Вычисляет ускорения сразу для ансамбля одинаковых по размеру систем.
+    Все пары считаются одним массивом, поэтому функция предназначена для
+    небольших систем (память — O(B * N * N)).
+
+    Параметры:
+
+    **pos** — массив координат формы (B, N, 2).
+    **m** — массив масс формы (B, N).
+    """
+    n = pos.shape[1]
+    d = pos[:, None, :, :] - pos[:, :, None, :]
+    r2 = (d * d).sum(axis=-1) + solar_model.softening_length ** 2
+    r2[:, np.arange(n), np.arange(n)] = np.inf  # тело не действует само на себя
+    w = m[:, None, :] / (r2 * np.sqrt(r2))
+    return gravitational_constant * np.einsum("bij,bijk->bik", w, d)
+
+
+def python_accelerations(pos, m, targets=None, sources=None, potential=False):
+    """Вычисляет ускорения исходным циклом по парам тел на чистом Python
+    (как solar_model.calculate_force). Интерфейс как у calculate_accelerations."""
+    n = len(pos)
+    targets = range(n) if targets is None else np.asarray(targets).tolist()
+    sources = range(n) if sources is None else np.asarray(sources).tolist()
+    points = pos.tolist()
+    masses = m.tolist()
+    eps2 = solar_model.softening_length ** 2
+    acc = []
+    phi = []
+    for i in targets:
+        x, y = points[i]
+        ax = ay = u = 0.0
+        for j in sources:
+            if i == j:
+                continue
+            dx = points[j][0] - x
+            dy = points[j][1] - y
+            r = (dx ** 2 + dy ** 2) ** 0.5
+            if eps2:
+                f = gravitational_constant * masses[j] * r / (r ** 2 + eps2) ** 1.5
+            else:
+                f = gravitational_constant * masses[j] / (r ** 2)
+            ax += f * dx / r
+            ay += f * dy / r
+            if potential:
+                u -= gravitational_constant * masses[j] / (r ** 2 + eps2) ** 0.5
+        acc.append((ax, ay))
+        phi.append(u)
+    if potential:
+        return np.array(acc, dtype=float).reshape(-1, 2), np.array(phi, dtype=float)
+    return np.array(acc, dtype=float).reshape(-1, 2)
+
+
+engines = {
+    "numpy": calculate_accelerations,
+    "python": python_accelerations,
+}
+"""Функции расчёта ускорений по имени движка."""
+
+engine_modules = {
+    "barnes_hut": "solar_barnes_hut",
+    "parallel": "solar_parallel",
+}
+"""Модули, которые при импорте регистрируют свой движок в **engines**."""
+
+
+def get_acceleration_function(engine):
+    """Возвращает функцию расчёта ускорений для движка с именем **engine**."""
+    if engine not in engines and engine in engine_modules:
+        importlib.import_module(engine_modules[engine])
+    try:
+        return engines[engine]
+    except KeyError:
+        raise ValueError(f"Unknown engine: {engine}") from None
+
+
+def step_arrays(pos, vel, m, dt, engine="numpy", integrator="euler", state=None):
+    """Выполняет один шаг интегрирования над массивами (на месте).
+    Возвращает массив ускорений, вычисленных последними.
+
+    Параметры:
+
+    **pos**, **vel** — массивы координат и скоростей формы (N, 2).
+    **m** — массив масс.
+    **dt** — шаг по времени.
+    **engine** — имя движка расчёта сил.
+    **integrator** — имя интегратора (см. solar_integrators.integrators).
+    **state** — словарь состояния интегратора между шагами.
+    """
+    acceleration_function = get_acceleration_function(engine)
+    state = {} if state is None else state
+    sources = field_sources(m)
+    if state.get("track_potential"):
+        # потенциал считается в том же проходе, что и силы, и запоминается вместе с точкой
+        def full_pass(p, targets=None):
+            if targets is not None and len(targets) != len(p):
+                return acceleration_function(p, m, targets, sources)
+            acc, phi = acceleration_function(p, m, targets, sources, potential=True)
+            state["phi"], state["phi_pos"] = phi, p.copy()
+            return acc
+        accel = solar_profiling.timed("force", full_pass)
+    else:
+        accel = solar_profiling.timed("force", lambda p, targets=None: acceleration_function(p, m, targets, sources))
+    with solar_profiling.phase("step"):
+        if integrator in solar_integrators.mass_integrators:
+            solar_integrators.get_integrator(integrator)(pos, vel, dt, accel, state, m)
+        else:
+            solar_integrators.get_integrator(integrator)(pos, vel, dt, accel, state)
+    solar_profiling.count("steps")
+    return state["acc"]
+
+
+def recalculate_space_objects_positions(space_objects, dt, engine="numpy", integrator="euler", state=None):
+    """Пересчитывает координаты объектов векторизованным движком.
+    С интегратором "euler" даёт те же траектории, что и
+    solar_model.recalculate_space_objects_positions, с точностью до ошибок округления.
+
+    Параметры:
+
+    **space_objects** — список объектов, для которых нужно пересчитать координаты.
+    **dt** — шаг по времени.
+    **engine** — имя движка расчёта сил.
+    **integrator** — имя интегратора.
+    **state** — словарь состояния интегратора между шагами.
+    """
+    pos, vel, m = pack_space_objects(space_objects)
+    acc = step_arrays(pos, vel, m, dt, engine, integrator, state)
+    unpack_space_objects(space_objects, pos, vel, acc, m)
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
@@ -0,0 +1,205 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Ансамблевые расчёты: много вариантов одной системы с разными параметрами.
+
+Спецификация перебора — JSON-файл, например:
+    {
+        "dt": [500, 1000],
+        "mass_scale": [1.0, 1.01],
+        "velocity_perturbation": 1e-4,
+        "samples": 20,
+        "seed": 1,
+        "time": 3.15e7,
+        "integrator": "leapfrog"
+    }
+Варианты — все сочетания dt × mass_scale × номер выборки; вместо списка
+для dt и mass_scale можно указать одно число. В каждом варианте
+массы умножаются на mass_scale, а к скоростям добавляется нормальный шум с
+относительным стандартным отклонением velocity_perturbation.
+
+Небольшие системы с одинаковым dt собираются в пачки по дополнительной оси
+ансамбля, и один векторизованный шаг продвигает сразу всю пачку (кроме
+интеграторов, выбирающих шаг по всем телам, — их варианты считаются по одному,
+чтобы не зависеть друг от друга). Пачки
+считаются параллельно в пуле процессов, сводка по всем вариантам пишется
+в один CSV-файл.
+
+Пример:
+    python solar_ensemble.py double_star.txt sweep.json summary.csv --workers 4
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import solar_engine
+import solar_integrators
+from solar_input import read_space_objects_data_from_file
+from solar_model import gravitational_constant
+
+batch_size = 256
+"""Наибольшее число вариантов в одной пачке."""
+
+batch_max_bodies = 64
+"""Системы с большим числом тел считаются поодиночке выбранным движком."""
+
+summary_fields = ("member", "dt", "mass_scale", "sample", "steps",
+                  "energy_error", "radius_ratio", "final_separation")
+"""Столбцы файла сводки."""
+
+
+def _values(spec, key, default):
+    """Возвращает список значений параметра перебора **key** (одно число — список из него)."""
+    values = spec.get(key, [default])
+    if isinstance(values, (int, float)):
+        return [values]
+    if not isinstance(values, list) or not all(isinstance(value, (int, float)) for value in values):
+        raise ValueError(f"Ensemble parameter {key!r} must be a number or a list of numbers, got {values!r}")
+    return values
+
+
+def make_members(spec):
+    """Возвращает список вариантов ансамбля (словарей параметров) по спецификации."""
+    dts = _values(spec, "dt", 1.0)
+    scales = _values(spec, "mass_scale", 1.0)
+    samples = range(spec.get("samples", 1))
+    members = []
+    for number, (dt, scale, sample) in enumerate(itertools.product(dts, scales, samples)):
+        steps = spec["steps"] if "steps" in spec else math.ceil(spec["time"] / dt - 1e-9)
+        members.append({"member": number, "dt": dt, "mass_scale": scale, "sample": sample, "steps": steps})
+    return members
+
+
+def initial_state(base, member, spec):
+    """Строит начальное состояние варианта по базовой системе.
+
+    Параметры:
+
+    **base** — кортеж (pos, vel, m) базовой системы.
+    **member** — параметры варианта.
+    **spec** — спецификация перебора.
+    """
+    pos, vel, m = base
+    rng = np.random.default_rng([spec.get("seed", 0), member["member"]])
+    sigma = spec.get("velocity_perturbation", 0.0)
+    speed = np.hypot(vel[:, 0], vel[:, 1])[:, None]
+    vel = vel + sigma * speed * rng.standard_normal(vel.shape)
+    return pos.copy(), vel, m * member["mass_scale"]
+
+
+def _energy_and_radius(pos, vel, m):
+    """Полная энергия, наибольшее расстояние от центра масс и наименьшее расстояние
+    между телами для каждого варианта пачки (массивы формы (B, N, 2) и (B, N))."""
+    d = pos[:, None, :, :] - pos[:, :, None, :]
+    r = np.sqrt((d * d).sum(axis=-1))
+    n = pos.shape[1]
+    r[:, np.arange(n), np.arange(n)] = np.inf
+    potential = -0.5 * gravitational_constant * (m[:, :, None] * m[:, None, :] / r).sum(axis=(1, 2))
+    kinetic = 0.5 * (m * (vel * vel).sum(axis=-1)).sum(axis=1)
+    com = (m[:, :, None] * pos).sum(axis=1) / m.sum(axis=1)[:, None]
+    radius = np.sqrt(((pos - com[:, None, :]) ** 2).sum(axis=-1)).max(axis=1)
+    return kinetic + potential, radius, r.min(axis=(1, 2))
+
+
+def _batchable(n, integrator_name):
+    """Можно ли шагать варианты из **n** тел интегратором **integrator_name** одной пачкой.
+    Интеграторы, которые выбирают шаг по всему массиву тел, считают варианты по одному,
+    иначе результат варианта зависел бы от соседей по пачке."""
+    per_member = (solar_integrators.partial_force_integrators | solar_integrators.mass_integrators |
+                  solar_integrators.adaptive_integrators)
+    return n <= batch_max_bodies and integrator_name not in per_member
+
+
+def run_batch(task):
+    """Считает пачку вариантов с одинаковыми dt и числом шагов.
+    Возвращает список строк сводки."""
+    base, members, spec = task
+    states = [initial_state(base, member, spec) for member in members]
+    pos = np.stack([state[0] for state in states])
+    vel = np.stack([state[1] for state in states])
+    m = np.stack([state[2] for state in states])
+    dt = members[0]["dt"]
+    steps = members[0]["steps"]
+    integrator_name = spec.get("integrator", "euler")
+    integrator = solar_integrators.get_integrator(integrator_name)
+
+    energy0, radius0, _ = _energy_and_radius(pos, vel, m)
+    if _batchable(pos.shape[1], integrator_name):
+        state = {}
+        for _ in range(steps):
+            integrator(pos, vel, dt, lambda p: solar_engine.calculate_accelerations_batched(p, m), state)
+    else:
+        engine = spec.get("engine", "numpy")
+        for b in range(len(members)):
+            state = {}
+            for _ in range(steps):
+                solar_engine.step_arrays(pos[b], vel[b], m[b], dt, engine, integrator_name, state)
+    energy, radius, separation = _energy_and_radius(pos, vel, m)
+
+    rows = []
+    for b, member in enumerate(members):
+        row = dict(member)
+        row["energy_error"] = abs((energy[b] - energy0[b]) / energy0[b]) if energy0[b] else 0.0
+        row["radius_ratio"] = radius[b] / radius0[b] if radius0[b] else 0.0
+        row["final_separation"] = separation[b]
+        rows.append(row)
+    return rows
+
+
+def make_batches(base, members, spec):
+    """Разбивает варианты на пачки с одинаковыми dt и числом шагов."""
+    size = batch_size if _batchable(len(base[2]), spec.get("integrator", "euler")) else 1
+    tasks = []
+    for _, group in itertools.groupby(sorted(members, key=lambda mb: (mb["dt"], mb["steps"])),
+                                        key=lambda mb: (mb["dt"], mb["steps"])):
+        group = list(group)
+        for start in range(0, len(group), size):
+            tasks.append((base, group[start:start + size], spec))
+    return tasks
+
+
+def run_ensemble(input_filename, spec, output_filename, workers=None):
+    """Считает все варианты ансамбля и записывает сводку в CSV-файл.
+
+    Параметры:
+
+    **input_filename** — базовая система в формате solar_system.txt.
+    **spec** — спецификация перебора (словарь).
+    **output_filename** — имя файла сводки.
+    **workers** — число процессов (None — по числу ядер).
+    """
+    base = solar_engine.pack_space_objects(read_space_objects_data_from_file(input_filename))
+    members = make_members(spec)
+    with ProcessPoolExecutor(workers) as pool:
+        rows = [row for batch in pool.map(run_batch, make_batches(base, members, spec)) for row in batch]
+    rows.sort(key=lambda row: row["member"])
+    with open(output_filename, "w", newline="") as out_file:
+        writer = csv.DictWriter(out_file, fieldnames=summary_fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    return rows
+
+
+def main(argv=None):
+    """Главная функция ансамблевого расчёта."""
+    parser = argparse.ArgumentParser(description="Run an ensemble of perturbed systems.")
+    parser.add_argument("input", help="base system in solar_system.txt format")
+    parser.add_argument("spec", help="JSON sweep specification")
+    parser.add_argument("output", help="CSV file for per-member summary")
+    parser.add_argument("--workers", type=int, help="number of processes")
+    args = parser.parse_args(argv)
+    with open(args.spec) as spec_file:
+        spec = json.load(spec_file)
+    rows = run_ensemble(args.input, spec, args.output, args.workers)
+    print(f"{len(rows)} members written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Вывод кадров расчёта в файлы изображений без окна и без tkinter.
+
+FrameExporter после каждого every-го шага снимает копию координат и
+внешнего вида тел и отдаёт её пулу фоновых потоков. Там кадр рисуется
+прямо в массив пикселей NumPy (rasterize) в тех же экранных координатах,
+что и у окна (solar_vis.screen_positions), и кодируется в PPM или PNG.
+Шаги не ждут ни рисования, ни кодирования, ни диска. В очереди лежат только
+копии координат и радиусов, поэтому она ограничена объёмом (**max_queue_bytes**),
+а не числом кадров; если объём исчерпан, очередной кадр пропускается
+(счётчик **skipped**).
+
+Кадры нумеруются подряд (frame000000.png, frame000001.png, ...), так что из
+них сразу собирается видео, например:
+    ffmpeg -framerate 30 -i frames/frame%06d.png run.mp4
+"""
+
+import functools
+import os
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from solar_objects import BodyStore
+from solar_vis import screen_positions, window_height, window_width
+
+named_colors = {
+    "black": (0, 0, 0), "white": (255, 255, 255), "red": (255, 0, 0), "green": (0, 255, 0),
+    "blue": (0, 0, 255), "yellow": (255, 255, 0), "cyan": (0, 255, 255), "magenta": (255, 0, 255),
+    "orange": (255, 165, 0), "gray": (190, 190, 190), "grey": (190, 190, 190), "brown": (165, 42, 42),
+    "pink": (255, 192, 203), "purple": (160, 32, 240), "violet": (238, 130, 238), "gold": (255, 215, 0),
+}
+"""Цвета tkinter по имени (значения как в X11); неизвестные имена рисуются белым."""
+
+default_workers = min(4, os.cpu_count() or 1)
+"""Число фоновых потоков рисования и кодирования по умолчанию."""
+
+default_max_queue_bytes = 256 * 2 ** 20
+"""Объём очереди кадров, ожидающих рисования, по умолчанию, байт."""
+
+
+def parse_color(color):
+    """Возвращает (r, g, b) для имени цвета tkinter или записи вида #rgb / #rrggbb."""
+    color = color.strip().lower()
+    if color.startswith("#") and len(color) in (4, 7):
+        digits = color[1:] if len(color) == 7 else "".join(c * 2 for c in color[1:])
+        try:
+            return tuple(int(digits[k:k + 2], 16) for k in (0, 2, 4))
+        except ValueError:
+            pass
+    return named_colors.get(color.replace(" ", ""), named_colors["white"])
+
+
+def appearance(space_objects):
+    """Возвращает экранные радиусы, номера цветов и палитру (K, 3) тел.
+
+    Параметры:
+
+    **space_objects** — хранилище BodyStore или список космических объектов.
+    """
+    if isinstance(space_objects, BodyStore):
+        radius = space_objects.R.copy()
+        color_index = space_objects.color_index.astype(np.intp)
+        colors = space_objects.colors
+    else:
+        codes = {}
+        radius = np.array([obj.R for obj in space_objects], dtype=float)
+        color_index = np.array([codes.setdefault(obj.color, len(codes)) for obj in space_objects], dtype=np.intp)
+        colors = list(codes)
+    palette = np.array([parse_color(color) for color in colors] or [named_colors["white"]], dtype=np.uint8)
+    return radius, color_index, palette
+
+
+@functools.lru_cache(maxsize=None)
+def _disk_offsets(r):
+    """Смещения пикселей круга целого радиуса **r** относительно центра, форма (K, 2)."""
+    dx, dy = np.meshgrid(np.arange(-r, r + 1), np.arange(-r, r + 1))
+    inside = dx * dx + dy * dy <= r * r
+    return np.stack([dx[inside], dy[inside]], axis=1).astype(np.int64)
+
+
+def rasterize(screen, radius, color_index, palette, width=window_width, height=window_height,
+              background=(0, 0, 0)):
+    """Рисует тела кругами в новый массив пикселей формы (height, width, 3), uint8.
+    Тела идут в порядке номеров: более поздние рисуются поверх более ранних,
+    как элементы холста tkinter.
+
+    Параметры:
+
+    **screen** — экранные координаты тел формы (N, 2) (см. solar_vis.screen_positions).
+    **radius** — экранные радиусы тел; тела радиуса меньше 1 занимают один пиксель.
+    **color_index**, **palette** — номера цветов тел и палитра (K, 3).
+    **width**, **height** — размеры кадра.
+    **background** — цвет фона (r, g, b).
+    """
+    image = np.empty((height, width, 3), dtype=np.uint8)
+    image[...] = background
+    r = np.maximum(np.floor(radius), 0).astype(np.int64)
+    on_screen = ((screen[:, 0] + r >= 0) & (screen[:, 0] - r < width) &
+                 (screen[:, 1] + r >= 0) & (screen[:, 1] - r < height))
+    pixels, bodies = [], []
+    for size in np.unique(r[on_screen]).tolist():
+        group = np.flatnonzero(on_screen & (r == size))
+        offsets = _disk_offsets(size)
+        x = (screen[group, 0, None] + offsets[None, :, 0]).ravel()
+        y = (screen[group, 1, None] + offsets[None, :, 1]).ravel()
+        body = np.repeat(group, len(offsets))
+        inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        pixels.append(y[inside] * width + x[inside])
+        bodies.append(body[inside])
+    if not pixels:
+        return image
+    pixels, bodies = np.concatenate(pixels), np.concatenate(bodies)
+    # каждому пикселю — цвет тела с наибольшим номером среди накрывших его
+    order = np.lexsort((-bodies, pixels))
+    pixels, bodies = pixels[order], bodies[order]
+    first = np.ones(len(pixels), dtype=bool)
+    first[1:] = pixels[1:] != pixels[:-1]
+    image.reshape(-1, 3)[pixels[first]] = palette[color_index[bodies[first]]]
+    return image
+
+
+def encode_ppm(image):
+    """Кодирует массив пикселей (height, width, 3) в двоичный PPM (P6)."""
+    height, width = image.shape[:2]
+    return b"P6\n%d %d\n255\n" % (width, height) + np.ascontiguousarray(image).tobytes()
+
+
+def _png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+
+def encode_png(image, level=6):
+    """Кодирует массив пикселей (height, width, 3) в PNG (8 бит на канал, без фильтров).
+
+    Параметры:
+
+    **image** — массив пикселей.
+    **level** — уровень сжатия zlib.
+    """
+    height, width = image.shape[:2]
+    raw = np.zeros((height, 1 + 3 * width), dtype=np.uint8)  # в начале строки — тип фильтра 0
+    raw[:, 1:] = image.reshape(height, 3 * width)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", header) +
+            _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), level)) + _png_chunk(b"IEND", b""))
+
+
+encoders = {"ppm": encode_ppm, "png": encode_png}
+"""Кодировщики кадров по формату (и расширению файла)."""
+
+
+def write_frame(filename, image):
+    """Записывает массив пикселей в файл PPM или PNG (по расширению имени)."""
+    extension = os.path.splitext(filename)[1].lstrip(".").lower()
+    if extension not in encoders:
+        raise ValueError(f"Unknown frame format: {extension}")
+    with open(filename, "wb") as file:
+        file.write(encoders[extension](image))
+
+
+class FrameExporter:
+    """Вывод кадров расчёта solar_simulation.Simulation в последовательность файлов.
+
+    Параметры конструктора:
+
+    **directory** — каталог для кадров (создаётся при необходимости).
+    **every** — выводить кадр после каждого every-го шага.
+    **frame_format** — "png" или "ppm".
+    **width**, **height** — размеры кадра в пикселях.
+    **scale** — число пикселей на метр; None — как в окне (solar_vis.calculate_scale_factor)
+    по наибольшей координате тел в момент attach.
+    **workers** — число фоновых потоков.
+    **max_queue_bytes** — наибольший объём снимков в очереди, байт.
+    **background** — цвет фона (имя tkinter или #rrggbb).
+
+    Атрибуты **written** и **skipped** — число записанных и пропущенных кадров.
+    Ошибка фоновой записи поднимается при следующем вызове.
+    """
+
+    def __init__(self, directory, every=1, frame_format="png", width=window_width, height=window_height,
+                 scale=None, workers=None, max_queue_bytes=default_max_queue_bytes, background="black"):
+        if frame_format not in encoders:
+            raise ValueError(f"Unknown frame format: {frame_format}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.every = every
+        self.frame_format = frame_format
+        self.width = width
+        self.height = height
+        self.scale = scale
+        self.background = parse_color(background)
+        self.max_queue_bytes = max_queue_bytes
+        self.written = 0
+        self.skipped = 0
+        self._frames = 0
+        self._executor = ThreadPoolExecutor(workers or default_workers)
+        self._pending = []
+        self._queued_bytes = 0
+
+    def attach(self, simulation):
+        """Выбирает масштаб (если он не задан) и выводит начальный кадр."""
+        if self.scale is None:
+            extent = np.abs(simulation.pos).max() if len(simulation.pos) else 0.0
+            self.scale = 0.4 * min(self.width, self.height) / extent if extent > 0 else 1.0
+        self.capture(simulation)
+
+    def update(self, simulation):
+        """Вызывается после каждого шага."""
+        if simulation.step_count % self.every == 0:
+            self.capture(simulation)
+
+    def _collect(self):
+        """Забирает завершённые кадры и поднимает ошибку фоновой записи, если была."""
+        done = [item for item in self._pending if item[0].done()]
+        self._pending = [item for item in self._pending if not item[0].done()]
+        for future, size in done:
+            self._queued_bytes -= size
+            future.result()
+            self.written += 1
+
+    def capture(self, simulation):
+        """Снимает кадр текущего состояния и ставит его рисование и запись в очередь.
+        Возвращает имя файла кадра или None, если кадр пропущен."""
+        self._collect()
+        size = simulation.pos.nbytes + 2 * simulation.m.nbytes
+        if self._pending and self._queued_bytes + size > self.max_queue_bytes:
+            self.skipped += 1
+            return None
+        filename = os.path.join(self.directory, f"frame{self._frames:06d}.{self.frame_format}")
+        self._frames += 1
+        radius, color_index, palette = appearance(simulation.space_objects)
+        future = self._executor.submit(self._render, filename, simulation.pos.copy(), radius, color_index, palette)
+        self._pending.append((future, size))
+        self._queued_bytes += size
+        return filename
+
+    def _render(self, filename, pos, radius, color_index, palette):
+        screen = screen_positions(pos, self.scale, self.width, self.height)
+        write_frame(filename, rasterize(screen, radius, color_index, palette, self.width, self.height,
+                                        self.background))
+
+    def wait(self):
+        """Дожидается записи всех кадров из очереди."""
+        pending, self._pending = self._pending, []
+        self._queued_bytes = 0
+        for future, _ in pending:
+            future.result()
+            self.written += 1
+
+    def close(self):
+        """Дожидается записи кадров и останавливает фоновые потоки."""
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown()
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
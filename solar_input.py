@@ -1,7 +1,21 @@
 # coding: utf-8
 # license: GPLv3
 
-from solar_objects import Star, Planet
+import hashlib
+import os
+
+import numpy as np
+
+from solar_objects import Star, Planet, Particle, BodyStore, body_dtype
+
+chunk_size = 1 << 16
+"""Число строк, разбираемых за один раз при массовом чтении."""
+
+object_classes = {"star": Star, "planet": Planet, "particle": Particle}
+"""Классы объектов по типу из входного файла."""
+
+cache_version = 2
+"""Версия формата кэша; кэш другой версии разбирается заново."""
 
 
 def read_space_objects_data_from_file(input_filename): #исправлено
@@ -27,6 +41,10 @@ def read_space_objects_data_from_file(input_filename): #исправлено
                 planet = Planet()
                 parse_planet_parameters(line, planet)
                 objects.append(planet)
+            elif object_type == "particle":
+                particle = Particle()
+                parse_particle_parameters(line, particle)
+                objects.append(particle)
             else:
                 print(f"Unknown space object: {object_type}")
 
@@ -87,25 +105,329 @@ def parse_planet_parameters(line, planet): #починил
     planet.Vy = float(parts[7])  # скорость y
 
 
-def write_space_objects_data_to_file(output_filename, space_objects): #ИСПРАВЛЕНО#
+def parse_particle_parameters(line, particle):
+    """Считывает данные о пробной частице из строки.
+    Формат строки тот же, что у планеты:
+    Particle <радиус в пикселах> <цвет> <масса> <x> <y> <Vx> <Vy>
+
+    Масса частицы не учитывается: частица движется в поле звёзд и планет,
+    но сама никого не притягивает, поэтому её масса всегда 0.
+    Пример строки:
+    Particle 0.5 gray 0 1 2 3 4
+
+    Параметры:
+
+    **line** — строка с описанием частицы.
+    **particle** — объект частицы.
+    """
+    parts = line.split()
+    if len(parts) != 8:
+        raise ValueError(f"Invalid Particle format: expected 8 parts, got {len(parts)}")
+
+    particle.R = float(parts[1])  # радиус
+    particle.color = parts[2]  # цвет
+    particle.m = 0.0  # масса из файла не учитывается
+    particle.x = float(parts[4])  # координата x
+    particle.y = float(parts[5])  # координата y
+    particle.Vx = float(parts[6])  # скорость x
+    particle.Vy = float(parts[7])  # скорость y
+
+
+def write_space_objects_data_to_file(output_filename, space_objects, capitalize=False): #ИСПРАВЛЕНО#
     """Сохраняет данные о космических объектах в файл.
     Строки должны иметь следующий формат:
     Star <радиус в пикселах> <цвет> <масса> <x> <y> <Vx> <Vy>
     Planet <радиус в пикселах> <цвет> <масса> <x> <y> <Vx> <Vy>
+    Строки собираются по столбцам и пишутся пачками, как в write_space_objects_chunks,
+    но без записей body_dtype: числа записываются так же, как str() (целый
+    радиус 5 остаётся 5), а тип и цвет — любой длины и в любой кодировке.
 
     Параметры:
 
     **output_filename** — имя входного файла
-    **space_objects** — список объектов планет и звёзд
+    **space_objects** — список объектов планет и звёзд или хранилище BodyStore
+    **capitalize** — писать тип с заглавной буквы (Star, Planet), как в исходных файлах
     """
+    if isinstance(space_objects, BodyStore):
+        types = np.array(BodyStore.type_names, dtype=object)[space_objects.type_code].tolist()
+        colors = np.array(space_objects.colors or [""], dtype=object)[space_objects.color_index].tolist()
+        numbers = [space_objects.R, space_objects.m, space_objects.pos[:, 0], space_objects.pos[:, 1],
+                   space_objects.vel[:, 0], space_objects.vel[:, 1]]
+        numbers = [column.tolist() for column in numbers]
+    else:
+        types = [obj.type for obj in space_objects]
+        colors = [obj.color for obj in space_objects]
+        numbers = [[getattr(obj, name) for obj in space_objects] for name in ("R", "m", "x", "y", "Vx", "Vy")]
+    if capitalize:
+        types = [object_type.capitalize() for object_type in types]
+    R, m, x, y, Vx, Vy = [list(map(str, column)) for column in numbers]
     with open(output_filename, 'w') as out_file:
-        for obj in space_objects:
-            #f формирует строку для записи:
-            out_file.write(
-                f"{obj.type} {obj.R} {obj.color} {obj.m} "  # запись типа, радиуса, цвета и массы
-                f"{obj.x} {obj.y} {obj.Vx} {obj.Vy}\n"  # координаты и скорости
-            )
-    #функция, которая сохраняет статистику в указанный файл
+        _write_columns(out_file, [types, R, colors, m, x, y, Vx, Vy])
+
+
+def _write_columns(out_file, columns):
+    """Пишет строки, собранные из столбцов **columns** (списков строк), пачками по **chunk_size**."""
+    for start in range(0, len(columns[0]), chunk_size):
+        out_file.write("".join(" ".join(fields) + "\n"
+                               for fields in zip(*(column[start:start + chunk_size] for column in columns))))
+
+
+_parse_dtype = np.dtype([(name, "S%d" % (body_dtype[name].itemsize + 1) if body_dtype[name].kind == "S"
+                          else body_dtype[name]) for name in body_dtype.names])
+"""Тип записи для numpy.loadtxt: строковые поля на байт длиннее, чем в body_dtype,
+чтобы слишком длинные строки можно было заметить, а не обрезать молча."""
+
+
+def _check_field(field, value, prefix="Body "):
+    """Проверяет, что строка **value** помещается в строковое поле **field** записи body_dtype."""
+    limit = body_dtype[field].itemsize
+    if not value.isascii() or len(value) > limit:
+        raise ValueError(f"{prefix}{field} must be ASCII and at most {limit} characters, got {value!r}")
+
+
+def _check_color(object_type, color):
+    """Проверяет цвет объекта из входного файла (сообщение как о неверном формате строки)."""
+    _check_field("color", color, f"Invalid {object_type.capitalize()} format: ")
+
+
+def _parse_lines(lines, warnings):
+    """Построчно разбирает пачку строк входного файла в массив записей body_dtype.
+    Пустые строки и комментарии пропускаются, о неизвестных объектах
+    выводится сообщение, неверный формат строки (в том числе цвет не в ASCII
+    или длиннее поля записи) вызывает ValueError, как при чтении
+    read_space_objects_data_from_file."""
+    rows = []
+    for line in lines:
+        if len(line.strip()) == 0 or line[0] == '#':
+            continue  # пустые строки и строки-комментарии пропускаем
+        parts = line.split()
+        object_type = parts[0].lower()
+        if object_type not in object_classes:
+            message = f"Unknown space object: {object_type}"
+            print(message)
+            warnings.append(message)
+            continue
+        if len(parts) != 8:
+            raise ValueError(f"Invalid {object_type.capitalize()} format: expected 8 parts, got {len(parts)}")
+        _check_color(object_type, parts[2])
+        rows.append((object_type, float(parts[1]), parts[2], float(parts[3]),
+                     float(parts[4]), float(parts[5]), float(parts[6]), float(parts[7])))
+    return _massless_particles(np.array(rows, dtype=body_dtype))
+
+
+def _massless_particles(bodies):
+    """Обнуляет массы пробных частиц в массиве записей."""
+    bodies["m"][bodies["type"] == b"particle"] = 0.0
+    return bodies
+
+
+def _parse_chunk(lines, warnings):
+    """Разбирает пачку строк входного файла в массив записей body_dtype.
+    Обычно строки разбираются целиком функцией numpy.loadtxt; если в пачке есть
+    строки неверного формата, строки не в ASCII или слишком длинные тип или цвет,
+    она разбирается заново построчно, чтобы сообщения и ошибки были такими же,
+    как при чтении read_space_objects_data_from_file."""
+    lines = [line for line in lines if len(line.strip()) != 0 and line[0] != '#']
+    if not lines:
+        return np.empty(0, dtype=body_dtype)
+    if not all(line.isascii() for line in lines):
+        return _parse_lines(lines, warnings)
+    try:
+        parsed = np.loadtxt(lines, dtype=_parse_dtype, comments=None, ndmin=1)
+    except ValueError:
+        return _parse_lines(lines, warnings)
+    if ((np.char.str_len(parsed["type"]) > body_dtype["type"].itemsize).any() or
+            (np.char.str_len(parsed["color"]) > body_dtype["color"].itemsize).any()):
+        return _parse_lines(lines, warnings)
+    bodies = parsed.astype(body_dtype)
+    bodies["type"] = np.char.lower(bodies["type"])
+    known = np.isin(bodies["type"], [name.encode() for name in object_classes])
+    if not known.all():
+        for object_type in bodies["type"][~known].tolist():
+            message = f"Unknown space object: {object_type.decode()}"
+            print(message)
+            warnings.append(message)
+        bodies = bodies[known]
+    return _massless_particles(bodies)
+
+
+def parse_space_objects_arrays(input_filename, warnings=None):
+    """Массово считывает файл в формате solar_system.txt в массив записей body_dtype,
+    разбирая его пачками по **chunk_size** строк.
+
+    Параметры:
+
+    **input_filename** — имя входного файла
+    **warnings** — список, в который добавляются сообщения о неизвестных объектах
+    """
+    warnings = [] if warnings is None else warnings
+    chunks = []
+    with open(input_filename) as input_file:
+        while True:
+            lines = input_file.readlines(chunk_size * 64)
+            if not lines:
+                break
+            chunks.append(_parse_chunk(lines, warnings))
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=body_dtype)
+
+
+def cache_filename(input_filename):
+    """Возвращает имя файла кэша, лежащего рядом с исходным файлом."""
+    return input_filename + ".cache.npz"
+
+
+def _file_digest(input_filename):
+    """Возвращает хэш SHA-1 содержимого файла."""
+    digest = hashlib.sha1()
+    with open(input_filename, "rb") as input_file:
+        for block in iter(lambda: input_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_space_objects_arrays(input_filename, use_cache=True):
+    """Считывает файл в формате solar_system.txt в массив записей body_dtype.
+    Рядом с файлом хранится двоичный кэш разобранных данных: если время изменения
+    и размер файла совпадают с записанными в кэше (или совпадает хэш содержимого),
+    файл заново не разбирается. Сообщения о неизвестных объектах повторяются
+    и при чтении из кэша.
+
+    Параметры:
+
+    **input_filename** — имя входного файла
+    **use_cache** — использовать ли кэш
+    """
+    if input_filename.endswith(".npy"):
+        return read_space_objects_npy(input_filename)
+    if not use_cache:
+        return parse_space_objects_arrays(input_filename)
+
+    stat = os.stat(input_filename)
+    key = np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    cache = cache_filename(input_filename)
+    digest = None
+    try:
+        with np.load(cache) as cached:
+            if "version" not in cached.files or int(cached["version"]) != cache_version:
+                raise ValueError("stale cache format")
+            fresh = np.array_equal(cached["key"], key)
+            if not fresh:
+                digest = _file_digest(input_filename)
+                fresh = str(cached["digest"]) == digest
+            if fresh:
+                for message in cached["warnings"].tolist():
+                    print(message)
+                bodies = cached["bodies"]
+                if digest is None:
+                    return bodies
+                np.savez(cache, bodies=bodies, key=key, digest=digest, warnings=cached["warnings"],
+                         version=cache_version)
+                return bodies
+    except (OSError, KeyError, ValueError):
+        pass  # кэша нет или он повреждён — разбираем файл заново
+
+    warnings = []
+    bodies = parse_space_objects_arrays(input_filename, warnings)
+    try:
+        np.savez(cache, bodies=bodies, key=key, digest=digest or _file_digest(input_filename),
+                 warnings=np.array(warnings, dtype=str), version=cache_version)
+    except OSError:
+        pass  # каталог только для чтения — работаем без кэша
+    return bodies
+
+
+def read_space_objects_npy(input_filename):
+    """Открывает двоичный файл .npy с массивом записей body_dtype (см. write_space_objects_npy),
+    отображая его в память, без разбора текста и без кэша."""
+    bodies = np.load(input_filename, mmap_mode="r")
+    if bodies.dtype != body_dtype:
+        raise ValueError(f"Not an array of body records: {input_filename}")
+    return bodies
+
+
+def read_space_objects_store(input_filename, use_cache=True):
+    """Считывает файл в формате solar_system.txt сразу в компактное хранилище BodyStore,
+    не создавая объекта на каждое тело."""
+    return BodyStore.from_records(read_space_objects_arrays(input_filename, use_cache))
+
+
+def objects_from_arrays(bodies):
+    """Создаёт список объектов Star/Planet/Particle по массиву записей body_dtype."""
+    objects = []
+    for object_type, R, color, m, x, y, Vx, Vy in bodies.tolist():
+        obj = object_classes[object_type.decode()]()
+        obj.R, obj.color, obj.m = R, color.decode(), m
+        obj.x, obj.y, obj.Vx, obj.Vy = x, y, Vx, Vy
+        objects.append(obj)
+    return objects
+
+
+def arrays_from_objects(space_objects):
+    """Собирает массив записей body_dtype по списку объектов или хранилищу BodyStore.
+    Тип и цвет, не помещающиеся в поля записи (не ASCII или слишком длинные),
+    вызывают ValueError, а не обрезаются; такие объекты можно сохранить
+    функцией write_space_objects_data_to_file."""
+    if isinstance(space_objects, BodyStore):
+        for color in space_objects.colors:
+            _check_field("color", color)
+        return space_objects.to_records()
+    for obj in space_objects:
+        _check_field("type", obj.type)
+        _check_field("color", obj.color)
+    return np.array([(obj.type, obj.R, obj.color, obj.m, obj.x, obj.y, obj.Vx, obj.Vy)
+                     for obj in space_objects], dtype=body_dtype)
+
+
+def write_space_objects_arrays(output_filename, bodies):
+    """Массово сохраняет массив записей body_dtype в файл в формате solar_system.txt.
+    Строки формируются по столбцам и записываются пачками по **chunk_size**.
+
+    Параметры:
+
+    **output_filename** — имя выходного файла
+    **bodies** — массив записей body_dtype
+    """
+    write_space_objects_chunks(output_filename, (bodies[start:start + chunk_size]
+                                                 for start in range(0, len(bodies), chunk_size)))
+
+
+def write_space_objects_chunks(output_filename, chunks):
+    """Сохраняет в файл в формате solar_system.txt массивы записей body_dtype,
+    по очереди получаемые из итератора **chunks**; весь набор тел в памяти не держится.
+
+    Параметры:
+
+    **output_filename** — имя выходного файла
+    **chunks** — итератор массивов записей body_dtype
+    """
+    with open(output_filename, 'w') as out_file:
+        for chunk in chunks:
+            columns = [np.char.decode(chunk["type"]).tolist(), list(map(str, chunk["R"].tolist())),
+                       np.char.decode(chunk["color"]).tolist()]
+            columns += [list(map(str, chunk[name].tolist())) for name in ("m", "x", "y", "Vx", "Vy")]
+            _write_columns(out_file, columns)
+
+
+def write_space_objects_npy(output_filename, chunks, count):
+    """Сохраняет в двоичный файл .npy массив из **count** записей body_dtype,
+    по очереди получаемых из итератора **chunks**. Файл отображается в память и
+    заполняется по частям, так что весь набор тел в памяти не держится.
+
+    Параметры:
+
+    **output_filename** — имя выходного файла
+    **chunks** — итератор массивов записей body_dtype (в сумме **count** записей)
+    **count** — общее число тел
+    """
+    bodies = np.lib.format.open_memmap(output_filename, mode="w+", dtype=body_dtype, shape=(count,))
+    start = 0
+    for chunk in chunks:
+        bodies[start:start + len(chunk)] = chunk
+        start += len(chunk)
+    if start != count:
+        raise ValueError(f"Expected {count} bodies, got {start}")
+    bodies.flush()
+
 
 if __name__ == "__main__":
     print("This module is not for direct call!")
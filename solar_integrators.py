@@ -0,0 +1,350 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Численные интеграторы уравнений движения.
+Каждый интегратор продвигает массивы координат и скоростей на время dt (на месте)
+и имеет вид integrator(pos, vel, dt, accel, state), где accel(pos) возвращает
+массив ускорений, а state — словарь состояния интегратора между шагами.
+Интеграторам из **partial_force_integrators** нужен и вызов accel(pos, targets),
+возвращающий ускорения только тел с индексами targets. Интеграторы из
+**mass_integrators** получают шестым аргументом массив масс m.
+
+В state хранится последнее вычисленное ускорение и координаты, при которых
+оно вычислено ("acc", "acc_pos"): если следующий шаг начинается в той же точке,
+силы заново не считаются. Там же накапливается число вычислений сил
+("force_evaluations"). При замене системы тел или движка state нужно очистить.
+"""
+
+import numpy as np
+
+from solar_model import gravitational_constant
+
+adaptive_tolerance = 1e-9
+"""Допустимая относительная ошибка одного подшага адаптивного метода."""
+
+adaptive_max_substeps = 100000
+"""Наибольшее число подшагов адаптивного метода за один шаг dt."""
+
+block_eta = 0.01
+"""Точность блочного метода: шаг тела не больше block_eta * |a| / |da/dt|
+(для круговой орбиты — около 2π / block_eta шагов на оборот)."""
+
+block_max_level = 10
+"""Наибольший уровень блочного метода: самый мелкий шаг тела — dt / 2**block_max_level."""
+
+kepler_tolerance = 1e-14
+"""Относительная точность решения универсального уравнения Кеплера."""
+
+kepler_max_iterations = 50
+"""Наибольшее число итераций решения уравнения Кеплера."""
+
+
+def evaluate_acceleration(pos, accel, state):
+    """Вычисляет ускорения в точке **pos** и запоминает их в **state**."""
+    acc = accel(pos)
+    state["acc"] = acc
+    state["acc_pos"] = pos.copy()
+    state["force_evaluations"] = state.get("force_evaluations", 0) + 1
+    return acc
+
+
+def cached_acceleration(pos, accel, state):
+    """Возвращает ускорения в точке **pos**, используя запомненные, если они есть."""
+    acc = state.get("acc")
+    if acc is not None and np.array_equal(state["acc_pos"], pos):
+        return acc
+    return evaluate_acceleration(pos, accel, state)
+
+
+def euler(pos, vel, dt, accel, state):
+    """Полунеявный метод Эйлера (как в solar_model.move_space_object)."""
+    acc = cached_acceleration(pos, accel, state)
+    vel += acc * dt
+    pos += vel * dt
+
+
+def leapfrog(pos, vel, dt, accel, state):
+    """Симплектический метод «чехарда» в форме kick-drift-kick (скоростной Верле).
+    Второй порядок точности, одно вычисление сил на шаг."""
+    vel += 0.5 * dt * cached_acceleration(pos, accel, state)
+    pos += dt * vel
+    vel += 0.5 * dt * evaluate_acceleration(pos, accel, state)
+
+
+_yoshida_w1 = 1 / (2 - 2 ** (1 / 3))
+_yoshida_w0 = -2 ** (1 / 3) / (2 - 2 ** (1 / 3))
+
+
+def yoshida4(pos, vel, dt, accel, state):
+    """Симплектический метод Иошиды 4-го порядка: композиция трёх шагов
+    «чехарды» с весами w1, w0, w1. Три вычисления сил на шаг."""
+    for weight in (_yoshida_w1, _yoshida_w0, _yoshida_w1):
+        leapfrog(pos, vel, weight * dt, accel, state)
+
+
+# Таблица Бутчера метода Дормана — Принса 5(4)
+_dp_a = (
+    (),
+    (1 / 5,),
+    (3 / 40, 9 / 40),
+    (44 / 45, -56 / 15, 32 / 9),
+    (19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729),
+    (9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656),
+    (35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84),
+)
+_dp_error = (71 / 57600, 0, -71 / 16695, 71 / 1920, -17253 / 339200, 22 / 525, -1 / 40)
+
+
+def _dormand_prince_substep(pos, vel, acc, h, accel, state):
+    """Один подшаг метода Дормана — Принса из точки (pos, vel) с ускорением acc.
+    Возвращает новые координаты, скорости, ускорения в новой точке
+    и оценку ошибки, отнесённую к допуску."""
+    kp = [vel]
+    kv = [acc]
+    for row in _dp_a[1:]:
+        stage_pos = pos + h * sum(a * k for a, k in zip(row, kp) if a)
+        stage_vel = vel + h * sum(a * k for a, k in zip(row, kv) if a)
+        kp.append(stage_vel)
+        kv.append(evaluate_acceleration(stage_pos, accel, state))
+    # последняя стадия вычислена в новой точке и переиспользуется на следующем подшаге
+    new_pos, new_vel, new_acc = stage_pos, stage_vel, kv[-1]
+
+    err_pos = h * sum(e * k for e, k in zip(_dp_error, kp) if e)
+    err_vel = h * sum(e * k for e, k in zip(_dp_error, kv) if e)
+    scale_pos = adaptive_tolerance * max(np.abs(pos).max(), np.abs(new_pos).max(), 1e-300)
+    scale_vel = adaptive_tolerance * max(np.abs(vel).max(), np.abs(new_vel).max(), 1e-300)
+    error = max(np.abs(err_pos).max() / scale_pos, np.abs(err_vel).max() / scale_vel)
+    return new_pos, new_vel, new_acc, error
+
+
+def adaptive(pos, vel, dt, accel, state):
+    """Вложенный метод Рунге — Кутты (Дормана — Принса 5(4)) с контролем ошибки.
+    Шаг dt проходится подшагами, длина которых подбирается автоматически и
+    запоминается в state["dt_try"] для следующего шага."""
+    acc = cached_acceleration(pos, accel, state)
+    remaining = dt
+    h = min(state.get("dt_try", dt), dt)
+    substeps = 0
+    while remaining > 1e-12 * dt:
+        if substeps == adaptive_max_substeps:
+            raise RuntimeError(f"Adaptive integrator exceeded {adaptive_max_substeps} substeps")
+        substeps += 1
+        h = min(h, remaining)
+        new_pos, new_vel, new_acc, error = _dormand_prince_substep(pos, vel, acc, h, accel, state)
+        factor = min(5.0, max(0.2, 0.9 * error ** -0.2)) if error > 0 else 5.0
+        if error <= 1.0:
+            pos[...] = new_pos
+            vel[...] = new_vel
+            acc = new_acc
+            remaining -= h
+            if remaining > 1e-12 * dt:
+                state["dt_try"] = h * factor
+        h *= factor
+    state["acc"] = acc
+    state["acc_pos"] = pos.copy()
+
+
+def _block_levels(acc, jerk, dt):
+    """Уровни шагов тел: наименьшие k, при которых dt / 2**k не больше
+    block_eta * |a| / |da/dt|, в пределах от 0 до block_max_level."""
+    a = np.hypot(acc[:, 0], acc[:, 1])
+    j = np.hypot(jerk[:, 0], jerk[:, 1])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tau = np.where(j > 0, block_eta * a / j, np.inf)
+        level = np.ceil(np.log2(dt / tau))
+    return np.clip(np.nan_to_num(level, nan=block_max_level), 0, block_max_level).astype(np.int64)
+
+
+def block(pos, vel, dt, accel, state):
+    """Блочный метод с индивидуальными шагами (иерархическая «чехарда» kick-drift-kick).
+    Каждое тело получает шаг dt / 2**k, где уровень k выбирается по отношению
+    ускорения к его производной (оценивается по двум последним вычислениям сил).
+    Все тела дрейфуют вместе, а силы пересчитываются только для тел, чей шаг
+    закончился; остальные служат источниками. Укрупнить шаг тело может только в
+    момент, кратный новому шагу, поэтому к концу dt все тела синхронизированы.
+    В state["force_evaluations"] частичные вычисления учитываются долей тел."""
+    n = len(pos)
+    acc = cached_acceleration(pos, accel, state).copy()
+    jerk = state.get("block_jerk")
+    if jerk is None or len(jerk) != n:
+        # первая оценка производной ускорения — по смещению вдоль скоростей на самый мелкий шаг
+        delta = dt / 2 ** block_max_level
+        jerk = (accel(pos + vel * delta) - acc) / delta
+        state["force_evaluations"] = state.get("force_evaluations", 0) + 1
+    else:
+        jerk = jerk.copy()
+
+    ticks = 1 << block_max_level
+    tick = dt / ticks
+    level = _block_levels(acc, jerk, dt)
+    span = ticks >> level
+    last = np.zeros(n, dtype=np.int64)
+    vel += (0.5 * tick * span)[:, None] * acc
+    now = 0
+    while now < ticks:
+        following = int((last + span).min())
+        pos += vel * ((following - now) * tick)
+        now = following
+        active = np.flatnonzero(last + span == now)
+        # источники посреди своего шага сдвигаются с линейного дрейфа на параболу x0 + v0 s + a s²/2
+        s = tick * (now - last)
+        new_acc = accel(pos + (0.5 * s * (s - tick * span))[:, None] * acc, active)
+        state["force_evaluations"] = state.get("force_evaluations", 0) + len(active) / n
+        vel[active] += (0.5 * tick * span[active])[:, None] * new_acc
+        jerk[active] = (new_acc - acc[active]) / (tick * (now - last[active]))[:, None]
+        acc[active] = new_acc
+        last[active] = now
+        if now < ticks:
+            # крупнее шага, на границе которого мы стоим, уровень выбрать нельзя
+            coarsest = block_max_level - ((now & -now).bit_length() - 1)
+            level[active] = np.maximum(_block_levels(acc[active], jerk[active], dt), coarsest)
+            span[active] = ticks >> level[active]
+            vel[active] += (0.5 * tick * span[active])[:, None] * acc[active]
+    state["acc"] = acc
+    state["acc_pos"] = pos.copy()
+    state["block_jerk"] = jerk
+    state["block_level"] = level
+
+
+def _stumpff(z):
+    """Функции Штумпфа C(z) и S(z) (для малых |z| — по рядам Тейлора)."""
+    c = np.empty_like(z)
+    s = np.empty_like(z)
+    small = np.abs(z) < 0.1
+    zs = z[small]
+    c[small] = 1 / 2 - zs * (1 / 24 - zs * (1 / 720 - zs * (1 / 40320 - zs / 3628800)))
+    s[small] = 1 / 6 - zs * (1 / 120 - zs * (1 / 5040 - zs * (1 / 362880 - zs / 39916800)))
+    positive = z >= 0.1
+    root = np.sqrt(z[positive])
+    c[positive] = (1 - np.cos(root)) / z[positive]
+    s[positive] = (root - np.sin(root)) / root ** 3
+    negative = z <= -0.1
+    root = np.sqrt(-z[negative])
+    c[negative] = (np.cosh(root) - 1) / -z[negative]
+    s[negative] = (np.sinh(root) - root) / root ** 3
+    return c, s
+
+
+def kepler_drift(pos, vel, mu, dt):
+    """Продвигает тела по кеплеровым орбитам вокруг неподвижного центра (на месте).
+    Универсальное уравнение Кеплера решается векторно методом Лагерра — Конвея,
+    так что эллиптические, параболические и гиперболические орбиты проходятся
+    одинаково, а шаг может быть любой долей периода.
+
+    Параметры:
+
+    **pos**, **vel** — массивы координат и скоростей относительно центра формы (N, 2).
+    **mu** — гравитационный параметр центра G M.
+    **dt** — время.
+    """
+    if not len(pos):
+        return
+    r0 = np.hypot(pos[:, 0], pos[:, 1])
+    v2 = (vel * vel).sum(axis=1)
+    sqrt_mu = np.sqrt(mu)
+    eta = (pos * vel).sum(axis=1) / sqrt_mu  # r0 · v0 / √μ
+    alpha = 2 / r0 - v2 / mu  # 1 / a
+    # начальное приближение: для эллипса — по среднему движению, иначе — по прямой
+    chi = np.where(alpha > 0, sqrt_mu * alpha * dt, sqrt_mu * dt / r0)
+    zeta = 1 - alpha * r0
+    n = 5  # степень метода Лагерра
+    for _ in range(kepler_max_iterations):
+        z = alpha * chi * chi
+        c, s = _stumpff(z)
+        chi2 = chi * chi
+        f = eta * chi2 * c + zeta * chi2 * chi * s + r0 * chi - sqrt_mu * dt
+        df = eta * chi * (1 - z * s) + zeta * chi2 * c + r0
+        ddf = eta * (1 - z * c) + zeta * chi * (1 - z * s)
+        root = np.sqrt(np.abs((n - 1) ** 2 * df * df - n * (n - 1) * f * ddf))
+        delta = n * f / (df + np.copysign(root, df))
+        chi = chi - delta
+        if (np.abs(delta) <= kepler_tolerance * np.maximum(np.abs(chi), 1e-300)).all():
+            break
+    z = alpha * chi * chi
+    c, s = _stumpff(z)
+    chi2 = chi * chi
+    f = 1 - chi2 / r0 * c
+    g = dt - chi2 * chi / sqrt_mu * s
+    new_pos = f[:, None] * pos + g[:, None] * vel
+    r = np.hypot(new_pos[:, 0], new_pos[:, 1])
+    df = sqrt_mu / (r * r0) * (z * chi * s - chi)
+    dg = 1 - chi2 / r * c
+    vel[...] = df[:, None] * pos + dg[:, None] * vel
+    pos[...] = new_pos
+
+
+def wisdom_holman(pos, vel, dt, accel, state, m):
+    """Симплектический метод Уиздома — Холмана в демократических гелиоцентрических
+    координатах для систем с одной доминирующей звездой (самым массивным телом).
+    Шаг: полупинок взаимодействий тел между собой, полушаг «прыжка» (сдвиг
+    гелиоцентрических координат на суммарный импульс тел, делённый на массу
+    звезды), точное кеплерово движение каждого тела вокруг звезды (kepler_drift),
+    ещё полушаг прыжка и полупинок. Ускорения взаимодействий — полные ускорения
+    движка за вычетом несмягчённого притяжения звезды, поэтому подходит любой
+    движок, а при смягчении (solar_model.softening_length) поправка к кеплеровой
+    силе звезды входит в пинок; одно вычисление сил на шаг, как у «чехарды», но
+    кеплерова часть интегрируется точно, и шаг может быть заметной долей периода
+    самой близкой к звезде планеты."""
+    star = int(np.argmax(m))
+    mu = gravitational_constant * m[star]
+    others = np.arange(len(m)) != star
+    mass = m[others]
+    total_mass = m.sum()
+    com_pos = (m[:, None] * pos).sum(axis=0) / total_mass
+    com_vel = (m[:, None] * vel).sum(axis=0) / total_mass
+
+    def interaction(acc, helio):
+        # кеплерова часть — притяжение звезды без смягчения; разница со смягчённым
+        # притяжением в ускорениях движка остаётся в пинке
+        r2 = (helio * helio).sum(axis=1)
+        return acc[others] + (mu / (r2 * np.sqrt(r2)))[:, None] * helio
+
+    helio = pos[others] - pos[star]
+    v = vel[others] - com_vel  # барицентрические скорости — сопряжённые импульсы на единицу массы
+    v += 0.5 * dt * interaction(cached_acceleration(pos, accel, state), helio)
+    helio += (0.5 * dt / m[star]) * (mass[:, None] * v).sum(axis=0)
+    kepler_drift(helio, v, mu, dt)
+    helio += (0.5 * dt / m[star]) * (mass[:, None] * v).sum(axis=0)
+
+    # обратно в барицентрическую систему, которая движется равномерно
+    com_pos = com_pos + com_vel * dt
+    pos[star] = com_pos - (mass[:, None] * helio).sum(axis=0) / total_mass
+    pos[others] = helio + pos[star]
+    helio = pos[others] - pos[star]
+    v += 0.5 * dt * interaction(evaluate_acceleration(pos, accel, state), helio)
+    vel[others] = v + com_vel
+    vel[star] = com_vel - (mass[:, None] * v).sum(axis=0) / m[star]
+
+
+integrators = {
+    "euler": euler,
+    "leapfrog": leapfrog,
+    "yoshida4": yoshida4,
+    "adaptive": adaptive,
+    "block": block,
+    "wisdom_holman": wisdom_holman,
+}
+"""Интеграторы по имени."""
+
+partial_force_integrators = {"block"}
+"""Интеграторы, вызывающие accel(pos, targets) для части тел."""
+
+mass_integrators = {"wisdom_holman"}
+"""Интеграторы, которым нужен массив масс: integrator(pos, vel, dt, accel, state, m)."""
+
+adaptive_integrators = {"adaptive", "block"}
+"""Интеграторы, выбирающие шаги по ошибке или ускорениям всех тел массива
+(длину подшага, уровни тел); их нельзя применять к пачке независимых систем сразу."""
+
+
+def get_integrator(integrator):
+    """Возвращает функцию интегратора с именем **integrator**."""
+    try:
+        return integrators[integrator]
+    except KeyError:
+        raise ValueError(f"Unknown integrator: {integrator}") from None
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
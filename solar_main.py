@@ -1,11 +1,16 @@
 # coding: utf-8
 # license: GPLv3
 
+import os
 import tkinter
 from tkinter.filedialog import *
+import solar_model
+import solar_vis
 from solar_vis import *
 from solar_model import *
 from solar_input import *
+from solar_engine import pack_space_objects
+from solar_checkpoint import CheckpointWriter, apply_physics, read_checkpoint, snapshot
 
 perform_execution = False
 """Флаг цикличности выполнения расчёта"""
@@ -25,6 +30,22 @@ time_step = None
 space_objects = []
 """Список космических объектов."""
 
+renderer = None
+"""Пакетный отрисовщик тел на холсте (solar_vis.CanvasRenderer)."""
+
+step_count = 0
+"""Число шагов, выполненных с загрузки системы."""
+
+trail_length = 500
+"""Число точек в следе орбиты каждого тела."""
+
+trail_decimation = 1
+"""В след попадает каждое trail_decimation-е положение тела."""
+
+checkpoint_writer = None
+"""Фоновая запись контрольных точек (solar_checkpoint.CheckpointWriter) или None.
+Создаётся, если задана переменная окружения SOLAR_CHECKPOINT с именем файла."""
+
 
 def execution():
     """Функция исполнения -- выполняется циклически, вызывая обработку всех небесных тел,
@@ -34,16 +55,29 @@ def execution():
     """
     global physical_time
     global displayed_time
+    global step_count
     recalculate_space_objects_positions(space_objects, time_step.get())
-    for body in space_objects:
-        update_object_position(space, body)
+    if space_objects:
+        renderer.trails.push(pack_space_objects(space_objects)[0])
+    draw_frame()
     physical_time += time_step.get()
+    step_count += 1
     displayed_time.set("%.1f" % physical_time + " seconds gone")
+    if checkpoint_writer is not None and step_count % checkpoint_writer.every == 0 and checkpoint_writer.ready():
+        checkpoint_writer.submit(snapshot(space_objects, physical_time, step_count, time_step.get(),
+                                          solar_model.default_engine, solar_model.default_integrator,
+                                          integrator_state))
 
     if perform_execution:
         space.after(101 - int(time_speed.get()), execution)
 
 
+def draw_frame():
+    """Перерисовывает все тела на холсте одним пакетом."""
+    if space_objects:
+        renderer.update(pack_space_objects(space_objects)[0])
+
+
 def start_execution():
     """Обработчик события нажатия на кнопку Start.
     Запускает циклическое исполнение функции execution.
@@ -75,21 +109,52 @@ def open_file_dialog():
     """
     global space_objects
     global perform_execution
+    global step_count
     perform_execution = False
-    for obj in space_objects:
-        space.delete(obj.image)  # удаление старых изображений планет
     in_filename = askopenfilename(filetypes=(("Text file", ".txt"),))
     space_objects = read_space_objects_data_from_file(in_filename)
+    integrator_state.clear()
+    step_count = 0
+    show_new_system()
+
+
+def resume_dialog():
+    """Открывает диалоговое окно выбора контрольной точки (см. solar_checkpoint)
+    и продолжает расчёт с сохранённого в ней состояния: тел, физического времени,
+    шага по времени, движка, интегратора и его состояния, настроек сил.
+    """
+    global space_objects
+    global perform_execution
+    global physical_time
+    global step_count
+    perform_execution = False
+    in_filename = askopenfilename(filetypes=(("Checkpoint", ".npz"),))
+    data = read_checkpoint(in_filename)
+    space_objects = objects_from_arrays(data["store"].to_records())
+    physical_time = data["physical_time"]
+    step_count = data["step_count"]
+    solar_model.default_engine = data["engine"]
+    solar_model.default_integrator = data["integrator"]
+    apply_physics(data["physics"])
+    integrator_state.clear()
+    integrator_state.update(data["integrator_state"])
+    time_step.set(data["dt"])
+    displayed_time.set("%.1f" % physical_time + " seconds gone")
+    show_new_system()
+
+
+def show_new_system():
+    """Вычисляет масштаб и создаёт изображения для только что загруженной системы."""
     max_distance = max([max(abs(obj.x), abs(obj.y)) for obj in space_objects])
     calculate_scale_factor(max_distance)
 
     for obj in space_objects:
-        if obj.type == 'star':
-            create_star_image(space, obj)
-        elif obj.type == 'planet':
-            create_planet_image(space, obj)
-        else:
+        if obj.type not in ('star', 'planet', 'particle'):
             raise AssertionError()
+    renderer.scale_factor = solar_vis.scale_factor
+    renderer.reset_view()
+    renderer.create_images(space_objects)  # старые изображения удаляются
+    draw_frame()
 
 
 def save_file_dialog():
@@ -111,6 +176,8 @@ def main():
     global time_speed
     global space
     global start_button
+    global renderer
+    global checkpoint_writer
 
     print('Modelling started!')
     physical_time = 0
@@ -119,6 +186,8 @@ def main():
     # космическое пространство отображается на холсте типа Canvas
     space = tkinter.Canvas(root, width=window_width, height=window_height, bg="black")
     space.pack(side=tkinter.TOP)
+    renderer = CanvasRenderer(space, trails=OrbitTrails(trail_length, trail_decimation))
+    renderer.bind(redraw=draw_frame)  # колесо мыши — масштаб, перетаскивание — сдвиг
     # нижняя панель с кнопками
     frame = tkinter.Frame(root)
     frame.pack(side=tkinter.BOTTOM)
@@ -139,6 +208,10 @@ def main():
     load_file_button.pack(side=tkinter.LEFT)
     save_file_button = tkinter.Button(frame, text="Save to file...", command=save_file_dialog)
     save_file_button.pack(side=tkinter.LEFT)
+    resume_button = tkinter.Button(frame, text="Resume...", command=resume_dialog)
+    resume_button.pack(side=tkinter.LEFT)
+    if os.environ.get("SOLAR_CHECKPOINT"):
+        checkpoint_writer = CheckpointWriter(os.environ["SOLAR_CHECKPOINT"])
 
     displayed_time = tkinter.StringVar()
     displayed_time.set(str(physical_time) + " seconds gone")
@@ -146,6 +219,8 @@ def main():
     time_label.pack(side=tkinter.RIGHT)
 
     root.mainloop()
+    if checkpoint_writer is not None:
+        checkpoint_writer.close()
     print('Modelling finished!')
 
 if __name__ == "__main__":
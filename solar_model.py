@@ -1,9 +1,35 @@
 # coding: utf-8
 # license: GPLv3
 
+from collections import namedtuple
+
+import solar_profiling
+
 gravitational_constant = 6.67408E-11
 """Гравитационная постоянная Ньютона G"""
 
+default_engine = "python"
+"""Движок расчёта сил по умолчанию: "python" — цикл по объектам в этом модуле,
+"numpy" — векторизованный расчёт из модуля solar_engine."""
+
+default_integrator = "euler"
+"""Интегратор по умолчанию: "euler" — полунеявный метод Эйлера (move_space_object),
+остальные — см. модуль solar_integrators."""
+
+softening_length = 0.0
+"""Длина смягчения Пламмера ε, м: сила притяжения считается как
+G m1 m2 r / (r² + ε²)^(3/2) и остаётся конечной при сближении тел.
+При 0 используется обычный закон всемирного тяготения."""
+
+test_particle_mass = 0.0
+"""Тела с массой не больше этой (в том числе частицы Particle с массой 0) считаются
+пробными частицами: они движутся в поле остальных тел, но сами его не создают,
+так что расчёт стоит O(N × N_массивных), а не O(N²)."""
+
+integrator_state = {}
+"""Состояние интегратора между вызовами recalculate_space_objects_positions.
+При загрузке новой системы тел его нужно очистить."""
+
 
 def calculate_force(body, space_objects):
     """Вычисляет силу, действующую на тело.
@@ -18,6 +44,8 @@ def calculate_force(body, space_objects):
     for obj in space_objects:
         if body == obj:
             continue  # тело не действует гравитационной силой на само себя!
+        if obj.m <= test_particle_mass:
+            continue  # пробные частицы поля не создают
 
         #Расстояние между телами
         dx = obj.x - body.x
@@ -25,7 +53,10 @@ def calculate_force(body, space_objects):
         r = (dx ** 2 + dy ** 2) ** 0.5
 
         #ссила гравитации
-        f = gravitational_constant * body.m * obj.m / (r ** 2)
+        if softening_length:
+            f = gravitational_constant * body.m * obj.m * r / (r ** 2 + softening_length ** 2) ** 1.5
+        else:
+            f = gravitational_constant * body.m * obj.m / (r ** 2)
 
         # проекции силы на оси
         body.Fx += f * dx / r
@@ -54,18 +85,85 @@ def move_space_object(body, dt):
     body.y += body.Vy * dt
 
 
-def recalculate_space_objects_positions(space_objects, dt):
+def recalculate_space_objects_positions(space_objects, dt, engine=None, integrator=None, state=None):
     """Пересчитывает координаты объектов.
 
     Параметры:
 
     **space_objects** — список оьъектов, для которых нужно пересчитать координаты.
     **dt** — шаг по времени
+    **engine** — движок расчёта сил, по умолчанию **default_engine**
+    **integrator** — интегратор, по умолчанию **default_integrator**
+    **state** — состояние интегратора, по умолчанию **integrator_state**
+    """
+    engine = engine or default_engine
+    integrator = integrator or default_integrator
+    # у частиц массы 0 сила тоже 0, и ускорение F / m не определено: их считает solar_engine
+    if engine != "python" or integrator != "euler" or any(obj.m == 0 for obj in space_objects):
+        import solar_engine  # NumPy нужен только векторизованным движкам и интеграторам
+        solar_engine.recalculate_space_objects_positions(
+            space_objects, dt, engine, integrator, integrator_state if state is None else state)
+        return
+    with solar_profiling.phase("force"):
+        for body in space_objects:
+            calculate_force(body, space_objects)
+    with solar_profiling.phase("move"):
+        for body in space_objects:
+            move_space_object(body, dt)
+    solar_profiling.count("force_evaluations")
+    solar_profiling.count("steps")
+
+
+Snapshot = namedtuple("Snapshot", "step time x y Vx Vy")
+Snapshot.__doc__ = """Снимок состояния системы после шага: номер шага, физическое время
+и кортежи координат и скоростей выбранных тел."""
+
+
+def iterate_space_objects_positions(space_objects, dt, every=1, bodies=None, stop=None, max_steps=None,
+                                    engine=None, integrator=None, state=None, start_time=0):
+    """Возвращает генератор шагов расчёта. Пересчитывает координаты объектов и после каждого
+    **every**-го шага выдаёт снимок Snapshot выбранных тел. История не накапливается:
+    каждый снимок содержит только текущее состояние.
+
+    Параметры:
+
+    **space_objects** — список оьъектов, для которых нужно пересчитать координаты.
+    **dt** — шаг по времени
+    **every** — выдавать только каждый every-й шаг
+    **bodies** — индексы тел, попадающих в снимок (по умолчанию все)
+    **stop** — условие остановки: функция от снимка; на первом снимке, для которого
+    она истинна, расчёт останавливается (этот снимок выдаётся)
+    **max_steps** — наибольшее число шагов (по умолчанию без ограничения)
+    **engine**, **integrator**, **state** — как в recalculate_space_objects_positions
+    **start_time** — физическое время перед первым шагом
+
+    Неверный **every** (меньше 1) — ValueError сразу при вызове, а не на первом шаге.
     """
-    for body in space_objects:
-        calculate_force(body, space_objects)
-    for body in space_objects:
-        move_space_object(body, dt)
+    if not every >= 1:
+        raise ValueError(f"every must be at least 1, got {every}")
+    return _iterate_positions(space_objects, dt, every, bodies, stop, max_steps, engine, integrator, state,
+                              start_time)
+
+
+def _iterate_positions(space_objects, dt, every, bodies, stop, max_steps, engine, integrator, state, start_time):
+    """Генератор шагов iterate_space_objects_positions (параметры уже проверены)."""
+    selected = space_objects if bodies is None else [space_objects[i] for i in bodies]
+    step = 0
+    physical_time = start_time
+    while max_steps is None or step < max_steps:
+        recalculate_space_objects_positions(space_objects, dt, engine, integrator, state)
+        step += 1
+        physical_time += dt
+        if step % every and stop is None:
+            continue
+        snapshot = Snapshot(step, physical_time,
+                            tuple(obj.x for obj in selected), tuple(obj.y for obj in selected),
+                            tuple(obj.Vx for obj in selected), tuple(obj.Vy for obj in selected))
+        finished = stop is not None and stop(snapshot)
+        if finished or step % every == 0:
+            yield snapshot
+        if finished:
+            return
 
 
 if __name__ == "__main__":
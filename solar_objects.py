@@ -1,8 +1,17 @@
 # coding: utf-8
 # license: GPLv3
 
+import numpy as np
+
+body_dtype = np.dtype([("type", "S16"), ("R", "f8"), ("color", "S32"), ("m", "f8"),
+                       ("x", "f8"), ("y", "f8"), ("Vx", "f8"), ("Vy", "f8")])
+"""Тип записи о теле для массового чтения и записи (поля в порядке формата файла)."""
+
+
 class Star:
     type = "star"
+    __slots__ = ("m", "x", "y", "Vx", "Vy", "Fx", "Fy", "R", "color", "image")
+
     def __init__(self):
         self.m = 0
         self.x = 0
@@ -17,6 +26,8 @@ class Star:
 
 class Planet:
     type = "planet"
+    __slots__ = ("m", "x", "y", "Vx", "Vy", "Fx", "Fy", "R", "color", "image")
+
     def __init__(self):
         self.m = 0
         self.x = 0
@@ -27,4 +38,255 @@ class Planet:
         self.Fy = 0
         self.R = 5
         self.color = "green"
-        self.image = None
\ No newline at end of file
+        self.image = None
+
+class Particle:
+    """Пробная частица: движется в поле массивных тел, но сама поля не создаёт (масса 0)."""
+    type = "particle"
+    __slots__ = ("m", "x", "y", "Vx", "Vy", "Fx", "Fy", "R", "color", "image")
+
+    def __init__(self):
+        self.m = 0
+        self.x = 0
+        self.y = 0
+        self.Vx = 0
+        self.Vy = 0
+        self.Fx = 0
+        self.Fy = 0
+        self.R = 0.5
+        self.color = "gray"
+        self.image = None
+
+
+def _column(name, column=None):
+    """Свойство представления тела, читающее и пишущее элемент массива хранилища."""
+    if column is None:
+        def get(self):
+            return getattr(self.store, name)[self.index].item()
+
+        def set(self, value):
+            getattr(self.store, name)[self.index] = value
+    else:
+        def get(self):
+            return getattr(self.store, name)[self.index, column].item()
+
+        def set(self, value):
+            getattr(self.store, name)[self.index, column] = value
+    return property(get, set)
+
+
+class BodyView:
+    """Тело из хранилища BodyStore. Ведёт себя как Star/Planet (те же атрибуты),
+    но своих данных не имеет: все поля читаются и пишутся в массивы хранилища.
+    Два представления одного тела равны между собой."""
+    __slots__ = ("store", "index")
+
+    def __init__(self, store, index):
+        self.store = store
+        self.index = index
+
+    m = _column("_m")
+    x = _column("_pos", 0)
+    y = _column("_pos", 1)
+    Vx = _column("_vel", 0)
+    Vy = _column("_vel", 1)
+    Fx = _column("_force", 0)
+    Fy = _column("_force", 1)
+    R = _column("_R")
+
+    @property
+    def type(self):
+        return self.store.type_names[self.store._type[self.index]]
+
+    @property
+    def color(self):
+        return self.store.colors[self.store._color[self.index]]
+
+    @color.setter
+    def color(self, value):
+        self.store._color[self.index] = self.store.color_code(value)
+
+    @property
+    def image(self):
+        return self.store._image[self.index]
+
+    @image.setter
+    def image(self, value):
+        self.store._image[self.index] = value
+
+    def __eq__(self, other):
+        return isinstance(other, BodyView) and other.store is self.store and other.index == self.index
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
+
+
+class BodyStore:
+    """Компактное хранилище тел в виде структуры массивов.
+
+    Координаты, скорости, силы, массы, радиусы, типы и цвета всех тел лежат в
+    непрерывных массивах (на тело — меньше сотни байт), а тела доступны как
+    лёгкие представления BodyView: store[i].x += ... меняет массив. Движки
+    работают с массивами **pos**, **vel**, **m** и **force** напрямую.
+    """
+
+    type_names = ("star", "planet", "particle")
+    """Имена типов тел по их коду."""
+
+    def __init__(self, capacity=16):
+        self.count = 0
+        self.colors = []
+        self._color_codes = {}
+        self._allocate(capacity)
+
+    _arrays = ("_type", "_color", "_R", "_m", "_pos", "_vel", "_force", "_image")
+
+    def _allocate(self, capacity):
+        """Перераспределяет массивы под **capacity** тел, сохраняя данные."""
+        arrays = {
+            "_type": np.zeros(capacity, dtype=np.int8),
+            "_color": np.zeros(capacity, dtype=np.int32),
+            "_R": np.zeros(capacity),
+            "_m": np.zeros(capacity),
+            "_pos": np.zeros((capacity, 2)),
+            "_vel": np.zeros((capacity, 2)),
+            "_force": np.zeros((capacity, 2)),
+            "_image": np.full(capacity, None, dtype=object),
+        }
+        for name, array in arrays.items():
+            if self.count:
+                array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def color_code(self, color):
+        """Возвращает номер цвета в палитре, добавляя цвет при необходимости."""
+        code = self._color_codes.get(color)
+        if code is None:
+            code = self._color_codes[color] = len(self.colors)
+            self.colors.append(color)
+        return code
+
+    def _reserve(self, count):
+        if count > self.capacity:
+            self._allocate(max(count, 2 * self.capacity))
+
+    def append(self, object_type, R=5, color="red", m=0, x=0, y=0, Vx=0, Vy=0):
+        """Добавляет тело и возвращает его представление."""
+        self._reserve(self.count + 1)
+        i = self.count
+        self.count += 1
+        self._type[i] = self.type_names.index(object_type)
+        self._color[i] = self.color_code(color)
+        self._R[i], self._m[i] = R, m
+        self._pos[i] = x, y
+        self._vel[i] = Vx, Vy
+        self._force[i] = 0, 0
+        self._image[i] = None
+        return BodyView(self, i)
+
+    @classmethod
+    def from_objects(cls, space_objects):
+        """Создаёт хранилище по списку объектов Star/Planet/Particle."""
+        store = cls(max(len(space_objects), 1))
+        for obj in space_objects:
+            view = store.append(obj.type, obj.R, obj.color, obj.m, obj.x, obj.y, obj.Vx, obj.Vy)
+            view.Fx, view.Fy, view.image = obj.Fx, obj.Fy, obj.image
+        return store
+
+    @classmethod
+    def from_records(cls, bodies):
+        """Создаёт хранилище по массиву записей solar_input.body_dtype без создания объектов."""
+        n = len(bodies)
+        store = cls(max(n, 1))
+        store.count = n
+        types = np.char.decode(bodies["type"])
+        store._type[:n] = np.select([types == name for name in cls.type_names],
+                                    list(range(len(cls.type_names))), -1)
+        if (store._type[:n] < 0).any():
+            raise ValueError(f"Unknown space object: {types[store._type[:n] < 0][0]}")
+        colors, codes = np.unique(bodies["color"], return_inverse=True)
+        palette = np.array([store.color_code(color.decode()) for color in colors.tolist()], dtype=np.int32)
+        store._color[:n] = palette[codes] if n else 0
+        store._R[:n] = bodies["R"]
+        store._m[:n] = bodies["m"]
+        store._pos[:n, 0], store._pos[:n, 1] = bodies["x"], bodies["y"]
+        store._vel[:n, 0], store._vel[:n, 1] = bodies["Vx"], bodies["Vy"]
+        return store
+
+    def to_records(self):
+        """Возвращает массив записей body_dtype."""
+        bodies = np.empty(self.count, dtype=body_dtype)
+        bodies["type"] = np.array([name.encode() for name in self.type_names])[self.type_code]
+        bodies["color"] = np.array([color.encode() for color in self.colors] or [b""])[self.color_index]
+        bodies["R"], bodies["m"] = self.R, self.m
+        bodies["x"], bodies["y"] = self.pos[:, 0], self.pos[:, 1]
+        bodies["Vx"], bodies["Vy"] = self.vel[:, 0], self.vel[:, 1]
+        return bodies
+
+    def copy(self):
+        """Возвращает независимую копию хранилища (без изображений на холсте)."""
+        store = BodyStore(max(self.count, 1))
+        store.count = self.count
+        store.colors = list(self.colors)
+        store._color_codes = dict(self._color_codes)
+        for name in self._arrays[:-1]:
+            getattr(store, name)[:self.count] = getattr(self, name)[:self.count]
+        return store
+
+    def remove(self, indices):
+        """Удаляет тела с индексами **indices**; остальные сдвигаются к началу.
+        Ранее полученные представления BodyView после этого указывают на другие тела."""
+        keep = np.ones(self.count, dtype=bool)
+        keep[np.asarray(indices, dtype=np.intp)] = False
+        n = int(keep.sum())
+        for name in self._arrays:
+            array = getattr(self, name)
+            array[:n] = array[:self.count][keep]
+        self._image[n:self.count] = None
+        self.count = n
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("body index out of range")
+        return BodyView(self, index)
+
+    def __iter__(self):
+        return (BodyView(self, i) for i in range(self.count))
+
+    @property
+    def type_code(self):
+        return self._type[:self.count]
+
+    @property
+    def color_index(self):
+        return self._color[:self.count]
+
+    @property
+    def R(self):
+        return self._R[:self.count]
+
+    @property
+    def m(self):
+        return self._m[:self.count]
+
+    @property
+    def pos(self):
+        return self._pos[:self.count]
+
+    @property
+    def vel(self):
+        return self._vel[:self.count]
+
+    @property
+    def force(self):
+        return self._force[:self.count]
+
+    @property
+    def image(self):
+        return self._image[:self.count]
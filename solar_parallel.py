@@ -0,0 +1,154 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Параллельный расчёт сил на нескольких процессах.
+Координаты, массы, ускорения и списки номеров целевых тел и источников лежат
+в multiprocessing.shared_memory и записываются туда один раз за вызов, поэтому
+каждой задаче передаются только границы её участка и длины списков, а не
+массивы номеров и не сами объекты Star/Planet. Каждый процесс считает ускорения своего
+участка тем же ядром solar_engine.calculate_accelerations, что и
+однопроцессный движок, так что результаты совпадают.
+"""
+
+import atexit
+import multiprocessing
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import solar_engine
+
+workers = None
+"""Число рабочих процессов; None — по числу ядер процессора."""
+
+_evaluator = None
+"""Пул, используемый движком "parallel"; пересоздаётся при смене числа тел или процессов."""
+
+_worker_arrays = None
+"""Массивы общей памяти внутри рабочего процесса: (блоки памяти, pos, m, acc, phi, targets, sources)."""
+
+
+def _layout(n):
+    """Формы и типы массивов общей памяти для n тел (в порядке _worker_arrays)."""
+    return [((n, 2), np.float64), ((n,), np.float64), ((n, 2), np.float64), ((n,), np.float64),
+            ((n,), np.intp), ((n,), np.intp)]
+
+
+def _shared_array(shape, dtype=np.float64):
+    """Создаёт массив в общей памяти. Возвращает (блок памяти, массив)."""
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 8)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+def _attach(names, n):
+    """Инициализатор рабочего процесса: подключается к общей памяти."""
+    global _worker_arrays
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    arrays = [np.ndarray(shape, dtype=dtype, buffer=block.buf) for block, (shape, dtype) in zip(blocks, _layout(n))]
+    _worker_arrays = (blocks, *arrays)
+
+
+def _evaluate_slice(task):
+    """Считает ускорения (и, если нужно, потенциал) участка целевых тел и записывает их в общую память.
+
+    Параметры задачи:
+
+    **start**, **stop** — границы участка в списке целевых тел.
+    **all_targets** — целевые тела — все тела по порядку (список номеров не записан).
+    **source_count** — длина списка источников или -1, если источники — все тела.
+    **potential** — считать ли потенциал.
+    """
+    start, stop, all_targets, source_count, potential = task
+    blocks, pos, m, acc, phi, target_index, source_index = _worker_arrays
+    targets = np.arange(start, stop) if all_targets else target_index[start:stop]
+    sources = None if source_count < 0 else source_index[:source_count]
+    if potential:
+        acc[targets], phi[targets] = solar_engine.calculate_accelerations(pos, m, targets, sources, True)
+    else:
+        acc[targets] = solar_engine.calculate_accelerations(pos, m, targets, sources)
+
+
+class ParallelForceEvaluator:
+    """Пул процессов, считающих ускорения для N тел в общей памяти.
+
+    Параметры конструктора:
+
+    **n** — число тел.
+    **workers** — число рабочих процессов (None — по числу ядер).
+    """
+
+    def __init__(self, n, workers=None):
+        self.n = n
+        self.workers = workers or os.cpu_count() or 1
+        self._blocks = []
+        self.pos, self.m, self.acc, self.phi, self.targets, self.sources = \
+            [self._allocate(shape, dtype) for shape, dtype in _layout(n)]
+        self._pool = multiprocessing.Pool(self.workers, initializer=_attach,
+                                          initargs=([block.name for block in self._blocks], n))
+
+    def _allocate(self, shape, dtype):
+        block, array = _shared_array(shape, dtype)
+        self._blocks.append(block)
+        return array
+
+    def __call__(self, pos, m, targets=None, sources=None, potential=False):
+        """Вычисляет ускорения; интерфейс как у solar_engine.calculate_accelerations."""
+        self.pos[...] = pos
+        self.m[...] = m
+        count = self.n if targets is None else len(targets)
+        if targets is not None:
+            self.targets[:count] = targets
+        source_count = -1
+        if sources is not None:
+            source_count = len(sources)
+            self.sources[:source_count] = sources
+        # участки выравниваются по размеру тайла, чтобы суммирование шло в том же порядке
+        chunk = -(-count // self.workers)
+        chunk = max(solar_engine.block_size, -(-chunk // solar_engine.block_size) * solar_engine.block_size)
+        tasks = [(start, min(start + chunk, count), targets is None, source_count, potential)
+                 for start in range(0, count, chunk)]
+        self._pool.map(_evaluate_slice, tasks)
+        targets = slice(None) if targets is None else self.targets[:count]
+        if potential:
+            return self.acc[targets].copy(), self.phi[targets].copy()
+        return self.acc[targets].copy()
+
+    def close(self):
+        """Останавливает процессы и освобождает общую память."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+def calculate_accelerations(pos, m, targets=None, sources=None, potential=False):
+    """Вычисляет ускорения пулом процессов (движок "parallel").
+    Пул создаётся при первом вызове и переиспользуется на следующих шагах."""
+    global _evaluator
+    count = workers or os.cpu_count() or 1
+    if _evaluator is None or _evaluator.n != len(pos) or _evaluator.workers != count:
+        shutdown()
+        _evaluator = ParallelForceEvaluator(len(pos), count)
+    return _evaluator(pos, m, targets, sources, potential)
+
+
+def shutdown():
+    """Останавливает пул движка "parallel", если он был создан."""
+    global _evaluator
+    if _evaluator is not None:
+        _evaluator.close()
+        _evaluator = None
+
+
+atexit.register(shutdown)
+solar_engine.engines["parallel"] = calculate_accelerations
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
@@ -0,0 +1,206 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Встроенные замеры горячих участков: таймеры по фазам и счётчики событий.
+
+Пока замеры выключены (**enabled** ложно), phase() возвращает общий пустой
+контекст, count() сразу выходит, а timed() возвращает функцию без обёртки,
+так что расчёт почти ничего не теряет. Включить замеры можно переменной
+окружения SOLAR_PROFILE=1 или вызовом enable().
+
+Фазы: "step" — шаг целиком, "force" — расчёт сил, "move" — перемещение тел,
+"draw" — отрисовка кадра, "schedule_delay" — опоздание кадра по таймеру after.
+Счётчики: "steps", "force_evaluations", "frames", "dropped_frames".
+
+Модуль не использует NumPy и tkinter.
+"""
+
+import contextlib
+import cProfile
+import json
+import os
+import time
+
+enabled = bool(os.environ.get("SOLAR_PROFILE"))
+"""Включены ли замеры."""
+
+timers = {}
+"""Накопленные таймеры: имя фазы -> [суммарное время в секундах, число замеров]."""
+
+counters = {}
+"""Счётчики событий: имя -> значение."""
+
+log_file = None
+"""Открытый файл журнала в формате JSON Lines или None."""
+
+log_interval = 1.0
+"""Период записи строк журнала, секунд."""
+
+_null_phase = contextlib.nullcontext()
+_last_log = 0.0
+_last_readout = ({}, {})
+
+
+class _Phase:
+    """Контекст, добавляющий время своего выполнения к таймеру фазы."""
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        record(self.name, time.perf_counter() - self.started)
+
+
+def enable(on=True):
+    """Включает (или выключает) замеры."""
+    global enabled
+    enabled = on
+
+
+def reset():
+    """Обнуляет все таймеры и счётчики."""
+    global _last_readout
+    timers.clear()
+    counters.clear()
+    _last_readout = ({}, {})
+
+
+def phase(name):
+    """Контекст для замера фазы **name**: with phase("force"): ..."""
+    if not enabled:
+        return _null_phase
+    return _Phase(name)
+
+
+def record(name, seconds):
+    """Добавляет к таймеру фазы **name** один замер длительностью **seconds**."""
+    if enabled:
+        timer = timers.setdefault(name, [0.0, 0])
+        timer[0] += seconds
+        timer[1] += 1
+
+
+def count(name, value=1):
+    """Увеличивает счётчик **name** на **value**."""
+    if enabled:
+        counters[name] = counters.get(name, 0) + value
+
+
+def timed(name, func):
+    """Возвращает **func**, каждый вызов которой замеряется как фаза **name**
+    и увеличивает счётчик с тем же именем во множественном числе (для "force" —
+    "force_evaluations"). Если замеры выключены, возвращает саму **func**."""
+    if not enabled:
+        return func
+    counter = "force_evaluations" if name == "force" else name + "s"
+
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - started)
+            count(counter)
+    return wrapper
+
+
+def snapshot():
+    """Возвращает словарь с таймерами (суммарное и среднее время, число замеров) и счётчиками."""
+    return {
+        "timers": {name: {"total": total, "calls": calls, "mean": total / calls if calls else 0.0}
+                   for name, (total, calls) in list(timers.items())},
+        "counters": dict(counters),
+    }
+
+
+def readout():
+    """Возвращает короткую строку для строки состояния: средние длительности фаз
+    и приращения счётчиков с прошлого вызова."""
+    global _last_readout
+    previous_timers, previous_counters = _last_readout
+    current_timers = {name: tuple(timer) for name, timer in list(timers.items())}
+    current_counters = dict(counters)
+    parts = []
+    for name in ("force", "move", "draw", "schedule_delay"):
+        total, calls = current_timers.get(name, (0.0, 0))
+        old_total, old_calls = previous_timers.get(name, (0.0, 0))
+        if calls > old_calls:
+            parts.append(f"{name} {1000 * (total - old_total) / (calls - old_calls):.2f} ms")
+    for name in ("steps", "frames", "dropped_frames"):
+        if name in current_counters:
+            parts.append(f"{name} +{current_counters[name] - previous_counters.get(name, 0)}")
+    _last_readout = (current_timers, current_counters)
+    return "  ".join(parts)
+
+
+def start_log(filename, interval=1.0):
+    """Начинает журнал: раз в **interval** секунд tick() дописывает в файл
+    **filename** строку JSON со снимком таймеров и счётчиков. Включает замеры."""
+    global log_file, log_interval, _last_log
+    stop_log()
+    enable()
+    log_file = open(filename, "a")
+    log_interval = interval
+    _last_log = time.monotonic()
+
+
+def tick():
+    """Дописывает строку журнала, если он ведётся и с прошлой записи прошло **log_interval**."""
+    global _last_log
+    if log_file is None:
+        return
+    now = time.monotonic()
+    if now - _last_log >= log_interval:
+        _last_log = now
+        log_file.write(json.dumps(dict(snapshot(), time=time.time())) + "\n")
+        log_file.flush()
+
+
+def stop_log():
+    """Записывает последнюю строку и закрывает журнал."""
+    global log_file
+    if log_file is not None:
+        log_file.write(json.dumps(dict(snapshot(), time=time.time())) + "\n")
+        log_file.close()
+        log_file = None
+
+
+class StepProfiler:
+    """Профилирует cProfile шаги с номерами от **first** до **last** включительно
+    (нумерация с 1) и сохраняет статистику в файл **filename** (см. модуль pstats).
+
+    update(completed) вызывается до и после каждого шага с числом уже выполненных шагов.
+    """
+
+    def __init__(self, first, last, filename):
+        self.first = first
+        self.last = last
+        self.filename = filename
+        self.profile = cProfile.Profile()
+        self.active = False
+        self.done = False
+
+    def update(self, completed):
+        running = self.first <= completed + 1 <= self.last
+        if running and not self.active and not self.done:
+            self.profile.enable()
+            self.active = True
+        elif not running and self.active:
+            self.close()
+
+    def close(self):
+        """Останавливает профилирование и сохраняет статистику."""
+        if self.active:
+            self.profile.disable()
+            self.profile.dump_stats(self.filename)
+            self.active = False
+            self.done = True
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
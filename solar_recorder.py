@@ -0,0 +1,170 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Запись траекторий в двоичный файл, отображаемый в память.
+
+Формат файла:
+    заголовок (64 байта) — сигнатура, версия, смещение данных, число тел, число записей;
+    описание тел в JSON (тип, цвет, R, m), дополненное пробелами до смещения данных;
+    записи — строки из 1 + 4N чисел float64: время, затем x, y, Vx, Vy каждого тела.
+
+Файл заранее размечается с запасом и увеличивается вдвое при заполнении.
+Читатель открывает его через numpy.memmap без копирования и может взять
+любой диапазон времени или любые тела, не загружая файл целиком.
+"""
+
+import json
+import struct
+
+import numpy as np
+
+_magic = b"SOLTRAJ1"
+_header = struct.Struct("<8sIIQQ")
+_header_size = 64
+_alignment = 64
+
+
+def _body_metadata(space_objects):
+    """Возвращает описание тел для заголовка файла."""
+    return [{"type": obj.type, "color": obj.color, "R": obj.R, "m": obj.m} for obj in space_objects]
+
+
+class TrajectoryRecorder:
+    """Дописывает состояния системы в файл траектории.
+
+    Параметры конструктора:
+
+    **filename** — имя файла траектории (перезаписывается).
+    **space_objects** — список космических объектов (для описания тел).
+    **every** — записывать только каждый every-й шаг.
+    **capacity** — начальное число записей, под которое размечается файл.
+    """
+
+    def __init__(self, filename, space_objects, every=1, capacity=1024):
+        self.filename = filename
+        self.every = every
+        self.n_bodies = len(space_objects)
+        self.row_size = 1 + 4 * self.n_bodies
+        self.count = 0
+
+        metadata = json.dumps(_body_metadata(space_objects)).encode()
+        self.data_offset = -(-(_header_size + len(metadata)) // _alignment) * _alignment
+        with open(filename, "wb") as f:
+            f.write(_header.pack(_magic, 1, self.data_offset, self.n_bodies, 0).ljust(_header_size, b"\0"))
+            f.write(metadata.ljust(self.data_offset - _header_size))
+        self._map = None
+        self._resize(capacity)
+
+    def _resize(self, capacity):
+        """Перераспределяет файл под **capacity** записей."""
+        if self._map is not None:
+            self._map.flush()
+            self._map = None
+        with open(self.filename, "r+b") as f:
+            f.truncate(self.data_offset + 8 * self.row_size * capacity)
+        self.capacity = capacity
+        self._map = np.memmap(self.filename, dtype=np.float64, mode="r+",
+                              offset=self.data_offset, shape=(capacity, self.row_size))
+
+    def record(self, physical_time, pos, vel, step=None):
+        """Добавляет запись о состоянии системы.
+
+        Параметры:
+
+        **physical_time** — физическое время.
+        **pos**, **vel** — массивы координат и скоростей формы (N, 2).
+        **step** — номер шага; если он задан и не кратен **every**, запись пропускается.
+        """
+        if step is not None and step % self.every:
+            return
+        if self.count == self.capacity:
+            self._resize(2 * self.capacity)
+        row = self._map[self.count]
+        row[0] = physical_time
+        state = row[1:].reshape(self.n_bodies, 4)
+        state[:, 0:2] = pos
+        state[:, 2:4] = vel
+        self.count += 1
+
+    def flush(self):
+        """Сбрасывает данные на диск и обновляет число записей в заголовке."""
+        self._map.flush()
+        with open(self.filename, "r+b") as f:
+            f.write(_header.pack(_magic, 1, self.data_offset, self.n_bodies, self.count))
+
+    def close(self):
+        """Завершает запись и обрезает неиспользованный запас файла."""
+        if self._map is None:
+            return
+        self.flush()
+        self._map = None
+        with open(self.filename, "r+b") as f:
+            f.truncate(self.data_offset + 8 * self.row_size * self.count)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class TrajectoryReader:
+    """Открывает файл траектории без копирования данных.
+
+    Атрибуты:
+
+    **bodies** — описание тел (тип, цвет, R, m).
+    **times** — массив моментов времени записей.
+    **states** — массив формы (число записей, N, 4): x, y, Vx, Vy.
+    """
+
+    def __init__(self, filename):
+        with open(filename, "rb") as f:
+            magic, version, data_offset, n_bodies, count = _header.unpack(f.read(_header.size))
+            if magic != _magic:
+                raise ValueError(f"Not a trajectory file: {filename}")
+            f.seek(_header_size)
+            self.bodies = json.loads(f.read(data_offset - _header_size))
+        row_size = 1 + 4 * n_bodies
+        # в заголовке — число записей на момент последнего flush
+        if count:
+            records = np.memmap(filename, dtype=np.float64, mode="r",
+                                offset=data_offset, shape=(count, row_size))
+        else:
+            records = np.empty((0, row_size))
+        self.times = records[:, 0]
+        self.states = records[:, 1:].reshape(count, n_bodies, 4)
+
+    def __len__(self):
+        return len(self.times)
+
+    def time_range(self, start=None, end=None):
+        """Возвращает срез записей с моментами времени из отрезка [start, end]."""
+        first = 0 if start is None else int(np.searchsorted(self.times, start, side="left"))
+        last = len(self.times) if end is None else int(np.searchsorted(self.times, end, side="right"))
+        return slice(first, last)
+
+    def select(self, start=None, end=None, bodies=None):
+        """Возвращает моменты времени и состояния за отрезок [start, end].
+        Для непрерывного диапазона тел (срез) результат — представление файла без копирования.
+
+        Параметры:
+
+        **start**, **end** — границы отрезка времени (None — без ограничения).
+        **bodies** — индексы или срез тел (None — все тела).
+        """
+        records = self.time_range(start, end)
+        states = self.states[records]
+        if bodies is not None:
+            states = states[:, bodies]
+        return self.times[records], states
+
+
+def open_trajectory(filename):
+    """Открывает файл траектории для чтения."""
+    return TrajectoryReader(filename)
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
@@ -0,0 +1,218 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Генератор больших синтетических систем для проверки масштабирования.
+
+Сценарии:
+    disk     — звезда и кеплеров диск планет на круговых орбитах;
+    belt     — звезда и пояс пробных частиц (Particle) на почти круговых орбитах;
+    cluster  — скопление звёзд равной массы в плоском диске, в вириальном равновесии
+               (2K = -W для равномерного диска, в среднем по ансамблю);
+    binaries — поле иерархических кратных звёзд: двойные из двойных глубиной depth.
+
+Тела порождаются пачками по solar_input.chunk_size и сразу пишутся в файл,
+так что в памяти никогда не лежит больше одной пачки, и можно создавать
+системы из десятков миллионов тел. Вывод — текст в формате solar_system.txt
+или двоичный массив записей .npy (по расширению имени файла).
+
+Случайные числа берутся из хэша (зерно, поток, номер тела), а не из
+последовательного генератора: тело номер i одинаково при любом разбиении на
+пачки, и при одном и том же зерне файл получается тот же самый.
+
+Пример:
+    python solar_scenarios.py belt 10000000 belt.npy --seed 1
+"""
+
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from solar_input import chunk_size, write_space_objects_chunks, write_space_objects_npy
+from solar_model import gravitational_constant
+from solar_objects import body_dtype
+
+sun_mass = 1.98892e30
+"""Масса Солнца, кг."""
+
+astronomical_unit = 1.495978707e11
+"""Астрономическая единица, м."""
+
+_golden = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _mix(x):
+    """Перемешивание splitmix64 массива uint64."""
+    x = x + _golden
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def uniform(seed, stream, index):
+    """Возвращает равномерно распределённые на [0, 1) числа, однозначно заданные
+    зерном **seed**, номером потока **stream** и массивом номеров **index**."""
+    key = _mix(_mix(np.array([seed], dtype=np.uint64)) ^ np.array([stream], dtype=np.uint64))
+    x = _mix(np.asarray(index, dtype=np.uint64) ^ key)
+    return (x >> np.uint64(11)).astype(float) * 2.0 ** -53
+
+
+def normal(seed, stream, index):
+    """Возвращает нормально распределённые числа (преобразование Бокса — Мюллера)."""
+    u1 = uniform(seed, 2 * stream, index)
+    u2 = uniform(seed, 2 * stream + 1, index)
+    return np.sqrt(-2 * np.log1p(-u1)) * np.cos(2 * math.pi * u2)
+
+
+def _ranges(n):
+    """Выдаёт отрезки номеров тел [start, stop) длиной не больше chunk_size."""
+    for start in range(0, n, chunk_size):
+        yield start, min(start + chunk_size, n)
+
+
+def _records(index, object_type, R, color, m, x, y, vx, vy):
+    chunk = np.empty(len(index), dtype=body_dtype)
+    chunk["type"], chunk["R"], chunk["color"], chunk["m"] = object_type, R, color, m
+    chunk["x"], chunk["y"], chunk["Vx"], chunk["Vy"] = x, y, vx, vy
+    return chunk
+
+
+def _central_star(mass):
+    return _records([0], b"star", 5.0, b"yellow", mass, 0.0, 0.0, 0.0, 0.0)
+
+
+def _annulus(seed, index, inner, outer):
+    """Радиусы и углы точек в кольце; плотность на единицу площади ∝ 1/r."""
+    r = inner + (outer - inner) * uniform(seed, 0, index)
+    angle = 2 * math.pi * uniform(seed, 1, index)
+    return r, angle
+
+
+def disk(n, seed=0, star_mass=sun_mass, inner=0.3 * astronomical_unit, outer=30 * astronomical_unit,
+         min_mass=1e20, max_mass=1e25):
+    """Звезда и n - 1 планет на круговых орбитах в кольце [inner, outer];
+    массы планет распределены равномерно по логарифму от min_mass до max_mass."""
+    colors = np.array([b"blue", b"green", b"orange", b"white"])
+    for start, stop in _ranges(n):
+        index = np.arange(max(start, 1), stop)
+        r, angle = _annulus(seed, index, inner, outer)
+        m = np.exp(np.log(min_mass) + np.log(max_mass / min_mass) * uniform(seed, 2, index))
+        speed = np.sqrt(gravitational_constant * star_mass / r)
+        color = colors[(uniform(seed, 3, index) * len(colors)).astype(int)]
+        chunk = _records(index, b"planet", 1.0, color, m, r * np.cos(angle), r * np.sin(angle),
+                         -speed * np.sin(angle), speed * np.cos(angle))
+        yield np.concatenate([_central_star(star_mass), chunk]) if start == 0 else chunk
+
+
+def belt(n, seed=0, star_mass=sun_mass, inner=2.1 * astronomical_unit, outer=3.3 * astronomical_unit,
+         eccentricity=0.1):
+    """Звезда и n - 1 пробных частиц в поясе [inner, outer]; скорость каждой частицы
+    отличается от круговой на случайную величину порядка **eccentricity**."""
+    for start, stop in _ranges(n):
+        index = np.arange(max(start, 1), stop)
+        r, angle = _annulus(seed, index, inner, outer)
+        circular = np.sqrt(gravitational_constant * star_mass / r)
+        radial = eccentricity * circular * (2 * uniform(seed, 2, index) - 1)
+        tangential = circular * (1 + 0.5 * eccentricity * (2 * uniform(seed, 3, index) - 1))
+        vx = radial * np.cos(angle) - tangential * np.sin(angle)
+        vy = radial * np.sin(angle) + tangential * np.cos(angle)
+        chunk = _records(index, b"particle", 0.5, b"gray", 0.0, r * np.cos(angle), r * np.sin(angle), vx, vy)
+        yield np.concatenate([_central_star(star_mass), chunk]) if start == 0 else chunk
+
+
+def cluster(n, seed=0, star_mass=sun_mass, radius=1e4 * astronomical_unit):
+    """n звёзд массы star_mass, равномерно в круге радиуса radius. Энергия связи
+    равномерного диска W = -8 G M² / (3π R); скорости нормальные с дисперсией
+    σ² = 4 G M / (3π R) по каждой оси, так что 2K = -W."""
+    sigma = math.sqrt(4 * gravitational_constant * n * star_mass / (3 * math.pi * radius))
+    colors = np.array([b"yellow", b"white", b"orange", b"red"])
+    for start, stop in _ranges(n):
+        index = np.arange(start, stop)
+        r = radius * np.sqrt(uniform(seed, 0, index))
+        angle = 2 * math.pi * uniform(seed, 1, index)
+        color = colors[(uniform(seed, 2, index) * len(colors)).astype(int)]
+        yield _records(index, b"star", 2.0, color, star_mass, r * np.cos(angle), r * np.sin(angle),
+                       sigma * normal(seed, 2, index), sigma * normal(seed, 3, index))
+
+
+def binaries(n, seed=0, star_mass=sun_mass, depth=2, separation=100 * astronomical_unit, ratio=0.1,
+             radius=1e5 * astronomical_unit, dispersion=1000.0):
+    """Поле из n // 2**depth иерархических систем по 2**depth звёзд массы star_mass.
+    Система — двойная, каждый компонент которой — двойная и так далее до глубины
+    **depth**; на уровне L большая полуось separation * ratio**L, орбиты круговые,
+    ориентации случайные. Центры систем равномерно разбросаны в круге радиуса
+    **radius** и движутся с нормальной дисперсией скоростей **dispersion**."""
+    size = 2 ** depth
+    n = n // size * size
+    for start, stop in _ranges(n):
+        index = np.arange(start, stop)
+        system = index // size
+        r = radius * np.sqrt(uniform(seed, 0, system))
+        angle = 2 * math.pi * uniform(seed, 1, system)
+        x, y = r * np.cos(angle), r * np.sin(angle)
+        vx, vy = dispersion * normal(seed, 1, system), dispersion * normal(seed, 2, system)
+        for level in range(depth):
+            node = index >> (depth - level)  # номер двойной на этом уровне (свой у каждой системы)
+            sign = np.where((index >> (depth - 1 - level)) & 1, 1.0, -1.0)
+            a = separation * ratio ** level
+            mass = star_mass * 2 ** (depth - level)  # масса двойной; компоненты равны
+            phase = 2 * math.pi * uniform(seed, 10 + level, node)
+            speed = 0.5 * math.sqrt(gravitational_constant * mass / a)
+            x = x + sign * 0.5 * a * np.cos(phase)
+            y = y + sign * 0.5 * a * np.sin(phase)
+            vx = vx - sign * speed * np.sin(phase)
+            vy = vy + sign * speed * np.cos(phase)
+        yield _records(index, b"star", 2.0, b"white", star_mass, x, y, vx, vy)
+
+
+scenarios = {"disk": disk, "belt": belt, "cluster": cluster, "binaries": binaries}
+"""Генераторы сценариев по имени: функция (n, seed, ...) выдаёт пачки записей body_dtype."""
+
+
+def scenario_size(scenario, n, **parameters):
+    """Возвращает число тел, которое сценарий действительно создаст при запросе **n**."""
+    if scenario == "binaries":
+        size = 2 ** parameters.get("depth", 2)
+        return n // size * size
+    return n
+
+
+def write_scenario(filename, scenario, n, seed=0, **parameters):
+    """Создаёт сценарий **scenario** из **n** тел и пишет его в файл **filename**
+    (.npy — двоичный массив записей, иначе текст solar_system.txt).
+    Возвращает число записанных тел."""
+    chunks = scenarios[scenario](n, seed, **parameters)
+    if filename.endswith(".npy"):
+        count = scenario_size(scenario, n, **parameters)
+        write_space_objects_npy(filename, chunks, count)
+        return count
+    count = 0
+
+    def counted():
+        nonlocal count
+        for chunk in chunks:
+            count += len(chunk)
+            yield chunk
+    write_space_objects_chunks(filename, counted())
+    return count
+
+
+def main(argv=None):
+    """Главная функция генератора."""
+    parser = argparse.ArgumentParser(description="Generate large synthetic systems.")
+    parser.add_argument("scenario", choices=sorted(scenarios), help="kind of system")
+    parser.add_argument("n", type=int, help="number of bodies")
+    parser.add_argument("output", help="output file: .npy for binary records, anything else for text")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--depth", type=int, default=2, help="hierarchy depth for binaries")
+    args = parser.parse_args(argv)
+    parameters = {"depth": args.depth} if args.scenario == "binaries" else {}
+    count = write_scenario(args.output, args.scenario, args.n, args.seed, **parameters)
+    print(f"{count} bodies written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
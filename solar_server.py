@@ -0,0 +1,463 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Сервер расчёта на asyncio: один расчёт, много локальных клиентов.
+
+Расчёт идёт в потоке SimulationWorker (solar_worker), так что цикл шагов не
+зависит от клиентов. Сервер принимает подключения по TCP (по умолчанию только
+127.0.0.1) или через Unix-сокет и раз в 1/rate секунд отправляет каждому
+клиенту последний опубликованный снимок состояния с той частотой, которую
+клиент выбрал сам. Если клиент не успевает читать и его буфер отправки
+переполнен, кадр для него пропускается, а не ждёт.
+
+Протокол.
+Клиент посылает команды строками JSON: {"cmd": имя, ...параметры}:
+    subscribe  — rate (кадров в секунду), precision ("float32" или "float64"),
+                 velocities (посылать ли скорости);
+    start, pause;
+    dt         — value: новый шаг по времени (положительный);
+    speed      — value: модельных секунд за секунду реального времени (положительное);
+    load       — filename: загрузить систему из файла solar_system.txt;
+    save       — filename: сохранить последний снимок в файл;
+                 имена файлов берутся относительно каталога данных сервера
+                 (--data-dir), выйти за его пределы нельзя;
+    bodies     — прислать описание тел.
+Сервер отвечает кадрами: заголовок **frame_header** (сигнатура, вид кадра,
+размер элемента, число столбцов, N, физическое время, номер шага), затем:
+    для снимка (kind_snapshot) — массив N × столбцов чисел (x, y[, Vx, Vy]);
+    для сообщения (kind_message) — N байт JSON: ответ на команду
+    ({"reply": имя, "ok": ...}) или событие ({"event": "bodies", "bodies": [...]}).
+
+Пример:
+    python solar_server.py solar_system.txt --port 8765 --dt 3600 --start
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+
+import numpy as np
+
+from solar_input import read_space_objects_store, write_space_objects_arrays
+from solar_objects import BodyStore, body_dtype
+from solar_simulation import Simulation
+from solar_worker import SimulationWorker
+
+frame_header = struct.Struct("<4sBBBxIdQ")
+"""Заголовок кадра: сигнатура, вид, размер элемента, число столбцов, N, время, шаг."""
+
+magic = b"SOL1"
+"""Сигнатура кадра."""
+
+kind_snapshot = 0
+"""Вид кадра: снимок состояния."""
+
+kind_message = 1
+"""Вид кадра: сообщение JSON."""
+
+default_port = 8765
+"""Порт TCP по умолчанию."""
+
+max_buffer = 1 << 20
+"""Наибольший объём неотправленных данных клиента, байт; сверх него кадры пропускаются."""
+
+
+def encode_message(message, physical_time=0.0, step_count=0):
+    """Возвращает кадр с сообщением **message** (словарь, кодируется в JSON)."""
+    payload = json.dumps(message).encode()
+    return frame_header.pack(magic, kind_message, 1, 1, len(payload), physical_time, step_count) + payload
+
+
+def encode_snapshot(physical_time, step_count, pos, vel=None, precision="float64"):
+    """Возвращает кадр со снимком координат (и скоростей, если **vel** задан)."""
+    dtype = np.dtype(precision)
+    columns = pos if vel is None else np.hstack([pos, vel])
+    payload = np.ascontiguousarray(columns, dtype=dtype.newbyteorder("<")).tobytes()
+    return frame_header.pack(magic, kind_snapshot, dtype.itemsize, columns.shape[1], len(pos),
+                             physical_time, step_count) + payload
+
+
+def decode_payload(header, payload):
+    """Разбирает кадр. Возвращает (kind, physical_time, step_count, data), где data —
+    словарь для сообщения или массив формы (N, столбцы) float64 для снимка."""
+    signature, kind, itemsize, columns, n, physical_time, step_count = header
+    if signature != magic:
+        raise ValueError("Not a simulation server frame")
+    if kind == kind_message:
+        return kind, physical_time, step_count, json.loads(payload.decode())
+    data = np.frombuffer(payload, dtype=f"<f{itemsize}").reshape(n, columns).astype(float)
+    return kind, physical_time, step_count, data
+
+
+def payload_size(header):
+    """Возвращает длину данных кадра по разобранному заголовку."""
+    signature, kind, itemsize, columns, n = header[:5]
+    return n if kind == kind_message else n * columns * itemsize
+
+
+def body_metadata(store):
+    """Возвращает описание тел хранилища: тип, цвет, R и m каждого тела."""
+    return [{"type": body.type, "color": body.color, "R": body.R, "m": body.m} for body in store]
+
+
+class _Connection:
+    """Состояние одного клиента на сервере."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.rate = 30.0
+        self.precision = "float64"
+        self.velocities = True
+        self.sent = None
+        self.frames = 0
+        self.dropped = 0
+
+    def send(self, data):
+        """Ставит кадр в буфер отправки; если буфер переполнен, пропускает кадр."""
+        if self.writer.transport.get_write_buffer_size() > max_buffer:
+            self.dropped += 1
+            return False
+        self.writer.write(data)
+        self.frames += 1
+        return True
+
+
+class SimulationServer:
+    """Сервер, раздающий состояние расчёта клиентам и принимающий команды.
+
+    Параметры конструктора:
+
+    **simulation** — расчёт solar_simulation.Simulation над хранилищем BodyStore.
+    **speed** — модельных секунд за секунду реального времени.
+    **running** — начинать ли расчёт сразу.
+    **data_directory** — каталог, в котором клиенты могут загружать и сохранять
+    файлы; None — команды load и save запрещены.
+    """
+
+    def __init__(self, simulation, speed=1e5, running=False, data_directory=None):
+        self.speed = speed
+        self.running = running
+        self.data_directory = os.path.realpath(data_directory) if data_directory is not None else None
+        self.connections = set()
+        self._files = asyncio.Lock()
+        self.worker = None
+        self.generation = 0
+        self._encoded = {}
+        self._use(simulation)
+
+    def _use(self, simulation):
+        """Запускает поток расчёта для **simulation** вместо прежнего."""
+        if self.worker is not None:
+            self.worker.stop()
+        self.simulation = simulation
+        self.store = simulation.space_objects
+        self.dt = simulation.dt
+        self.generation += 1
+        self.worker = SimulationWorker(simulation)
+        self.worker.set_parameters(self.dt, self.speed, self.running)
+        self.worker.start()
+
+    def _apply_parameters(self):
+        self.worker.set_parameters(self.dt, self.speed, self.running)
+
+    def data_path(self, filename):
+        """Возвращает полный путь файла **filename** в каталоге данных.
+        Путь вне каталога (в том числе через .. и символические ссылки) — ValueError."""
+        if self.data_directory is None:
+            raise ValueError("File commands are disabled: the server has no data directory")
+        if not isinstance(filename, str):
+            raise ValueError("filename must be a string")
+        path = os.path.realpath(os.path.join(self.data_directory, filename))
+        if os.path.commonpath([path, self.data_directory]) != self.data_directory:
+            raise ValueError(f"{filename} is outside the data directory")
+        return path
+
+    def _open(self, filename):
+        """Читает систему из файла и возвращает расчёт с текущими шагом, движком и интегратором."""
+        return Simulation(read_space_objects_store(filename), self.dt,
+                          self.simulation.engine, self.simulation.integrator)
+
+    def snapshot_frame(self, connection):
+        """Возвращает кадр с последним снимком в формате клиента (один раз кодируется на всех)."""
+        physical_time, step_count, pos, vel = self.worker.latest
+        key = (self.generation, step_count, connection.precision, connection.velocities)
+        frame = self._encoded.get(key)
+        if frame is None:
+            if self._encoded and next(iter(self._encoded))[:2] != key[:2]:
+                self._encoded.clear()
+            frame = encode_snapshot(physical_time, step_count, pos,
+                                    vel if connection.velocities else None, connection.precision)
+            self._encoded[key] = frame
+        return key[:2], frame
+
+    def bodies_message(self):
+        """Возвращает кадр-событие с описанием тел."""
+        physical_time, step_count = self.worker.latest[:2]
+        return encode_message({"event": "bodies", "bodies": body_metadata(self.store)},
+                              physical_time, step_count)
+
+    async def execute(self, connection, command):
+        """Выполняет команду клиента. Возвращает словарь ответа.
+        Чтение и запись файлов и остановка прежнего потока расчёта идут в
+        отдельных потоках, чтобы не задерживать кадры остальным клиентам."""
+        if not isinstance(command, dict):
+            raise ValueError("Command must be a JSON object")
+        name = command.get("cmd")
+        if name == "subscribe":
+            connection.rate = float(command.get("rate", connection.rate))
+            connection.precision = command.get("precision", connection.precision)
+            connection.velocities = bool(command.get("velocities", connection.velocities))
+            if not connection.rate > 0 or connection.precision not in ("float32", "float64"):
+                raise ValueError("rate must be positive and precision float32 or float64")
+            connection.sent = None
+        elif name in ("start", "pause"):
+            self.running = name == "start"
+            self._apply_parameters()
+        elif name in ("dt", "speed"):
+            value = float(command["value"])
+            if not value > 0:  # отсекает и nan
+                raise ValueError(f"{name} must be positive")
+            setattr(self, name, value)
+            self._apply_parameters()
+        elif name == "load":
+            path = self.data_path(command["filename"])
+            async with self._files:
+                simulation = await asyncio.to_thread(self._open, path)
+                await asyncio.to_thread(self.worker.stop)
+                self._use(simulation)
+                message = self.bodies_message()
+                for other in self.connections:
+                    other.send(message)
+        elif name == "save":
+            path = self.data_path(command["filename"])
+            physical_time, step_count, pos, vel = self.worker.latest
+            bodies = self.store.to_records()
+            bodies["x"], bodies["y"] = pos[:, 0], pos[:, 1]
+            bodies["Vx"], bodies["Vy"] = vel[:, 0], vel[:, 1]
+            async with self._files:
+                await asyncio.to_thread(write_space_objects_arrays, path, bodies)
+        elif name == "bodies":
+            connection.send(self.bodies_message())
+        else:
+            raise ValueError(f"Unknown command: {name}")
+        return {"reply": name, "ok": True, "running": self.running, "dt": self.dt, "speed": self.speed}
+
+    async def _stream(self, connection):
+        """Отправляет клиенту новые снимки с выбранной им частотой."""
+        while True:
+            await asyncio.sleep(1 / connection.rate)
+            key, frame = self.snapshot_frame(connection)
+            if key != connection.sent and connection.send(frame):
+                connection.sent = key
+
+    async def handle(self, reader, writer):
+        """Обслуживает одного клиента до отключения."""
+        connection = _Connection(writer)
+        self.connections.add(connection)
+        connection.send(self.bodies_message())
+        stream = asyncio.ensure_future(self._stream(connection))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self.execute(connection, json.loads(line))
+                except (ValueError, KeyError, TypeError, AttributeError, OSError) as error:
+                    reply = {"reply": None, "ok": False, "error": str(error)}
+                connection.send(encode_message(reply, *self.worker.latest[:2]))
+        except ConnectionError:
+            pass
+        finally:
+            stream.cancel()
+            self.connections.discard(connection)
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=default_port, path=None):
+        """Принимает клиентов на **host**:**port** или на Unix-сокете **path**, пока задача не отменена."""
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle, path)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """Останавливает поток расчёта."""
+        self.worker.stop()
+
+
+class SimulationClient:
+    """Клиент сервера расчёта для графического интерфейса и скриптов.
+
+    Поддерживает тот же интерфейс, что и solar_worker.SimulationWorker:
+    start(), stop(), set_parameters(dt, rate, running) и атрибут **latest**
+    (physical_time, step_count, pos, vel), так что интерфейс может показывать
+    удалённый расчёт вместо своего потока. Кадры читаются в фоновом потоке.
+
+    Когда на сервере загружается другая система, **bodies** и **latest** остаются
+    прежними до первого снимка новой системы и затем меняются вместе, а счётчик
+    **generation** увеличивается: по нему интерфейс узнаёт, что тела надо перестроить.
+
+    Параметры конструктора:
+
+    **address** — "host:port" для TCP или путь к Unix-сокету.
+    **rate** — кадров в секунду, которые просит клиент.
+    **precision** — "float32" (вдвое меньше данных) или "float64".
+    """
+
+    simulation = None
+    """Расчёта в процессе клиента нет."""
+
+    def __init__(self, address, rate=30, precision="float64", timeout=10.0):
+        host, _, port = address.rpartition(":")
+        if os.sep in address or not port.isdigit():
+            self.socket = socket.socket(socket.AF_UNIX)
+            self.socket.connect(address)
+        else:
+            self.socket = socket.create_connection((host or "127.0.0.1", int(port)), timeout)
+            self.socket.settimeout(None)
+        self.file = self.socket.makefile("rb")
+        self.timeout = timeout
+        self.bodies = None
+        self.latest = None
+        self.generation = 0
+        self.parameters = None
+        self._pending_bodies = None
+        self.replies = []
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._read, daemon=True)
+        self._thread.start()
+        self.command("subscribe", rate=rate, precision=precision, velocities=True)
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.latest is not None and self.bodies is not None,
+                                            timeout):
+                raise TimeoutError(f"No state from simulation server {address}")
+
+    def _read(self):
+        """Читает кадры сервера, пока соединение открыто."""
+        try:
+            while True:
+                raw = self.file.read(frame_header.size)
+                if len(raw) < frame_header.size:
+                    break
+                header = frame_header.unpack(raw)
+                kind, physical_time, step_count, data = decode_payload(header, self.file.read(payload_size(header)))
+                with self._condition:
+                    if kind == kind_snapshot:
+                        # снимки после события bodies относятся уже к новым телам
+                        if self._pending_bodies is not None and len(data) == len(self._pending_bodies):
+                            self.bodies, self._pending_bodies = self._pending_bodies, None
+                            self.generation += 1
+                        if self.bodies is not None and len(data) == len(self.bodies):
+                            self.latest = (physical_time, step_count, data[:, :2].copy(), data[:, 2:4].copy())
+                    elif data.get("event") == "bodies":
+                        self._pending_bodies = data["bodies"]
+                    else:
+                        self.replies.append(data)
+                    self._condition.notify_all()
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._condition:
+                self.replies.append({"reply": None, "ok": False, "error": "connection closed"})
+                self._condition.notify_all()
+
+    def command(self, name, **parameters):
+        """Посылает команду и ждёт ответа. Возвращает ответ; при ошибке — RuntimeError."""
+        with self._condition:
+            self.replies.clear()
+            self.socket.sendall(json.dumps(dict(parameters, cmd=name)).encode() + b"\n")
+            if not self._condition.wait_for(lambda: self.replies, self.timeout):
+                raise TimeoutError(f"No reply to {name}")
+            reply = self.replies.pop(0)
+        if not reply["ok"]:
+            raise RuntimeError(reply.get("error", "command failed"))
+        return reply
+
+    def set_parameters(self, dt, rate, running):
+        """Передаёт серверу изменившиеся параметры (вызывается раз в кадр)."""
+        previous = self.parameters or (None, None, None)
+        self.parameters = (dt, rate, running)
+        if dt != previous[0] and dt > 0:
+            self.command("dt", value=dt)
+        if rate != previous[1] and rate > 0:
+            self.command("speed", value=rate)
+        if running != previous[2]:
+            self.command("start" if running else "pause")
+
+    def load(self, filename):
+        """Загружает на сервере систему из файла и ждёт её первого снимка.
+        Относительное имя отсчитывается от каталога данных сервера."""
+        generation = self.generation
+        self.command("load", filename=filename)
+        with self._condition:
+            self._condition.wait_for(lambda: self.generation != generation, self.timeout)
+
+    def save(self, filename):
+        """Сохраняет на сервере последний снимок в файл.
+        Относительное имя отсчитывается от каталога данных сервера."""
+        self.command("save", filename=filename)
+
+    def store(self):
+        """Возвращает хранилище BodyStore с описанием тел и последним снимком состояния."""
+        with self._condition:
+            bodies, (physical_time, step_count, pos, vel) = self.bodies, self.latest
+        records = np.zeros(len(bodies), dtype=body_dtype)
+        for field in ("type", "color", "R", "m"):
+            records[field] = [body[field] for body in bodies]
+        records["x"], records["y"] = pos[:, 0], pos[:, 1]
+        records["Vx"], records["Vy"] = vel[:, 0], vel[:, 1]
+        return BodyStore.from_records(records)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        """Закрывает соединение (расчёт на сервере продолжается)."""
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        self._thread.join(self.timeout)
+
+
+def main(argv=None):
+    """Главная функция сервера."""
+    parser = argparse.ArgumentParser(description="Simulation server streaming state to local clients.")
+    parser.add_argument("input", help="input file in solar_system.txt format")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--port", type=int, default=default_port, help="TCP port")
+    parser.add_argument("--unix", help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--dt", type=float, default=1.0, help="time step, seconds")
+    parser.add_argument("--speed", type=float, default=1e5, help="simulated seconds per real second")
+    parser.add_argument("--engine", default="numpy", help="force engine")
+    parser.add_argument("--integrator", default="leapfrog", help="integrator")
+    parser.add_argument("--start", action="store_true", help="start running immediately")
+    parser.add_argument("--data-dir", help="directory clients may load from and save to "
+                                           "(default: the directory of the input file)")
+    args = parser.parse_args(argv)
+
+    simulation = Simulation.from_file(args.input, args.dt, args.engine, args.integrator)
+    data_directory = args.data_dir or os.path.dirname(os.path.abspath(args.input))
+    server = SimulationServer(simulation, args.speed, args.start, data_directory)
+    where = args.unix or f"{args.host}:{args.port}"
+    print(f"Serving {len(simulation.m)} bodies on {where}")
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
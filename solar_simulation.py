@@ -0,0 +1,148 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Модель без графического интерфейса.
+Состояние системы хранится в массивах NumPy, шаги выполняются подряд,
+без таймеров tkinter. Модуль не импортирует tkinter.
+"""
+
+import numpy as np
+
+import solar_engine
+import solar_profiling
+from solar_input import read_space_objects_store, arrays_from_objects, write_space_objects_arrays
+from solar_objects import BodyStore
+
+
+class Simulation:
+    """Расчёт движения системы тел с фиксированным шагом по времени.
+
+    Атрибуты:
+
+    **space_objects** — хранилище BodyStore или список космических объектов
+    (список обновляется методом sync_objects).
+    **pos**, **vel**, **m** — массивы координат, скоростей и масс; для BodyStore —
+    массивы самого хранилища, которые расчёт меняет на месте.
+    **dt** — шаг по времени.
+    **engine** — имя движка расчёта сил (см. solar_engine.engines).
+    **integrator** — имя интегратора (см. solar_integrators.integrators).
+    **integrator_state** — состояние интегратора между шагами.
+    **physical_time** — физическое время от начала расчёта.
+    **step_count** — число выполненных шагов.
+    **recorder** — объект записи траектории (solar_recorder.TrajectoryRecorder) или None.
+    **profiler** — профилировщик диапазона шагов (solar_profiling.StepProfiler) или None.
+    **checkpointer** — запись контрольных точек (solar_checkpoint.CheckpointWriter) или None.
+    **collisions** — обработка столкновений (solar_collisions.CollisionHandler) или None.
+    **diagnostics** — контроль сохраняющихся величин (solar_diagnostics.DiagnosticsMonitor) или None.
+    **timeline** — опорные кадры для просмотра прошлых моментов (solar_timeline.Timeline) или None.
+    **frames** — вывод кадров в файлы изображений (solar_frames.FrameExporter) или None.
+    """
+
+    def __init__(self, space_objects, dt=1.0, engine="numpy", integrator="euler"):
+        self.space_objects = space_objects
+        self.pos, self.vel, self.m = solar_engine.pack_space_objects(space_objects)
+        self.acc = None
+        self.dt = dt
+        self.engine = engine
+        self.integrator = integrator
+        self.integrator_state = {}
+        self.physical_time = 0.0
+        self.step_count = 0
+        self.recorder = None
+        self.profiler = None
+        self.checkpointer = None
+        self.collisions = None
+        self.diagnostics = None
+        self.timeline = None
+        self.frames = None
+
+    @classmethod
+    def from_file(cls, input_filename, dt=1.0, engine="numpy", integrator="euler"):
+        """Создаёт расчёт по файлу в формате solar_system.txt (массовое чтение с кэшем
+        в хранилище BodyStore, без объектов на каждое тело)."""
+        return cls(read_space_objects_store(input_filename), dt, engine, integrator)
+
+    def step(self, steps=1):
+        """Выполняет **steps** шагов выбранным интегратором."""
+        for _ in range(steps):
+            if self.profiler is not None:
+                self.profiler.update(self.step_count)
+            self.acc = solar_engine.step_arrays(self.pos, self.vel, self.m, self.dt, self.engine,
+                                                self.integrator, self.integrator_state)
+            self.physical_time += self.dt
+            self.step_count += 1
+            if self.collisions is not None:
+                self.collisions.apply(self)
+            if self.diagnostics is not None:
+                self.diagnostics.update(self)
+            if self.recorder is not None:
+                self.recorder.record(self.physical_time, self.pos, self.vel, self.step_count)
+            if self.timeline is not None:
+                self.timeline.update(self)
+            if self.frames is not None:
+                self.frames.update(self)
+            if self.profiler is not None:
+                self.profiler.update(self.step_count)
+            if self.checkpointer is not None:
+                self.checkpointer.update(self)
+            solar_profiling.tick()
+
+    def run(self, steps=None, until=None):
+        """Выполняет заданное число шагов или считает до физического времени **until**.
+
+        Параметры:
+
+        **steps** — число шагов.
+        **until** — физическое время, до которого нужно досчитать.
+
+        При неположительном шаге **dt** счёт до **until** никогда бы не закончился,
+        поэтому в этом случае поднимается ValueError.
+        """
+        if until is not None and not self.dt > 0:
+            raise ValueError(f"Time step must be positive to run until a given time, got dt={self.dt}")
+        if steps is not None:
+            self.step(steps)
+        if until is not None:
+            while self.physical_time < until - 1e-9 * self.dt:
+                self.step()
+
+    @property
+    def force_evaluations(self):
+        """Число вычислений сил с начала расчёта."""
+        return self.integrator_state.get("force_evaluations", 0)
+
+    def remove_bodies(self, indices):
+        """Удаляет тела с индексами **indices** (например, поглощённые при слиянии).
+        Состояние интегратора сбрасывается: запомненные ускорения относятся к старому набору тел."""
+        if self.recorder is not None:
+            raise RuntimeError("Trajectory recording needs a constant number of bodies")
+        if isinstance(self.space_objects, BodyStore):
+            self.space_objects.remove(indices)
+            self.pos, self.vel, self.m = solar_engine.pack_space_objects(self.space_objects)
+        else:
+            keep = np.ones(len(self.m), dtype=bool)
+            keep[indices] = False
+            self.space_objects = [obj for obj, kept in zip(self.space_objects, keep.tolist()) if kept]
+            self.pos, self.vel, self.m = self.pos[keep], self.vel[keep], self.m[keep]
+        self.acc = None
+        self.integrator_state.clear()
+
+    def sync_objects(self):
+        """Записывает состояние из массивов в объекты **space_objects**."""
+        solar_engine.unpack_space_objects(self.space_objects, self.pos, self.vel, self.acc, self.m)
+
+    def save(self, output_filename):
+        """Сохраняет текущее состояние в файл в формате solar_system.txt."""
+        if isinstance(self.space_objects, BodyStore):
+            self.sync_objects()
+            write_space_objects_arrays(output_filename, self.space_objects.to_records())
+            return
+        bodies = arrays_from_objects(self.space_objects)
+        bodies["x"], bodies["y"] = self.pos[:, 0], self.pos[:, 1]
+        bodies["Vx"], bodies["Vy"] = self.vel[:, 0], self.vel[:, 1]
+        write_space_objects_arrays(output_filename, bodies)
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
@@ -1,45 +1,118 @@
 # coding: utf-8
 # license: GPLv3
 
+import os
+import time
 import tkinter as tk
 from tkinter import filedialog
-from solar_objects import Star, Planet
+import solar_profiling
+from solar_checkpoint import CheckpointWriter, apply_physics, read_checkpoint
+from solar_diagnostics import DiagnosticsMonitor
+from solar_input import read_space_objects_store, write_space_objects_data_to_file
+from solar_objects import BodyStore
+import solar_engine
+import solar_integrators
+import solar_model
+from solar_engine import pack_space_objects, unpack_space_objects
+from solar_vis import CanvasRenderer, OrbitTrails
+from solar_server import SimulationClient
+from solar_simulation import Simulation
+from solar_timeline import Timeline
+from solar_worker import SimulationWorker
 
 
 class SolarSystem:
     def __init__(self):
-        self.space_objects = []
+        self.space_objects = BodyStore()
         self.physical_time = 0
         self.perform_execution = False
         self.time_step = 1.0
         self.scale_factor = 1.0
+        self.engine = solar_model.default_engine
+        self.integrator = solar_model.default_integrator
+        self.integrator_state = {}
+        self.diagnostics = None
+        self.fps = 30
+        self.diagnostics_every = 10
+        self.timeline = None
+        self.timeline_every = 10
+        self.trail_length = 500
+        self.trail_decimation = 2
+        self.trail_step = None
+        self.replay_time = None
+        self.worker = None
+        self.step_count = 0
+        self.last_frame = None
+        # периодические контрольные точки, если задан файл (solar_checkpoint)
+        self.checkpoint_filename = os.environ.get("SOLAR_CHECKPOINT")
+        self.checkpoint_every = 1000
+        if os.environ.get("SOLAR_PROFILE_LOG"):
+            solar_profiling.start_log(os.environ["SOLAR_PROFILE_LOG"])
+
+        # адрес сервера расчёта (solar_server): интерфейс показывает его расчёт вместо своего
+        self.server_address = os.environ.get("SOLAR_SERVER")
+        self.server_generation = None
 
         self.root = tk.Tk()
         self.init_gui()
+        if self.server_address:
+            self.connect_to_server()
 
     def init_gui(self):
         #Инициализация графического интерфейса
         self.space = tk.Canvas(self.root, width=1200, height=900, bg="black")
         self.space.pack(side=tk.TOP)
+        self.renderer = CanvasRenderer(self.space, 1200, 900,
+                                       trails=OrbitTrails(self.trail_length, self.trail_decimation))
+        self.renderer.bind(redraw=self.update_positions)
 
         frame = tk.Frame(self.root)
         frame.pack(side=tk.BOTTOM)
 
+        # шкала времени: просмотр прошлых моментов по опорным кадрам (solar_timeline)
+        timeline_frame = tk.Frame(self.root)
+        timeline_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.timeline_var = tk.DoubleVar(value=1000)
+        tk.Scale(timeline_frame, variable=self.timeline_var, from_=0, to=1000, showvalue=False,
+                 orient=tk.HORIZONTAL, command=self.scrub).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.replay_button = tk.Button(timeline_frame, text="Replay", command=self.start_replay, width=6)
+        self.replay_button.pack(side=tk.LEFT)
+
         self.start_button = tk.Button(frame, text="Start", command=self.start_execution, width=6)
         self.start_button.pack(side=tk.LEFT)
 
         self.time_step_var = tk.DoubleVar(value=self.time_step)
         tk.Entry(frame, textvariable=self.time_step_var).pack(side=tk.LEFT)
 
-        self.time_speed = tk.DoubleVar()
-        tk.Scale(frame, variable=self.time_speed, orient=tk.HORIZONTAL).pack(side=tk.LEFT)
+        # скорость — десятичный логарифм модельных секунд за секунду реального времени
+        self.time_speed = tk.DoubleVar(value=5)
+        tk.Scale(frame, variable=self.time_speed, from_=0, to=8, resolution=0.1,
+                 label="log10 sim s / s", orient=tk.HORIZONTAL).pack(side=tk.LEFT)
+
+        # движок сил и интегратор (solar_engine, solar_integrators)
+        self.engine_var = tk.StringVar(value=self.engine)
+        tk.OptionMenu(frame, self.engine_var, *solar_engine.engines, *solar_engine.engine_modules,
+                      command=self.choose_method).pack(side=tk.LEFT)
+        self.integrator_var = tk.StringVar(value=self.integrator)
+        tk.OptionMenu(frame, self.integrator_var, *solar_integrators.integrators,
+                      command=self.choose_method).pack(side=tk.LEFT)
 
         tk.Button(frame, text="Open file...", command=self.open_file_dialog).pack(side=tk.LEFT)
         tk.Button(frame, text="Save to file...", command=self.save_file_dialog).pack(side=tk.LEFT)
+        tk.Button(frame, text="Resume...", command=self.resume_dialog).pack(side=tk.LEFT)
 
         self.displayed_time = tk.StringVar(value="0.0 seconds gone")
         tk.Label(frame, textvariable=self.displayed_time, width=30).pack(side=tk.RIGHT)
 
+        # ошибка энергии и смещение центра масс (solar_diagnostics)
+        self.diagnostics_text = tk.StringVar(value="")
+        tk.Label(frame, textvariable=self.diagnostics_text, width=36).pack(side=tk.RIGHT)
+
+        # строка замеров (solar_profiling), видна только при включённых замерах
+        self.profile_readout = tk.StringVar(value="")
+        if solar_profiling.enabled:
+            tk.Label(frame, textvariable=self.profile_readout, width=60, anchor=tk.W).pack(side=tk.RIGHT)
+
     def save_file_dialog(self):
         #Сохранение системы в файл
         filename = filedialog.asksaveasfilename(
@@ -51,91 +124,188 @@ class SolarSystem:
 
     def save_to_file(self, filename):
         #Сохранение объектов системы в файл
-        with open(filename, 'w') as f:
-            for obj in self.space_objects:
-                f.write(
-                    f"{obj.type.capitalize()} {obj.R} {obj.color} {obj.m} "
-                    f"{obj.x} {obj.y} {obj.Vx} {obj.Vy}\n"
-                )
+        if self.server_address:
+            self.worker.save(filename)
+            print(f"System saved to {filename}")
+            return
+        self.apply_latest_state()
+        write_space_objects_data_to_file(filename, self.space_objects, capitalize=True)
         print(f"System saved to {filename}")
 
-        frame = tk.Frame(self.root)
-        frame.pack(side=tk.BOTTOM)
-
-        # Кнопки управления
-        self.start_button = tk.Button(frame, text="Start", command=self.start_execution, width=6)
-        self.start_button.pack(side=tk.LEFT)
-
-        self.time_step_var = tk.DoubleVar(value=self.time_step)
-        tk.Entry(frame, textvariable=self.time_step_var).pack(side=tk.LEFT)
-
-        self.time_speed = tk.DoubleVar()
-        tk.Scale(frame, variable=self.time_speed, orient=tk.HORIZONTAL).pack(side=tk.LEFT)
-
-        tk.Button(frame, text="Open file...", command=self.open_file_dialog).pack(side=tk.LEFT)
-        tk.Button(frame, text="Save to file...", command=self.save_file_dialog).pack(side=tk.LEFT)
-
-        self.displayed_time = tk.StringVar(value="0.0 seconds gone")
-        tk.Label(frame, textvariable=self.displayed_time, width=30).pack(side=tk.RIGHT)
-
     def run(self):
         #Запуск главного цикла
         self.root.mainloop()
 
     def execution(self):
-        #Основной цикл выполнения
-        self.recalculate_positions()
-        self.update_positions()
-        self.physical_time += self.time_step_var.get()
+        #Кадр: снимок параметров для потока расчёта и отрисовка последнего состояния
+        self.worker.set_parameters(self.time_step_var.get(), 10 ** self.time_speed.get(),
+                                   self.perform_execution)
+        if self.server_address and self.worker.generation != self.server_generation:
+            self.follow_server()
+        self.physical_time, step_count, pos, vel = self.worker.latest
+        # снимок уже другой системы сервера (сменилась между чтениями): она покажется в следующем кадре
+        if len(pos) == len(self.space_objects):
+            if step_count != self.trail_step:
+                # в след идут только новые опубликованные состояния
+                self.trail_step = step_count
+                self.renderer.trails.push(pos)
+            with solar_profiling.phase("draw"):
+                self.renderer.update(pos)
         self.displayed_time.set(f"{self.physical_time:.1f} seconds gone")
+        self.timeline_var.set(1000)
+        latest = self.diagnostics.latest if self.diagnostics is not None else None
+        if latest is not None:
+            self.diagnostics_text.set(f"dE/E {latest['energy_error']:.2e}  CoM drift {latest['com_drift']:.2e} m")
+        if solar_profiling.enabled:
+            self.measure_frame()
 
         if self.perform_execution:
-            self.root.after(101 - int(self.time_speed.get()), self.execution)
-
-    def recalculate_positions(self):
-        #Пересчет позиций объектов
-        for body in self.space_objects:
-            self.calculate_force(body)
-        for body in self.space_objects:
-            self.move_space_object(body)
-
-    def calculate_force(self, body):
-        #Расчет сил для одного тела
-        body.Fx = body.Fy = 0
-        for obj in self.space_objects:
-            if body == obj:
-                continue
-
-            dx = obj.x - body.x
-            dy = obj.y - body.y
-            r = (dx ** 2 + dy ** 2) ** 0.5
-            f = 6.67408E-11 * body.m * obj.m / (r ** 2)
-
-            body.Fx += f * dx / r
-            body.Fy += f * dy / r
-
-    def move_space_object(self, body):
-        """Перемещение тела"""
-        dt = self.time_step_var.get()
-        ax = body.Fx / body.m
-        ay = body.Fy / body.m
-
-        body.Vx += ax * dt
-        body.Vy += ay * dt
-        body.x += body.Vx * dt
-        body.y += body.Vy * dt
+            self.root.after(int(1000 / self.fps), self.execution)
+
+    def timeline_moment(self):
+        #Момент времени, выбранный на шкале, или None, если кадров ещё нет
+        time_range = self.timeline.time_range() if self.timeline is not None else None
+        if time_range is None:
+            return None
+        start, end = time_range
+        return start + (end - start) * self.timeline_var.get() / 1000
+
+    def show_moment(self, moment):
+        #Отрисовка состояния в момент moment по опорным кадрам
+        pos, vel = self.timeline.state_at(moment)
+        self.renderer.update(pos)
+        self.displayed_time.set(f"{moment:.1f} seconds (replay)")
+
+    def scrub(self, value):
+        #Перемещение по шкале времени (только на паузе)
+        if self.perform_execution or self.replay_time is not None:
+            return
+        moment = self.timeline_moment()
+        if moment is not None:
+            self.show_moment(moment)
+
+    def start_replay(self):
+        #Повтор записанного отрезка с выбранного на шкале момента
+        if self.perform_execution:
+            return
+        moment = self.timeline_moment()
+        if moment is None:
+            return
+        self.replay_time = moment
+        self.replay_button.config(text="Stop", command=self.stop_replay)
+        self.replay()
+
+    def stop_replay(self):
+        #Остановка повтора
+        self.replay_time = None
+        self.replay_button.config(text="Replay", command=self.start_replay)
+
+    def replay(self):
+        #Кадр повтора: модельное время идёт с той же скоростью, что и при расчёте
+        if self.replay_time is None:
+            return
+        start, end = self.timeline.time_range()
+        self.replay_time = min(self.replay_time + 10 ** self.time_speed.get() / self.fps, end)
+        self.show_moment(self.replay_time)
+        self.timeline_var.set(1000 * (self.replay_time - start) / ((end - start) or 1))
+        if self.replay_time < end:
+            self.root.after(int(1000 / self.fps), self.replay)
+        else:
+            self.stop_replay()
+
+    def measure_frame(self):
+        #Учёт кадра: опоздание таймера after, пропущенные кадры, строка замеров и журнал
+        now = time.perf_counter()
+        frame_time = 1 / self.fps
+        if self.last_frame is not None:
+            delay = max(now - self.last_frame - frame_time, 0.0)
+            solar_profiling.record("schedule_delay", delay)
+            solar_profiling.count("dropped_frames", int(delay / frame_time))
+        self.last_frame = now
+        solar_profiling.count("frames")
+        if solar_profiling.counters["frames"] % self.fps == 0:
+            self.profile_readout.set(solar_profiling.readout())
+        solar_profiling.tick()
+
+    def apply_latest_state(self):
+        #Перенос последнего опубликованного потоком состояния в объекты
+        if self.worker is None:
+            return
+        self.physical_time, self.step_count, pos, vel = self.worker.latest
+        unpack_space_objects(self.space_objects, pos, vel)
+
+    def start_worker(self):
+        #Создание потока расчёта по текущему состоянию объектов
+        # поток считает свою копию хранилища; интерфейс забирает из неё снимки
+        simulation = Simulation(self.space_objects.copy(), self.time_step_var.get(), self.engine, self.integrator)
+        simulation.physical_time = self.physical_time
+        simulation.step_count = self.step_count
+        simulation.integrator_state = self.integrator_state
+        if self.checkpoint_filename:
+            simulation.checkpointer = CheckpointWriter(self.checkpoint_filename, self.checkpoint_every)
+        # один ряд на систему: ошибка энергии отсчитывается от её начального состояния, а не от паузы
+        if self.diagnostics is None:
+            self.diagnostics = DiagnosticsMonitor(self.diagnostics_every)
+            self.diagnostics.attach(simulation)
+        simulation.diagnostics = self.diagnostics
+        if self.timeline is None:
+            self.timeline = Timeline(self.timeline_every)
+            self.timeline.attach(simulation)
+        simulation.timeline = self.timeline
+        self.worker = SimulationWorker(simulation, 1 / self.fps)
+        self.worker.start()
+
+    def connect_to_server(self):
+        #Подключение к серверу расчёта: клиент заменяет поток расчёта, система берётся с сервера
+        self.worker = SimulationClient(self.server_address, self.fps)
+        self.follow_server()
+
+    def follow_server(self):
+        #Тела, изображения и следы для системы, которую сейчас считает сервер (её мог загрузить другой клиент)
+        self.server_generation = self.worker.generation
+        self.space_objects = self.worker.store()
+        self.physical_time, self.step_count = self.worker.latest[:2]
+        self.trail_step = None
+        self.show_new_system()
+
+    def choose_method(self, value=None):
+        #Смена движка или интегратора: поток расчёта перезапускается с текущего состояния
+        engine, integrator = self.engine_var.get(), self.integrator_var.get()
+        if (engine, integrator) == (self.engine, self.integrator):
+            return
+        if self.server_address:
+            print("Choosing the engine is not available when connected to a server")
+            self.engine_var.set(self.engine)
+            self.integrator_var.set(self.integrator)
+            return
+        self.stop_worker()
+        if integrator != self.integrator:
+            self.integrator_state = {}
+        self.engine, self.integrator = engine, integrator
+        if self.perform_execution:
+            self.start_worker()
+
+    def stop_worker(self):
+        #Остановка потока расчёта (при работе с сервером — только пауза)
+        if self.server_address:
+            self.worker.set_parameters(self.time_step_var.get(), 0.0, False)
+            self.apply_latest_state()
+            return
+        if self.worker is not None:
+            self.worker.stop()
+            self.apply_latest_state()
+            if self.worker.simulation.checkpointer is not None:
+                self.worker.simulation.checkpointer.close()
+            self.worker = None
 
     def update_positions(self):
-        #Обновление позиций на экране"""
-        for body in self.space_objects:
-            x = self.scale_x(body.x)
-            y = self.scale_y(body.y)
-            r = body.R
-
-            if x + r < 0 or x - r > 1200 or y + r < 0 or y - r > 900:
-                self.space.coords(body.image, 1200 + r, 900 + r, 1200 + 2 * r, 900 + 2 * r)
-            else:
-                self.space.coords(body.image, x - r, y - r, x + r, y + r)
+        #Обновление позиций на экране одним пакетом
+        if self.worker is not None:
+            pos = self.worker.latest[2]
+        else:
+            pos = pack_space_objects(self.space_objects)[0]
+        if len(pos) and len(pos) == len(self.space_objects):
+            self.renderer.update(pos)
 
     def scale_x(self, x):
         #Масштабирование координаты X
@@ -147,20 +317,25 @@ class SolarSystem:
 
     def start_execution(self):
         #Запуск симуляции
+        self.stop_replay()
         self.perform_execution = True
+        self.last_frame = None
         self.start_button.config(text="Pause", command=self.stop_execution)
+        if self.worker is None:
+            self.start_worker()
         self.execution()
 
     def stop_execution(self):
         #Остановка симуляции
         self.perform_execution = False
         self.start_button.config(text="Start", command=self.start_execution)
+        if self.worker is not None:
+            self.worker.set_parameters(self.time_step_var.get(), 0.0, False)
 
     def open_file_dialog(self):
         #Загрузка системы из файла
         self.perform_execution = False
-        for obj in self.space_objects:
-            self.space.delete(obj.image)
+        self.stop_worker()
 
         filename = filedialog.askopenfilename(filetypes=(("Text file", ".txt"),))
         if filename:
@@ -168,39 +343,58 @@ class SolarSystem:
 
     def load_from_file(self, filename):
         #Загрузка данных из файла
-        self.space_objects = []
-        with open(filename) as f:
-            for line in f:
-                if not line.strip() or line[0] == '#':
-                    continue
-
-                parts = line.split()
-                if parts[0].lower() == "star":
-                    obj = Star()
-                elif parts[0].lower() == "planet":
-                    obj = Planet()
-                else:
-                    continue
-
-                obj.R = float(parts[1])
-                obj.color = parts[2]
-                obj.m = float(parts[3])
-                obj.x = float(parts[4])
-                obj.y = float(parts[5])
-                obj.Vx = float(parts[6])
-                obj.Vy = float(parts[7])
-
-                self.space_objects.append(obj)
-                self.create_object_image(obj)
+        self.stop_replay()
+        self.stop_worker()
+        self.physical_time = 0
+        self.step_count = 0
+        self.integrator_state = {}
+        self.diagnostics = None
+        self.timeline = None
+        if self.server_address:
+            self.worker.load(filename)
+            self.follow_server()
+        else:
+            self.space_objects = read_space_objects_store(filename)
+            self.show_new_system()
+
+    def resume_dialog(self):
+        #Продолжение расчёта из контрольной точки
+        self.perform_execution = False
+        self.stop_worker()
 
-        self.calculate_scale()
+        filename = filedialog.askopenfilename(filetypes=(("Checkpoint", ".npz"),))
+        if filename:
+            self.resume_from_checkpoint(filename)
+
+    def resume_from_checkpoint(self, filename):
+        #Загрузка полного состояния расчёта из контрольной точки
+        if self.server_address:
+            print("Resuming from a checkpoint is not available when connected to a server")
+            return
+        self.stop_replay()
+        self.stop_worker()
+        data = read_checkpoint(filename)
+        self.space_objects = data["store"]
+        self.physical_time = data["physical_time"]
+        self.step_count = data["step_count"]
+        self.integrator_state = data["integrator_state"]
+        self.diagnostics = None
+        self.timeline = None
+        self.engine, self.integrator = data["engine"], data["integrator"]
+        self.engine_var.set(self.engine)
+        self.integrator_var.set(self.integrator)
+        apply_physics(data["physics"])
+        self.time_step_var.set(data["dt"])
+        self.displayed_time.set(f"{self.physical_time:.1f} seconds gone")
+        self.show_new_system()
 
-    def create_object_image(self, obj):
-        #Создание графического представления объекта
-        x = self.scale_x(obj.x)
-        y = self.scale_y(obj.y)
-        r = obj.R
-        obj.image = self.space.create_oval(x - r, y - r, x + r, y + r, fill=obj.color)
+    def show_new_system(self):
+        #Масштаб и изображения для только что загруженной системы
+        self.calculate_scale()
+        self.renderer.scale_factor = self.scale_factor
+        self.renderer.reset_view()
+        self.renderer.create_images(self.space_objects)  # старые изображения удаляются
+        self.update_positions()
 
     def calculate_scale(self):
         #Вычисление масштаба
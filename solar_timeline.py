@@ -0,0 +1,181 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Шкала времени расчёта: опорные кадры в памяти и плотный вывод между ними.
+
+Через каждые every шагов Timeline запоминает опорный кадр — время, координаты
+и скорости всех тел. Между соседними кадрами состояние восстанавливается
+кубическим интерполянтом Эрмита по координатам и скоростям на концах
+отрезка, так что положение любого тела в любой момент записанного отрезка
+получается без повторного расчёта сил. Ошибка интерполяции — O(h⁴) по
+промежутку между кадрами h.
+
+Кадры хранятся в памяти ограниченного объёма. Когда он переполняется, шкала
+прореживается равномерно: удаляется каждый второй кадр, и дальше кадры
+запоминаются вдвое реже (атрибут **stride**). Так промежуток между соседними
+кадрами остаётся одинаковым на всём записанном отрезке и равен его длине,
+делённой на число помещающихся кадров, а не растёт на старых участках до
+многих оборотов, где интерполяция уже не описывает орбиту. Первый и
+последний кадры не удаляются.
+
+Кадры добавляются из потока расчёта, а читаются из потока интерфейса,
+поэтому доступ к кэшу защищён блокировкой.
+"""
+
+import bisect
+import threading
+
+default_max_bytes = 256 * 2 ** 20
+"""Объём кэша опорных кадров по умолчанию, байт."""
+
+
+def hermite(t0, pos0, vel0, t1, pos1, vel1, t):
+    """Возвращает координаты и скорости в момент **t** между кадрами (t0, pos0, vel0)
+    и (t1, pos1, vel1) по кубическому интерполянту Эрмита."""
+    h = t1 - t0
+    if h == 0:
+        return pos0.copy(), vel0.copy()
+    s = (t - t0) / h
+    s2, s3 = s * s, s * s * s
+    h00, h10, h01, h11 = 2 * s3 - 3 * s2 + 1, s3 - 2 * s2 + s, 3 * s2 - 2 * s3, s3 - s2
+    pos = h00 * pos0 + (h10 * h) * vel0 + h01 * pos1 + (h11 * h) * vel1
+    # производная интерполянта по времени
+    d00, d10, d01, d11 = 6 * (s2 - s), 3 * s2 - 4 * s + 1, 6 * (s - s2), 3 * s2 - 2 * s
+    vel = (d00 / h) * pos0 + d10 * vel0 + (d01 / h) * pos1 + d11 * vel1
+    return pos, vel
+
+
+class Timeline:
+    """Опорные кадры расчёта solar_simulation.Simulation.
+
+    Параметры конструктора:
+
+    **every** — запоминать кадр после каждого every-го шага.
+    **max_bytes** — наибольший объём кадров в памяти, байт.
+
+    Атрибуты **times** (отсортированный список моментов кадров), **stride**
+    (сохраняется каждый stride-й предложенный кадр) и **evicted** (число кадров,
+    удалённых при прореживании) читаются под блокировкой **lock**.
+    """
+
+    def __init__(self, every=1, max_bytes=default_max_bytes):
+        self.every = every
+        self.max_bytes = max_bytes
+        self.times = []
+        self.stride = 1
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self._frames = {}
+        self._indices = []
+        self._count = 0
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self.times)
+
+    def attach(self, simulation):
+        """Запоминает начальный кадр расчёта."""
+        self.add(simulation.physical_time, simulation.pos, simulation.vel)
+
+    def update(self, simulation):
+        """Вызывается после каждого шага."""
+        if simulation.step_count % self.every == 0:
+            self.add(simulation.physical_time, simulation.pos, simulation.vel)
+
+    def add(self, physical_time, pos, vel):
+        """Добавляет кадр (копии **pos** и **vel**) в момент **physical_time**.
+        Кадры с моментами не позже этого (после возврата назад по времени) отбрасываются."""
+        frame = (pos.copy(), vel.copy())
+        size = frame[0].nbytes + frame[1].nbytes
+        with self.lock:
+            while self.times and self.times[-1] >= physical_time:
+                self._count = self._indices[-1]
+                self._pop()
+            # последний кадр хранится всегда, а предыдущий — только если он на сетке с шагом stride
+            if len(self.times) > 1 and self._indices[-1] % self.stride:
+                self._pop()
+            self.times.append(physical_time)
+            self._indices.append(self._count)
+            self._count += 1
+            self._frames[physical_time] = frame
+            self._bytes += size
+            while self._bytes > self.max_bytes and len(self.times) > 2:
+                self._thin()
+
+    def _discard(self, key):
+        pos, vel = self._frames.pop(key)
+        self._bytes -= pos.nbytes + vel.nbytes
+
+    def _pop(self):
+        """Удаляет последний кадр."""
+        self._indices.pop()
+        self._discard(self.times.pop())
+
+    def _thin(self):
+        """Удаляет каждый второй кадр, вдвое увеличивая промежуток между кадрами
+        на всём отрезке (первый и последний кадры остаются)."""
+        self.stride *= 2
+        times, indices = [], []
+        last = len(self.times) - 1
+        for k, (key, index) in enumerate(zip(self.times, self._indices)):
+            if index % self.stride == 0 or k == 0 or k == last:
+                times.append(key)
+                indices.append(index)
+            else:
+                self._discard(key)
+                self.evicted += 1
+        self.times[:] = times
+        self._indices[:] = indices
+
+    def clear(self):
+        """Удаляет все кадры."""
+        with self.lock:
+            self.times.clear()
+            self._frames.clear()
+            self._indices.clear()
+            self._count = 0
+            self.stride = 1
+            self._bytes = 0
+
+    def time_range(self):
+        """Возвращает (начало, конец) записанного отрезка времени или None, если кадров нет."""
+        with self.lock:
+            if not self.times:
+                return None
+            return self.times[0], self.times[-1]
+
+    def _bracket(self, t):
+        """Возвращает соседние кадры вокруг момента **t** (под блокировкой)."""
+        if not self.times or not self.times[0] <= t <= self.times[-1]:
+            raise ValueError(f"Time {t} is outside the recorded range")
+        i = min(bisect.bisect_right(self.times, t), len(self.times) - 1)
+        t0, t1 = self.times[max(i - 1, 0)], self.times[i]
+        return t0, self._frames[t0], t1, self._frames[t1]
+
+    def state_at(self, t, bodies=None):
+        """Возвращает координаты и скорости тел в момент **t**.
+
+        Параметры:
+
+        **t** — момент времени внутри записанного отрезка (иначе ValueError).
+        **bodies** — индексы или срез тел (None — все тела).
+        """
+        if bodies is None:
+            bodies = slice(None)
+        with self.lock:
+            t0, (pos0, vel0), t1, (pos1, vel1) = self._bracket(t)
+        if pos0.shape != pos1.shape:
+            # между кадрами менялся набор тел (слияние): интерполировать нечего
+            frame = (pos0, vel0) if t < t1 else (pos1, vel1)
+            return frame[0][bodies].copy(), frame[1][bodies].copy()
+        return hermite(t0, pos0[bodies], vel0[bodies], t1, pos1[bodies], vel1[bodies], t)
+
+    def position(self, body, t):
+        """Возвращает координаты (x, y) тела с индексом **body** в момент **t**."""
+        pos, vel = self.state_at(t, [body])
+        return float(pos[0, 0]), float(pos[0, 1])
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
@@ -7,6 +7,8 @@
 Функции, создающие гaрафические объекты и перемещающие их на экране, принимают физические координаты
 """
 
+import numpy as np
+
 header_font = "Arial-16"
 """Шрифт в заголовке"""
 
@@ -58,6 +60,22 @@ def scale_y(y):
     return window_height//2 - int(y*scale_factor)
 
 
+def screen_positions(pos, scale, width=window_width, height=window_height, pan_x=0, pan_y=0):
+    """Возвращает экранные координаты (целые) для массива физических координат
+    формы (N, 2) — векторный вариант scale_x и scale_y.
+
+    Параметры:
+
+    **pos** — массив физических координат.
+    **scale** — число пикселей на метр.
+    **width**, **height** — размеры области отрисовки.
+    **pan_x**, **pan_y** — сдвиг вида в пикселях.
+    """
+    x = (pos[:, 0] * scale).astype(np.int64) + width // 2 + pan_x
+    y = height // 2 - (pos[:, 1] * scale).astype(np.int64) + pan_y
+    return np.stack([x, y], axis=1)
+
+
 def create_star_image(space, star):
     """Создаёт отображаемый объект звезды.
 
@@ -112,8 +130,261 @@ def update_object_position(space, body):
     if x + r < 0 or x - r > window_width or y + r < 0 or y - r > window_height:
         space.coords(body.image, window_width + r, window_height + r,
                      window_width + 2*r, window_height + 2*r)  # положить за пределы окна
+        return
     space.coords(body.image, x - r, y - r, x + r, y + r)
 
 
+class OrbitTrails:
+    """Следы орбит тел.
+
+    Следы хранятся в физических координатах в одном массиве формы
+    (число тел, **length**, 2): строка массива — кольцевой буфер одного тела,
+    общий для всех тел указатель записи сдвигается при каждой записи. Каждый
+    след рисуется одной ломаной на холсте, координаты которой заменяются
+    целиком одним вызовом coords, так что стоимость кадра ограничена
+    **length** точками на тело при любой длине расчёта.
+
+    Параметры конструктора:
+
+    **length** — число точек следа.
+    **decimation** — записывать в след только каждое decimation-е положение.
+    """
+
+    def __init__(self, length=500, decimation=1):
+        self.length = length
+        self.decimation = decimation
+        self.space = None
+        self.items = []
+        self.bodies = np.empty(0, dtype=np.intp)
+        self.reset()
+
+    def reset(self):
+        """Очищает буферы, не удаляя элементов холста."""
+        self.buffer = np.empty((len(self.bodies), self.length, 2))
+        self.head = 0
+        self.filled = 0
+        self.pushes = 0
+        self._drawn = None
+
+    def create(self, space, space_objects, bodies):
+        """Создаёт на холсте **space** ломаные для тел с индексами **bodies**
+        (цвет — цвет тела) и очищает буферы."""
+        self.clear()
+        self.space = space
+        self.bodies = np.asarray(bodies, dtype=np.intp)
+        self.items = [space.create_line(0, 0, 0, 0, fill=space_objects[i].color, state="hidden")
+                      for i in self.bodies.tolist()]
+        self.reset()
+
+    def clear(self):
+        """Удаляет ломаные с холста."""
+        for item in self.items:
+            self.space.delete(item)
+        self.items = []
+        self.bodies = np.empty(0, dtype=np.intp)
+
+    def push(self, pos):
+        """Добавляет в следы положения тел из массива физических координат формы (N, 2)."""
+        self.pushes += 1
+        if (self.pushes - 1) % self.decimation or not len(self.bodies):
+            return
+        self.buffer[:, self.head] = pos[self.bodies]
+        self.head = (self.head + 1) % self.length
+        self.filled = min(self.filled + 1, self.length)
+
+    def points(self):
+        """Возвращает массив формы (число следов, filled, 2) точек следов от старых к новым."""
+        order = (self.head - self.filled + np.arange(self.filled)) % self.length
+        return self.buffer[:, order]
+
+    def draw(self, renderer, screen):
+        """Обновляет ломаные по текущему виду **renderer** (CanvasRenderer);
+        **screen** — текущие экранные координаты всех тел, которыми заканчивается след."""
+        view = (self.pushes, renderer.scale_factor, renderer.zoom, renderer.pan_x, renderer.pan_y,
+                screen[self.bodies].tobytes())
+        if not self.items or view == self._drawn:
+            return
+        self._drawn = view
+        if self.filled < 2:
+            for item in self.items:
+                self.space.itemconfigure(item, state="hidden")
+            return
+        points = self.points()
+        trail = renderer.screen_coordinates(points.reshape(-1, 2)).reshape(len(self.bodies), self.filled, 2)
+        trail = np.concatenate([trail, screen[self.bodies, None]], axis=1).reshape(len(self.bodies), -1)
+        for item, coords in zip(self.items, trail.tolist()):
+            self.space.coords(item, coords)
+            self.space.itemconfigure(item, state="normal")
+
+
+class CanvasRenderer:
+    """Пакетная отрисовка тел на холсте.
+
+    Экранные координаты всех тел вычисляются одним векторизованным проходом.
+    Холст трогается только для тел, чьё положение в пикселях изменилось;
+    тела за пределами окна скрываются. Тела с радиусом меньше **point_radius**
+    не получают собственных овалов: они сливаются в облако точек, где на каждый
+    занятый пиксель (и цвет) приходится один элемент холста из общего пула.
+    Масштаб можно менять колесом мыши, а вид сдвигать перетаскиванием,
+    не пересчитывая базовый масштаб **scale_factor**.
+
+    Параметры конструктора:
+
+    **space** — холст для рисования.
+    **width**, **height** — размеры области отрисовки.
+    **point_radius** — радиус, начиная с которого тело рисуется отдельным овалом.
+    **trails** — следы орбит (OrbitTrails) или None. Следы получают тела,
+    рисуемые овалами; положения в следы добавляет вызывающий (trails.push),
+    так что перерисовка при сдвиге вида их не дублирует.
+    """
+
+    def __init__(self, space, width=window_width, height=window_height, point_radius=1, trails=None):
+        self.space = space
+        self.trails = trails
+        self.width = width
+        self.height = height
+        self.point_radius = point_radius
+        self.scale_factor = 1.0
+        self.zoom = 1.0
+        self.pan_x = 0
+        self.pan_y = 0
+        self._drag = None
+        self.items = []
+        self.cloud_items = []
+        self.clear()
+
+    def clear(self):
+        """Удаляет все элементы холста, созданные отрисовщиком."""
+        for item in self.items:
+            if item is not None:
+                self.space.delete(item)
+        for item in self.cloud_items:
+            self.space.delete(item)
+        if self.trails is not None and self.trails.space is not None:
+            self.trails.clear()
+        self.items = []
+        self.cloud_items = []
+        self.cloud_keys = np.empty(0, dtype=np.int64)
+        self.radius = np.empty(0)
+        self.is_point = np.empty(0, dtype=bool)
+        self.color_index = np.empty(0, dtype=np.int64)
+        self.colors = []
+        self.last = np.empty((0, 2), dtype=np.int64)
+        self.visible = np.empty(0, dtype=bool)
+
+    def create_images(self, space_objects):
+        """Создаёт элементы холста для всех объектов и запоминает их в obj.image.
+        Точечным телам (из облака) obj.image не назначается."""
+        self.clear()
+        colors = {}
+        self.radius = np.array([obj.R for obj in space_objects], dtype=float)
+        self.is_point = self.radius < self.point_radius
+        self.color_index = np.array([colors.setdefault(obj.color, len(colors)) for obj in space_objects],
+                                    dtype=np.int64)
+        self.colors = list(colors)
+        if self.trails is not None:
+            # ломаные создаются первыми, чтобы лежать под телами
+            self.trails.create(self.space, space_objects, np.flatnonzero(~self.is_point))
+        for obj, point in zip(space_objects, self.is_point.tolist()):
+            obj.image = None if point else self.space.create_oval(0, 0, 0, 0, fill=obj.color, state="hidden")
+            self.items.append(obj.image)
+        self.last = np.full((len(space_objects), 2), np.iinfo(np.int64).min, dtype=np.int64)
+        self.visible = np.zeros(len(space_objects), dtype=bool)
+
+    def screen_coordinates(self, pos):
+        """Возвращает экранные координаты (целые) для массива физических координат формы (N, 2)."""
+        return screen_positions(pos, self.scale_factor * self.zoom, self.width, self.height, self.pan_x, self.pan_y)
+
+    def update(self, pos):
+        """Перерисовывает тела по массиву физических координат формы (N, 2)."""
+        screen = self.screen_coordinates(pos)
+        r = self.radius
+        on_screen = ((screen[:, 0] + r >= 0) & (screen[:, 0] - r <= self.width) &
+                     (screen[:, 1] + r >= 0) & (screen[:, 1] - r <= self.height))
+
+        body = ~self.is_point
+        moved = body & on_screen & (screen != self.last).any(axis=1)
+        for i, x, y, radius in zip(np.flatnonzero(moved).tolist(), screen[moved, 0].tolist(),
+                                   screen[moved, 1].tolist(), r[moved].tolist()):
+            self.space.coords(self.items[i], x - radius, y - radius, x + radius, y + radius)
+        for i in np.flatnonzero(body & on_screen & ~self.visible).tolist():
+            self.space.itemconfigure(self.items[i], state="normal")
+        for i in np.flatnonzero(body & ~on_screen & self.visible).tolist():
+            self.space.itemconfigure(self.items[i], state="hidden")
+        self.last[moved] = screen[moved]
+        self.visible = body & on_screen
+
+        self._update_cloud(screen[self.is_point & on_screen], self.color_index[self.is_point & on_screen])
+        if self.trails is not None:
+            self.trails.draw(self, screen)
+
+    def _update_cloud(self, screen, color_index):
+        """Рисует облако точек: один элемент холста на занятый пиксель каждого цвета."""
+        keys = np.unique((color_index * (self.height + 1) + screen[:, 1]) * (self.width + 1) + screen[:, 0])
+        while len(self.cloud_items) < len(keys):
+            self.cloud_items.append(self.space.create_rectangle(0, 0, 0, 0, width=0, state="hidden"))
+        previous = np.full(len(self.cloud_items), -1, dtype=np.int64)
+        previous[:len(self.cloud_keys)] = self.cloud_keys
+        changed = np.flatnonzero(previous[:len(keys)] != keys)
+        x = keys % (self.width + 1)
+        y = keys // (self.width + 1) % (self.height + 1)
+        color = keys // ((self.width + 1) * (self.height + 1))
+        for k in changed.tolist():
+            item = self.cloud_items[k]
+            self.space.coords(item, x[k], y[k], x[k] + 1, y[k] + 1)
+            self.space.itemconfigure(item, fill=self.colors[color[k]], state="normal")
+        for item in self.cloud_items[len(keys):len(self.cloud_keys)]:
+            self.space.itemconfigure(item, state="hidden")
+        self.cloud_keys = keys
+
+    def invalidate(self):
+        """Заставляет перерисовать все тела на следующем кадре."""
+        self.last[:] = np.iinfo(np.int64).min
+
+    def zoom_at(self, factor, x, y):
+        """Меняет масштаб в **factor** раз так, что точка экрана (x, y) остаётся на месте."""
+        self.pan_x = int(round(x - self.width // 2 - (x - self.width // 2 - self.pan_x) * factor))
+        self.pan_y = int(round(y - self.height // 2 - (y - self.height // 2 - self.pan_y) * factor))
+        self.zoom *= factor
+        self.invalidate()
+
+    def pan(self, dx, dy):
+        """Сдвигает вид на (dx, dy) пикселей."""
+        self.pan_x += dx
+        self.pan_y += dy
+        self.invalidate()
+
+    def reset_view(self):
+        """Возвращает исходный масштаб и положение вида."""
+        self.zoom = 1.0
+        self.pan_x = self.pan_y = 0
+        self.invalidate()
+
+    def bind(self, redraw=None):
+        """Привязывает масштабирование колесом мыши и сдвиг перетаскиванием к холсту.
+        **redraw** — функция без аргументов, перерисовывающая кадр (нужна, когда расчёт стоит)."""
+        def on_wheel(event):
+            up = getattr(event, "delta", 0) > 0 or event.num == 4
+            self.zoom_at(1.25 if up else 0.8, event.x, event.y)
+            if redraw:
+                redraw()
+
+        def on_press(event):
+            self._drag = (event.x, event.y)
+
+        def on_motion(event):
+            if self._drag is not None:
+                self.pan(event.x - self._drag[0], event.y - self._drag[1])
+                self._drag = (event.x, event.y)
+                if redraw:
+                    redraw()
+
+        self.space.bind("<MouseWheel>", on_wheel)
+        self.space.bind("<Button-4>", on_wheel)
+        self.space.bind("<Button-5>", on_wheel)
+        self.space.bind("<ButtonPress-1>", on_press)
+        self.space.bind("<B1-Motion>", on_motion)
+
+
 if __name__ == "__main__":
     print("This module is not for direct call!")
@@ -0,0 +1,86 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Расчёт в отдельном потоке, независимый от отрисовки.
+Графический интерфейс раз в кадр передаёт снимок параметров (шаг dt, скорость
+течения модельного времени, признак работы) и забирает последнее опубликованное
+состояние. Поток между кадрами делает столько шагов, сколько нужно, чтобы
+модельное время шло с заданной скоростью, но не дольше одного кадра подряд.
+Модуль не импортирует tkinter.
+"""
+
+import threading
+import time
+
+
+class SimulationWorker(threading.Thread):
+    """Поток, продвигающий расчёт solar_simulation.Simulation.
+
+    Атрибуты:
+
+    **simulation** — продвигаемый расчёт; из других потоков его трогать нельзя.
+    **parameters** — снимок параметров (dt, rate, running): шаг по времени,
+    модельные секунды за секунду реального времени и признак работы.
+    **latest** — последний опубликованный снимок (physical_time, step_count, pos, vel).
+    """
+
+    def __init__(self, simulation, frame_time=1 / 30):
+        super().__init__(daemon=True)
+        self.simulation = simulation
+        self.frame_time = frame_time
+        self.parameters = (simulation.dt, 0.0, False)
+        self._wake = threading.Event()
+        self._stopped = False
+        self._owed = 0.0
+        self._publish()
+
+    def _publish(self):
+        """Публикует копию текущего состояния для интерфейса."""
+        simulation = self.simulation
+        self.latest = (simulation.physical_time, simulation.step_count,
+                       simulation.pos.copy(), simulation.vel.copy())
+
+    def set_parameters(self, dt, rate, running):
+        """Передаёт потоку новый снимок параметров (вызывается раз в кадр)."""
+        self.parameters = (dt, rate, running)
+        if running:
+            self._wake.set()
+
+    def stop(self):
+        """Останавливает поток и дожидается его завершения."""
+        self._stopped = True
+        self._wake.set()
+        if self.is_alive():
+            self.join()
+
+    def run(self):
+        last = time.perf_counter()
+        while not self._stopped:
+            dt, rate, running = self.parameters
+            if not running or dt <= 0:
+                self._wake.clear()
+                self._wake.wait(self.frame_time)
+                last = time.perf_counter()
+                self._owed = 0.0
+                continue
+
+            now = time.perf_counter()
+            # долг по модельному времени не копится дольше одного кадра, если расчёт не успевает
+            self._owed = min(self._owed + rate * (now - last), max(rate * self.frame_time, dt))
+            last = now
+            self.simulation.dt = dt
+            deadline = now + self.frame_time
+            stepped = False
+            while self._owed >= dt and time.perf_counter() < deadline:
+                self.simulation.step()
+                self._owed -= dt
+                stepped = True
+            if stepped:
+                self._publish()
+            else:
+                time.sleep(min(self.frame_time, (dt - self._owed) / rate) if rate > 0 else self.frame_time)
+
+
+if __name__ == "__main__":
+    print("This module is not for direct call!")
@@ -0,0 +1,75 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Проверки контрольных точек: продолжение расчёта из контрольной точки
+совпадает с непрерывным расчётом бит в бит, в том числе когда настройки сил
+(смягчение, угол раскрытия, столкновения) отличаются от умолчаний.
+
+Запуск:
+    python -m pytest -q test_solar_checkpoint.py
+"""
+
+import os
+
+import pytest
+
+import solar_barnes_hut
+import solar_model
+from solar_checkpoint import load_checkpoint, save_checkpoint
+from solar_collisions import CollisionHandler
+from solar_simulation import Simulation
+
+
+data_directory = os.path.dirname(os.path.abspath(__file__))
+solar_system_file = os.path.join(data_directory, "solar_system.txt")
+
+
+@pytest.mark.parametrize("integrator", ["leapfrog", "yoshida4", "adaptive", "block", "wisdom_holman"])
+def test_resume_from_checkpoint_is_bit_exact(tmp_path, integrator):
+    # шаг крупный, чтобы адаптивный и блочный методы дробили его и их состояние влияло на результат
+    def simulation():
+        return Simulation.from_file(solar_system_file, 20 * 86400.0, "numpy", integrator)
+
+    continuous = simulation()
+    continuous.run(steps=40)
+
+    interrupted = simulation()
+    interrupted.run(steps=15)
+    save_checkpoint(interrupted, str(tmp_path / "run.ckpt"))
+    resumed = load_checkpoint(str(tmp_path / "run.ckpt"))
+    resumed.run(steps=25)
+
+    assert resumed.step_count == continuous.step_count
+    assert resumed.physical_time == continuous.physical_time
+    assert resumed.pos.tobytes() == continuous.pos.tobytes()
+    assert resumed.vel.tobytes() == continuous.vel.tobytes()
+
+
+def test_resume_restores_force_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(solar_model, "softening_length", 1e9)
+    monkeypatch.setattr(solar_model, "test_particle_mass", 1e20)
+    monkeypatch.setattr(solar_barnes_hut, "opening_angle", 0.7)
+
+    def simulation():
+        run = Simulation.from_file(solar_system_file, 86400.0, "numpy", "leapfrog")
+        run.collisions = CollisionHandler("bounce", 1e3)
+        return run
+
+    continuous = simulation()
+    continuous.run(steps=40)
+
+    interrupted = simulation()
+    interrupted.run(steps=15)
+    save_checkpoint(interrupted, str(tmp_path / "run.ckpt"))
+    # новый процесс начинает с настроек по умолчанию
+    solar_model.softening_length = solar_model.test_particle_mass = 0.0
+    solar_barnes_hut.opening_angle = 0.5
+    resumed = load_checkpoint(str(tmp_path / "run.ckpt"))
+    assert (solar_model.softening_length, solar_model.test_particle_mass, solar_barnes_hut.opening_angle) == \
+        (1e9, 1e20, 0.7)
+    assert (resumed.collisions.mode, resumed.collisions.radius) == ("bounce", 1e3)
+    resumed.run(steps=25)
+
+    assert resumed.pos.tobytes() == continuous.pos.tobytes()
+    assert resumed.vel.tobytes() == continuous.vel.tobytes()
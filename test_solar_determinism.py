@@ -0,0 +1,96 @@
+# coding: utf-8
+# license: GPLv3
+
+"""
+Регрессионные проверки воспроизводимости: движок "numpy" ведёт тела по тем же
+траекториям, что и цикл по объектам "python", с точностью до округления;
+движок "parallel" даёт побитово те же ускорения и траектории, что и "numpy";
+вариант ансамбля не зависит от того, с какими вариантами он попал в одну пачку.
+
+Запуск:
+    python -m pytest -q test_solar_determinism.py
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import solar_engine
+import solar_ensemble
+import solar_model
+import solar_parallel
+import solar_scenarios
+from solar_input import read_space_objects_data_from_file
+from solar_objects import BodyStore
+from solar_simulation import Simulation
+
+
+data_directory = os.path.dirname(os.path.abspath(__file__))
+solar_system_file = os.path.join(data_directory, "solar_system.txt")
+
+
+def _cluster(n, seed=1):
+    bodies = np.concatenate(list(solar_scenarios.cluster(n, seed)))
+    return BodyStore.from_records(bodies)
+
+
+@pytest.mark.parametrize("integrator", ["euler", "leapfrog"])
+def test_numpy_trajectory_matches_python(integrator):
+    states = []
+    for engine in ("python", "numpy"):
+        space_objects = read_space_objects_data_from_file(solar_system_file)
+        state = {}
+        for _ in range(200):
+            solar_model.recalculate_space_objects_positions(space_objects, 86400.0, engine, integrator, state)
+        states.append(solar_engine.pack_space_objects(space_objects)[:2])
+    (python_pos, python_vel), (numpy_pos, numpy_vel) = states
+    np.testing.assert_allclose(numpy_pos, python_pos, rtol=1e-12, atol=1e-12 * np.abs(python_pos).max())
+    np.testing.assert_allclose(numpy_vel, python_vel, rtol=1e-12, atol=1e-12 * np.abs(python_vel).max())
+
+
+@pytest.fixture
+def parallel_engine():
+    previous = solar_parallel.workers
+    solar_parallel.workers = 2
+    yield solar_parallel.calculate_accelerations
+    solar_parallel.shutdown()
+    solar_parallel.workers = previous
+
+
+def test_parallel_accelerations_match_numpy(parallel_engine):
+    store = _cluster(3 * solar_engine.block_size + 100)
+    pos, m = store.pos.copy(), store.m.copy()
+    m[::7] = 0.0  # пробные частицы: источники — только массивные тела
+    sources = solar_engine.field_sources(m)
+    targets = np.arange(5, len(m), 3)
+
+    assert parallel_engine(pos, m).tobytes() == solar_engine.calculate_accelerations(pos, m).tobytes()
+    expected = solar_engine.calculate_accelerations(pos, m, targets, sources)
+    assert parallel_engine(pos, m, targets, sources).tobytes() == expected.tobytes()
+    acc, phi = parallel_engine(pos, m, None, sources, potential=True)
+    expected_acc, expected_phi = solar_engine.calculate_accelerations(pos, m, None, sources, True)
+    assert acc.tobytes() == expected_acc.tobytes()
+    assert phi.tobytes() == expected_phi.tobytes()
+
+
+def test_parallel_trajectory_matches_numpy(parallel_engine):
+    runs = []
+    for engine in ("numpy", "parallel"):
+        simulation = Simulation(_cluster(2 * solar_engine.block_size), 3600.0 * 24 * 365, engine, "leapfrog")
+        simulation.run(steps=5)
+        runs.append((simulation.pos.tobytes(), simulation.vel.tobytes()))
+    assert runs[0] == runs[1]
+
+
+@pytest.mark.parametrize("integrator", ["leapfrog", "adaptive"])
+def test_ensemble_member_does_not_depend_on_its_batch(integrator):
+    spec = {"dt": 86400.0, "mass_scale": [1.0, 1.5, 3.0], "velocity_perturbation": 0.05, "samples": 2,
+            "seed": 3, "time": 200 * 86400.0, "integrator": integrator}
+    base = solar_engine.pack_space_objects(
+        solar_ensemble.read_space_objects_data_from_file(os.path.join(data_directory, "double_star.txt")))
+    members = solar_ensemble.make_members(spec)
+    together = {row["member"]: row for task in solar_ensemble.make_batches(base, members, spec)
+                for row in solar_ensemble.run_batch(task)}
+    alone = solar_ensemble.run_batch((base, members[:1], spec))[0]
+    assert alone == together[0]